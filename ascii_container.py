@@ -0,0 +1,368 @@
+import argparse
+import glob
+import os
+import struct
+from array import array
+
+import numpy as np
+
+from ascii_engine import ASCII_CHARS, DuplicateTracker, grid_digest
+
+# Упакованный файл ASCII кадров (.ascv).
+#
+# Вместо сотен тысяч frame_XXXXXX.txt все кадры лежат в одном файле:
+#   заголовок (размер сетки, fps, число кадров, таблица символов)
+#   сетки по ширина * высота байт (индексы символов uint8), без повторов
+#   таблица: uint32 на кадр - номер его сетки
+# Повтор (слайды, паузы, запись экрана) занимает 4 байта в таблице. Кадр
+# читается из отображенного в память файла за O(1): номер сетки из
+# таблицы и срез по смещению номер * ширина * высота. При открытии файл
+# не просматривается.
+#
+# Таблица дописывается в конец при закрытии записи. Пока запись идет,
+# она лежит рядом (frames.ascv.idx), а число кадров в заголовке - 0:
+# прерванный файл читается по ней до последней целиком записанной сетки.
+# Версия 1 (без таблицы, все кадры подряд) тоже читается.
+
+MAGIC = b'ASCV'
+VERSION = 3
+CONTAINER_EXT = '.ascv'
+# Таблица номеров сеток, пока запись не закрыта
+INDEX_EXT = '.idx'
+
+# magic, версия, размер заголовка, ширина, высота, fps, число кадров, длина таблицы символов
+HEADER = struct.Struct('<4sHHHHdIH')
+FRAME_COUNT_OFFSET = 20
+HEADER_ALIGN = 64
+
+# Номер сетки кадра в таблице
+INDEX_ENTRY = struct.Struct('<I')
+INDEX_DTYPE = np.dtype('<u4')
+
+
+class AsciiContainerWriter:
+    """Дописывает кадры (сетки индексов символов) в файл .ascv
+
+    keep_frames > 0 продолжает прерванную запись: первые keep_frames кадров
+    существующего файла сохраняются, все после них отбрасываются.
+    """
+
+    def __init__(self, path, width, height, fps, glyphs, keep_frames=0):
+        self.path = path
+        self.width = width
+        self.height = height
+        self.frame_count = 0
+        self.frames_stored = 0
+        # Номер сетки каждого кадра
+        self._index = array('I')
+
+        glyph_bytes = glyphs.encode('ascii')
+        header_size = -(-(HEADER.size + len(glyph_bytes)) // HEADER_ALIGN) * HEADER_ALIGN
+        header = HEADER.pack(MAGIC, VERSION, header_size, width, height, float(fps), 0, len(glyph_bytes))
+
+        if keep_frames > 0:
+            existing = AsciiContainer(path)
+            same_format = (existing.version, existing.width, existing.height, existing.glyphs) == \
+                (VERSION, width, height, glyphs)
+            available = len(existing)
+            if same_format and available >= keep_frames:
+                self._index.extend(existing.grid_numbers(keep_frames))
+                self.frames_stored = existing.stored_before(keep_frames)
+            existing.close()
+            if not same_format or available < keep_frames:
+                raise ValueError(f"{path}: нельзя продолжить запись ({available} кадров, нужно {keep_frames})")
+            self._file = open(path, 'r+b')
+            # Отбрасываются лишние сетки и таблица в конце закрытого файла
+            self._file.truncate(header_size + self.frames_stored * width * height)
+            # Пока запись не закрыта, кадры считаются по таблице рядом
+            self._file.seek(FRAME_COUNT_OFFSET)
+            self._file.write(struct.pack('<I', 0))
+            self._file.seek(0, os.SEEK_END)
+            self._index_file = open(path + INDEX_EXT, 'wb')
+            self._index_file.write(np.asarray(self._index, dtype=INDEX_DTYPE).tobytes())
+            # Сохраненные кадры сразу читаются (отпечатки повторов при продолжении)
+            self._index_file.flush()
+            self.frame_count = keep_frames
+            return
+
+        self._file = open(path, 'wb')
+        self._file.write(header + glyph_bytes)
+        self._file.write(b'\0' * (header_size - len(header) - len(glyph_bytes)))
+        self._index_file = open(path + INDEX_EXT, 'wb')
+
+    def append(self, indices, reference=None):
+        """Дописывает кадр; reference - номер записанного кадра с той же сеткой"""
+        if reference is not None:
+            if not 0 <= reference < self.frame_count:
+                raise ValueError(f"Ссылка на незаписанный кадр {reference}")
+            number = self._index[reference]
+        else:
+            if indices.shape != (self.height, self.width):
+                raise ValueError(f"Неверный размер кадра {indices.shape}, ожидается {(self.height, self.width)}")
+            self._file.write(np.ascontiguousarray(indices, dtype=np.uint8).tobytes())
+            number = self.frames_stored
+            self.frames_stored += 1
+        self._index.append(number)
+        self._index_file.write(INDEX_ENTRY.pack(number))
+        self.frame_count += 1
+
+    def flush(self):
+        """Сбрасывает записанные кадры на диск (перед сохранением прогресса)"""
+        if not self._file.closed:
+            self._file.flush()
+            self._index_file.flush()
+
+    def close(self):
+        if self._file.closed:
+            return
+        # Таблица переносится в конец файла, затем число кадров - в заголовок:
+        # до этого файл читается по таблице рядом
+        self._file.write(np.asarray(self._index, dtype=INDEX_DTYPE).tobytes())
+        self._file.seek(FRAME_COUNT_OFFSET)
+        self._file.write(struct.pack('<I', self.frame_count))
+        self._file.close()
+        self._index_file.close()
+        try:
+            os.remove(self.path + INDEX_EXT)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class AsciiContainer:
+    """Чтение .ascv: файл отображается в память, любой кадр за O(1)"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                raise ValueError(f"{path}: слишком короткий файл")
+            magic, version, header_size, width, height, fps, frame_count, glyph_len = HEADER.unpack(header)
+            if magic != MAGIC:
+                raise ValueError(f"{path}: не является файлом .ascv")
+            if version not in (1, VERSION):
+                raise ValueError(f"{path}: неподдерживаемая версия {version}")
+            self.glyphs = f.read(glyph_len).decode('ascii')
+
+        self.version = version
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.header_size = header_size
+        self.frame_size = width * height
+
+        self._glyph_bytes = np.frombuffer(self.glyphs.encode('ascii'), dtype=np.uint8)
+        data_size = max(os.path.getsize(path) - header_size, 0)
+        # Номер сетки каждого кадра (в версии 1 совпадает с номером кадра)
+        self._index = None
+        if version == 1:
+            # Если запись прервалась, число кадров в заголовке не обновлено
+            available = data_size // self.frame_size
+            self.frame_count = min(frame_count, available) if frame_count else available
+            self.frames_stored = self.frame_count
+        elif frame_count and data_size >= frame_count * INDEX_ENTRY.size:
+            # Закрытый файл: таблица в конце
+            data_size -= frame_count * INDEX_ENTRY.size
+            self._index = np.memmap(path, dtype=INDEX_DTYPE, mode='r', offset=header_size + data_size,
+                                    shape=(frame_count,))
+            self.frame_count = frame_count
+            self.frames_stored = data_size // self.frame_size
+        else:
+            self._read_pending_index(data_size // self.frame_size)
+
+        self._data = None
+        if data_size > 0:
+            self._data = np.memmap(path, dtype=np.uint8, mode='r', offset=header_size, shape=(data_size,))
+
+    def _read_pending_index(self, stored):
+        """Таблица незакрытой записи; кадры, чьи сетки не дописаны, отбрасываются"""
+        try:
+            with open(self.path + INDEX_EXT, 'rb') as f:
+                raw = f.read()
+        except FileNotFoundError:
+            raw = b''
+        index = np.frombuffer(raw, dtype=INDEX_DTYPE, count=len(raw) // INDEX_ENTRY.size)
+        missing = np.flatnonzero(index >= stored)
+        if len(missing):
+            index = index[:missing[0]]
+        self._index = index
+        self.frame_count = len(index)
+        self.frames_stored = int(index.max()) + 1 if len(index) else 0
+
+    def grid_numbers(self, count):
+        """Номера сеток первых count кадров"""
+        if self._index is None:
+            return range(count)
+        return self._index[:count].tolist()
+
+    def stored_before(self, count):
+        """Сколько сеток (не повторов) среди первых count кадров"""
+        if self._index is None or not count:
+            return count
+        # Сетки нумеруются по порядку записи
+        return int(self._index[:count].max()) + 1
+
+    def __len__(self):
+        return self.frame_count
+
+    def __getitem__(self, index):
+        """Сетка индексов символов кадра (представление без копирования)
+
+        Представление держит отображение файла: оно остается в памяти, пока
+        жив хоть один полученный кадр, даже после close().
+        """
+        if index < 0:
+            index += self.frame_count
+        if not 0 <= index < self.frame_count:
+            raise IndexError(index)
+        number = index if self._index is None else int(self._index[index])
+        offset = number * self.frame_size
+        return self._data[offset:offset + self.frame_size].reshape(self.height, self.width)
+
+    def __iter__(self):
+        for index in range(self.frame_count):
+            yield self[index]
+
+    def text(self, index):
+        """Текст кадра в формате frame_XXXXXX.txt"""
+        indices = self[index]
+        buffer = np.empty((self.height, self.width + 1), dtype=np.uint8)
+        np.take(self._glyph_bytes, indices, out=buffer[:, :self.width])
+        buffer[:, self.width] = ord('\n')
+        return buffer.tobytes()[:-1].decode('ascii')
+
+    def close(self):
+        # Отображение закрывается, когда на него не останется ссылок:
+        # закрыть его вручную значило бы оставить полученные кадры без памяти
+        self._data = None
+        self._index = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def frame_digests(path, count):
+    """Отпечатки сеток первых count кадров файла (grid_digest)"""
+    with AsciiContainer(path) as container:
+        for index in range(min(count, len(container))):
+            yield grid_digest(container[index])
+
+
+def text_to_indices(text, glyphs):
+    """Переводит текст кадра обратно в сетку индексов символов
+
+    ValueError, если строки разной длины или в тексте есть символы не из
+    glyphs. Перевод строки в конце файла допускается.
+    """
+    lines = text.rstrip('\n').split('\n')
+    width = len(lines[0])
+    if width == 0:
+        raise ValueError("Пустой кадр")
+    for number, line in enumerate(lines, 1):
+        if len(line) != width:
+            raise ValueError(f"Строка {number}: {len(line)} символов, ожидается {width}")
+    joined = ''.join(lines)
+    unknown = set(joined) - set(glyphs)
+    if unknown:
+        raise ValueError(f"Символы не из таблицы {glyphs!r}: {''.join(sorted(unknown))!r}")
+
+    lut = np.zeros(256, dtype=np.uint8)
+    # Обход с конца: при повторе символа (пробел) берется первый индекс
+    for index in range(len(glyphs) - 1, -1, -1):
+        lut[ord(glyphs[index])] = index
+    data = np.frombuffer(joined.encode('ascii'), dtype=np.uint8)
+    return np.take(lut, data).reshape(len(lines), width)
+
+
+def read_text_frame(path, glyphs, shape=None):
+    """Сетка индексов из frame_XXXXXX.txt; shape - ожидаемый (высота, ширина)
+
+    Ошибка содержит имя файла: кадры могли быть исправлены вручную.
+    """
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    try:
+        indices = text_to_indices(text, glyphs)
+    except ValueError as e:
+        raise ValueError(f"{path}: {e}") from None
+    if shape is not None and indices.shape != shape:
+        raise ValueError(f"{path}: размер кадра {indices.shape[1]}x{indices.shape[0]}, "
+                         f"ожидается {shape[1]}x{shape[0]}")
+    return indices
+
+
+def txt_to_container(frames_dir, path, fps, glyphs=ASCII_CHARS + " "):
+    """Собирает frame_XXXXXX.txt из папки в один файл .ascv"""
+    files = sorted(glob.glob(os.path.join(frames_dir, 'frame_*.txt')))
+    if not files:
+        raise FileNotFoundError(f"В {frames_dir} нет файлов frame_*.txt")
+
+    writer = None
+    duplicates = DuplicateTracker()
+    try:
+        for index, name in enumerate(files):
+            indices = read_text_frame(name, glyphs, (writer.height, writer.width) if writer else None)
+            if writer is None:
+                height, width = indices.shape
+                writer = AsciiContainerWriter(path, width, height, fps, glyphs)
+            writer.append(indices, reference=duplicates.check(index, grid_digest(indices)))
+    finally:
+        if writer is not None:
+            writer.close()
+    return len(files)
+
+
+def container_to_txt(path, frames_dir):
+    """Раскладывает .ascv обратно на frame_XXXXXX.txt"""
+    os.makedirs(frames_dir, exist_ok=True)
+    with AsciiContainer(path) as container:
+        for index in range(len(container)):
+            with open(os.path.join(frames_dir, f"frame_{index:06d}.txt"), 'w', encoding='utf-8') as f:
+                f.write(container.text(index))
+        return len(container)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Конвертация между .ascv и папкой frame_XXXXXX.txt")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    pack = sub.add_parser('pack', help="папка TXT -> .ascv")
+    pack.add_argument('frames_dir')
+    pack.add_argument('output')
+    pack.add_argument('--fps', type=float, default=30.0)
+
+    unpack = sub.add_parser('unpack', help=".ascv -> папка TXT")
+    unpack.add_argument('container')
+    unpack.add_argument('frames_dir')
+
+    info = sub.add_parser('info', help="сведения о файле .ascv")
+    info.add_argument('container')
+
+    args = parser.parse_args()
+    if args.command == 'pack':
+        try:
+            count = txt_to_container(args.frames_dir, args.output, args.fps)
+        except (OSError, ValueError) as e:
+            parser.exit(1, f"Ошибка: {e}\n")
+        print(f"Упаковано кадров: {count}")
+    elif args.command == 'unpack':
+        count = container_to_txt(args.container, args.frames_dir)
+        print(f"Распаковано кадров: {count}")
+    else:
+        with AsciiContainer(args.container) as container:
+            print(f"Размер: {container.width}x{container.height}, FPS: {container.fps:.2f}, "
+                  f"кадров: {len(container)} (повторов: {len(container) - container.frames_stored}), "
+                  f"символы: {container.glyphs!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+import functools
+import hashlib
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+# Общий движок преобразования кадра в ASCII для CLI и GUI версий.
+# Вместо цикла по пикселям используется таблица на 256 значений яркости:
+# кадр превращается в сетку индексов символов одним вызовом cv2.LUT,
+# а строки собираются из байтов целиком.
+#
+# Яркость/контраст/гамма, инверсия и порог прозрачности зависят только
+# от значения пикселя, поэтому все они складываются в ту же таблицу.
+# Таблица применяется к уже уменьшенной сетке, а не к полному кадру.
+
+# Набор символов CLI версии (от темного к светлому)
+ASCII_CHARS = "@%#*+=-:. "
+
+# Шаг квантования яркости (как в исходном pixel // 32)
+BRIGHTNESS_STEP = 32
+
+# ANSI коды цветов для терминала
+ANSI_COLOR_CODES = {
+    'red': '\033[91m',
+    'green': '\033[92m',
+    'yellow': '\033[93m',
+    'blue': '\033[94m',
+    'magenta': '\033[95m',
+    'cyan': '\033[96m',
+    'white': '\033[97m',
+}
+ANSI_RESET = '\033[0m'
+
+
+def to_gray(frame):
+    """Серый кадр из BGR (cv2.VideoCapture) или уже серого (FFmpegGrayReader)"""
+    if frame.ndim == 2:
+        return frame
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+
+def resize_to_grid(gray, grid_size, interpolation=cv2.INTER_LINEAR):
+    """Ресайз до сетки символов; кадр нужного размера не копируется"""
+    width, height = grid_size
+    if gray.shape == (height, width):
+        return gray
+    return cv2.resize(gray, grid_size, interpolation=interpolation)
+
+
+def grid_digest(indices):
+    """Отпечаток сетки символов: у одинаковых кадров одинаковый"""
+    digest = hashlib.blake2b(repr(indices.shape).encode('ascii'), digest_size=16)
+    digest.update(np.ascontiguousarray(indices).data)
+    return digest.digest()
+
+
+class DuplicateTracker:
+    """Находит кадры, сетка символов которых уже встречалась
+
+    Слайды, запись экрана и паузы дают длинные серии одинаковых кадров.
+    check() возвращает номер первого кадра с той же сеткой (или None).
+    Помнятся отпечатки последних capacity разных сеток.
+    """
+
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self.duplicates = 0
+        self._seen = OrderedDict()
+
+    def seed(self, digests):
+        """Учитывает кадры 0, 1, ... с этими отпечатками (продолжение конвертации)"""
+        for index, digest in enumerate(digests):
+            self.check(index, digest)
+
+    def check(self, index, digest):
+        original = self._seen.get(digest)
+        if original is not None:
+            self._seen.move_to_end(digest)
+            self.duplicates += 1
+            return original
+        self._seen[digest] = index
+        if len(self._seen) > self.capacity:
+            self._seen.popitem(last=False)
+        return None
+
+
+def apply_camera_settings(gray, brightness=0, contrast=1.0, gamma=1.0):
+    """Яркость / контраст / гамма для серого кадра (настройки "камеры" GUI)"""
+    img = gray.astype(np.float32)
+    img = img * contrast + brightness
+    img = np.clip(img, 0, 255)
+    img = np.power(img / 255.0, gamma) * 255.0
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+
+@functools.lru_cache(maxsize=32)
+def build_tone_lut(brightness=0, contrast=1.0, gamma=1.0):
+    """apply_camera_settings в виде таблицы на 256 значений"""
+    lut = apply_camera_settings(np.arange(256, dtype=np.uint8), brightness, contrast, gamma)
+    lut.setflags(write=False)
+    return lut
+
+
+@functools.lru_cache(maxsize=32)
+def build_glyph_lut(charset=ASCII_CHARS, transparent=False, threshold=150, invert=False):
+    """Строит таблицу яркость -> индекс символа (256 значений uint8)
+
+    Индекс len(charset) зарезервирован под прозрачную (пустую) клетку.
+    """
+    values = np.arange(256, dtype=np.int32)
+    if invert:
+        values = 255 - values
+
+    lut = np.minimum(values // BRIGHTNESS_STEP, len(charset) - 1)
+    if transparent:
+        lut = np.where(values > threshold, len(charset), lut)
+
+    lut = lut.astype(np.uint8)
+    lut.setflags(write=False)
+    return lut
+
+
+class AsciiMapper:
+    """Переводит серый кадр в сетку индексов символов и обратно в текст
+
+    camera - None или (яркость, контраст, гамма), применяются до инверсии.
+    """
+
+    def __init__(self, charset=ASCII_CHARS, transparent=False, threshold=150, invert=False, camera=None):
+        self.charset = charset
+        self.transparent = transparent
+        self.threshold = threshold
+        self.invert = invert
+        self.camera = tuple(camera) if camera else None
+
+        # Последний символ - пустая клетка для прозрачных областей
+        self.glyphs = charset + " "
+        self.blank_index = len(charset)
+        # Таблицы кешируются: пересчет только при смене настроек
+        self.lut = build_glyph_lut(charset, transparent, threshold, invert)
+        if self.camera:
+            self.lut = self.lut[build_tone_lut(*self.camera)]
+        self._glyph_bytes = np.frombuffer(self.glyphs.encode('ascii'), dtype=np.uint8)
+        self._color_tables = {}
+
+    @classmethod
+    def from_config(cls, config, charset=ASCII_CHARS):
+        """Создает маппер по словарю настроек CLI"""
+        return cls(charset,
+                   transparent=config['transparent'],
+                   threshold=config['threshold'],
+                   invert=config['invert'])
+
+    def map(self, gray):
+        """Возвращает сетку индексов символов (uint8) для серого кадра"""
+        return cv2.LUT(gray, self.lut)
+
+    def to_text(self, indices):
+        """Собирает текст кадра без ANSI кодов"""
+        height, width = indices.shape
+        # Добавляем столбец переводов строк и декодируем все одним куском
+        buffer = np.empty((height, width + 1), dtype=np.uint8)
+        np.take(self._glyph_bytes, indices, out=buffer[:, :width])
+        buffer[:, width] = ord('\n')
+        return buffer.tobytes()[:-1].decode('ascii')
+
+    def color_table(self, color=None, random_colors=False):
+        """Палитра ANSI кодов и номер цвета для каждого индекса символа
+
+        Номер -1 у прозрачной клетки: пробел выглядит одинаково в любом
+        цвете, поэтому она присоединяется к соседнему участку.
+        """
+        key = (color, random_colors)
+        table = self._color_tables.get(key)
+        if table is not None:
+            return table
+
+        color_codes = list(ANSI_COLOR_CODES.values())
+        palette = []
+        ids = np.full(len(self.glyphs), -1, dtype=np.int16)
+        for index in range(len(self.glyphs)):
+            if index == self.blank_index:
+                continue
+            if random_colors:
+                code = color_codes[index % len(color_codes)]
+            elif color and color in ANSI_COLOR_CODES:
+                code = ANSI_COLOR_CODES[color]
+            else:
+                continue
+            if code not in palette:
+                palette.append(code)
+            ids[index] = palette.index(code)
+
+        table = (palette, ids)
+        self._color_tables[key] = table
+        return table
+
+    def terminal_rows(self, indices, color=None, random_colors=False):
+        """Строки кадра для терминала с цветом, сгруппированным по участкам
+
+        Подряд идущие клетки одного цвета выводятся одной escape
+        последовательностью и одним сбросом цвета на участок.
+        """
+        lines = self.to_text(indices).split("\n")
+        palette, ids = self.color_table(color, random_colors)
+        if not palette:
+            return lines
+
+        cell_colors = np.take(ids, indices)
+        # Прозрачные клетки получают цвет участка слева от них
+        width = indices.shape[1]
+        source = np.where(cell_colors >= 0, np.arange(width), 0)
+        np.maximum.accumulate(source, axis=1, out=source)
+        cell_colors = np.take_along_axis(cell_colors, source, axis=1)
+
+        rows = []
+        for line, colors in zip(lines, cell_colors):
+            bounds = np.flatnonzero(colors[1:] != colors[:-1]) + 1
+            starts = [0] + bounds.tolist()
+            ends = bounds.tolist() + [width]
+            parts = []
+            for start, end in zip(starts, ends):
+                color_id = colors[start]
+                if color_id < 0:
+                    parts.append(line[start:end])
+                else:
+                    parts.append(f"{palette[color_id]}{line[start:end]}{ANSI_RESET}")
+            rows.append("".join(parts))
+        return rows
+
+    def to_terminal(self, indices, color=None, random_colors=False):
+        """Собирает текст кадра для терминала (с ANSI цветами)"""
+        return "\n".join(self.terminal_rows(indices, color, random_colors))
@@ -0,0 +1,90 @@
+import functools
+
+import numpy as np
+import pygame
+
+# Растеризация ASCII кадров через атлас глифов.
+# Каждый символ набора рисуется шрифтом pygame один раз, после чего
+# кадр целиком собирается индексированием атласа сеткой индексов
+# символов (без десятков тысяч вызовов font.render/blit на кадр).
+
+
+def to_rgb(color):
+    """Приводит цвет (hex строка, имя или кортеж) к кортежу RGB"""
+    c = pygame.Color(color)
+    return (c.r, c.g, c.b)
+
+
+class GlyphAtlas:
+    """Атлас глифов: массив (число символов, высота клетки, ширина клетки, 3)"""
+
+    def __init__(self, font, glyphs, text_color, bg_color, cell_size=None):
+        if cell_size is None:
+            cell_size = (font.size("X")[0], font.get_height())
+
+        self.glyphs = glyphs
+        self.cell_width, self.cell_height = cell_size
+        self.text_color = to_rgb(text_color)
+        self.bg_color = to_rgb(bg_color)
+
+        self.atlas = np.empty((len(glyphs), self.cell_height, self.cell_width, 3), dtype=np.uint8)
+        cell = pygame.Surface(cell_size)
+        for i, char in enumerate(glyphs):
+            cell.fill(self.bg_color)
+            cell.blit(font.render(char, True, self.text_color), (0, 0))
+            # surfarray отдает (x, y, 3), атласу нужен порядок (y, x, 3)
+            self.atlas[i] = pygame.surfarray.array3d(cell).transpose(1, 0, 2)
+
+
+class FrameRenderer:
+    """Собирает RGB кадр заданного размера из сетки индексов символов"""
+
+    def __init__(self, atlas, grid_size, canvas_size=None):
+        self.atlas = atlas
+        self.grid_width, self.grid_height = grid_size
+        text_width = self.grid_width * atlas.cell_width
+        text_height = self.grid_height * atlas.cell_height
+
+        if canvas_size is None:
+            canvas_size = (text_width, text_height)
+        self.width, self.height = canvas_size
+
+        # Центрируем текст на холсте, лишнее обрезаем как это делал blit
+        x = (self.width - text_width) // 2
+        y = (self.height - text_height) // 2
+        visible_w = max(0, min(self.width, x + text_width) - max(0, x))
+        visible_h = max(0, min(self.height, y + text_height) - max(0, y))
+        self._dst = (slice(max(0, y), max(0, y) + visible_h), slice(max(0, x), max(0, x) + visible_w))
+        self._src = (slice(max(0, -y), max(0, -y) + visible_h), slice(max(0, -x), max(0, -x) + visible_w))
+
+        # Фон вне области текста не меняется, заливаем его один раз
+        self.canvas = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        self.canvas[:] = atlas.bg_color
+
+    def render(self, indices):
+        """Возвращает кадр (высота, ширина, 3) uint8; буфер переиспользуется"""
+        rows, cols = indices.shape
+        cell_h, cell_w = self.atlas.cell_height, self.atlas.cell_width
+        tiles = self.atlas.atlas[indices]
+        text = tiles.transpose(0, 2, 1, 3, 4).reshape(rows * cell_h, cols * cell_w, 3)
+        self.canvas[self._dst] = text[self._src]
+        return self.canvas
+
+    def to_surface(self, frame):
+        """Оборачивает кадр в pygame.Surface (для pygame.image.save)"""
+        return pygame.image.frombuffer(frame, (self.width, self.height), 'RGB')
+
+
+@functools.lru_cache(maxsize=16)
+def get_font(name, size, bold=True):
+    """Шрифт pygame с кешированием (SysFont медленный)"""
+    if not pygame.font.get_init():
+        pygame.font.init()
+    return pygame.font.SysFont(name, size, bold=bold)
+
+
+@functools.lru_cache(maxsize=16)
+def get_glyph_atlas(font_name, font_size, glyphs, text_color, bg_color, cell_size=None, bold=True):
+    """Атлас для сочетания (шрифт, размер, цвета) строится один раз"""
+    font = get_font(font_name, font_size, bold)
+    return GlyphAtlas(font, glyphs, text_color, bg_color, cell_size)
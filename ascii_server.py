@@ -0,0 +1,212 @@
+import socket
+import threading
+
+from terminal_player import CURSOR_HOME, HIDE_CURSOR, SHOW_CURSOR, TerminalPreview
+
+# Трансляция ASCII видео по сети на любое число терминалов.
+#
+# Клиент - обычный telnet или netcat (telnet host 2323, nc host 2323):
+# сервер шлет те же ANSI последовательности, что и локальный просмотр.
+# Кадр конвертируется и кодируется один раз: разница с предыдущим кадром
+# (ScreenDiff) общая для всех клиентов, полный кадр строится только если
+# он кому-то нужен, и тоже один раз.
+#
+# У каждого клиента свой поток отправки и одно место под кадр: новый кадр
+# заменяет неотправленный. Медленный клиент пропускает кадры (и получает
+# затем полный кадр вместо разницы), а производитель никогда не ждет сеть.
+
+CLEAR_SCREEN = "\033[2J"
+
+
+class BroadcastFrame:
+    """Кадр трансляции: разница с прошлым кадром и (лениво) полный кадр"""
+
+    def __init__(self, seq, indices, payload, encode_rows):
+        self.seq = seq
+        self.indices = indices
+        self.diff = payload.encode('utf-8')
+        self._encode_rows = encode_rows
+        self._full = None
+        self._lock = threading.Lock()
+
+    @property
+    def full(self):
+        with self._lock:
+            if self._full is None:
+                text = CURSOR_HOME + "\n".join(self._encode_rows(self.indices))
+                self._full = text.encode('utf-8')
+            return self._full
+
+
+class BroadcastClient:
+    """Подключенный клиент: поток отправки и последний неотправленный кадр"""
+
+    def __init__(self, server, sock, address):
+        self.server = server
+        self.sock = sock
+        self.address = address
+        self.frames_sent = 0
+        self.frames_skipped = 0
+        self.bytes_sent = 0
+        self._last_seq = None
+        self._pending = None
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def offer(self, frame):
+        """Ставит кадр на отправку вместо неотправленного; не блокирует"""
+        with self._cond:
+            if self._pending is not None:
+                self.frames_skipped += 1
+            self._pending = frame
+            self._cond.notify()
+
+    def _next_frame(self):
+        with self._cond:
+            while self._pending is None and not self._closed:
+                self._cond.wait()
+            frame, self._pending = self._pending, None
+            return frame
+
+    def _run(self):
+        try:
+            self.sock.sendall((CLEAR_SCREEN + HIDE_CURSOR).encode('ascii'))
+            while True:
+                frame = self._next_frame()
+                if frame is None:
+                    break
+                # Разница годится, только если у клиента на экране предыдущий кадр
+                if self._last_seq is not None and frame.seq == self._last_seq + 1:
+                    data = frame.diff
+                else:
+                    data = frame.full
+                self.sock.sendall(data)
+                self._last_seq = frame.seq
+                self.frames_sent += 1
+                self.bytes_sent += len(data)
+            self.sock.sendall(SHOW_CURSOR.encode('ascii'))
+        except OSError:
+            # Клиент отключился или перестал принимать данные
+            pass
+        finally:
+            self.sock.close()
+            self.server._remove(self)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+
+
+class BroadcastServer:
+    """TCP сервер, раздающий кадры всем подключенным клиентам
+
+    broadcast(indices, payload, encode_rows) вызывается производителем:
+    payload - разница с предыдущим переданным кадром (как у
+    TerminalPreview), encode_rows(indices) строит строки полного кадра.
+    """
+
+    def __init__(self, host='0.0.0.0', port=2323, send_timeout=10.0, send_buffer=64 * 1024):
+        self.host = host
+        self.port = port
+        # Клиент, не принимающий данные дольше этого, отключается
+        self.send_timeout = send_timeout
+        # Небольшой буфер ядра: иначе медленный клиент копит мегабайты
+        # старых кадров, а не пропускает их
+        self.send_buffer = send_buffer
+        self.frames_broadcast = 0
+        self.clients_total = 0
+        self._seq = 0
+        self._clients = []
+        self._lock = threading.Lock()
+        self._sock = None
+        self._thread = None
+        self._closed = False
+
+    def start(self):
+        self._sock = socket.create_server((self.host, self.port))
+        # accept() с таймаутом: закрытие сокета не везде прерывает ожидание
+        self._sock.settimeout(0.5)
+        self.port = self._sock.getsockname()[1]
+        self._thread = threading.Thread(target=self._accept, daemon=True)
+        self._thread.start()
+        return self
+
+    def _accept(self):
+        while not self._closed:
+            try:
+                sock, address = self._sock.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                # Сервер закрыт
+                return
+            sock.settimeout(self.send_timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.send_buffer)
+            with self._lock:
+                self._clients.append(BroadcastClient(self, sock, address))
+                self.clients_total += 1
+
+    def _remove(self, client):
+        with self._lock:
+            if client in self._clients:
+                self._clients.remove(client)
+
+    @property
+    def clients(self):
+        with self._lock:
+            return list(self._clients)
+
+    def broadcast(self, indices, payload, encode_rows):
+        """Раздает кадр всем клиентам (копия indices хранится до отправки)"""
+        self._seq += 1
+        frame = BroadcastFrame(self._seq, indices.copy(), payload, encode_rows)
+        for client in self.clients:
+            client.offer(frame)
+        self.frames_broadcast += 1
+
+    def close(self):
+        if self._sock is not None:
+            self._closed = True
+            self._thread.join()
+            self._sock.close()
+            self._sock = None
+        clients = self.clients
+        for client in clients:
+            client.close()
+        for client in clients:
+            client.join(self.send_timeout)
+
+    def stats(self):
+        return {
+            'frames': self.frames_broadcast,
+            'clients': len(self.clients),
+            'clients_total': self.clients_total,
+        }
+
+
+class BroadcastPreview(TerminalPreview):
+    """TerminalPreview, который выводит кадры не в терминал, а в BroadcastServer
+
+    Темп, пропуск опоздавших кадров и кодирование разницы - как у
+    локального просмотра; RealtimePlayer и LivePlayer работают с ним так же.
+    """
+
+    def __init__(self, server, mapper, fps, color=None, random_colors=False, paced=True):
+        super().__init__(mapper, fps, color, random_colors, paced=paced)
+        self.server = server
+
+    def start(self):
+        self.screen.reset()
+
+    def _write(self, payload, indices):
+        self.server.broadcast(indices, payload, self._encode_rows)
+
+    def stop(self):
+        pass
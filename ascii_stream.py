@@ -0,0 +1,409 @@
+import argparse
+import bisect
+import glob
+import lzma
+import os
+import struct
+import zlib
+
+import numpy as np
+
+from ascii_container import AsciiContainer, read_text_frame
+from ascii_engine import ASCII_CHARS
+
+# Сжатый поток ASCII кадров (.ascz) для длинных архивов.
+#
+# Соседние кадры почти одинаковы, поэтому хранится не каждый кадр целиком,
+# а опорный кадр и изменения клеток относительно предыдущего кадра:
+#   заголовок (размер сетки, fps, интервал опорных кадров, сжатие, символы)
+#   блок: first_frame, frame_count, размер данных + сжатые данные
+#   блок: ...
+# Данные блока после распаковки - кадры подряд:
+#   FULL  + ширина * высота байт (первый кадр блока всегда такой)
+#   DELTA + uint32 число клеток, их позиции uint32 и новые индексы uint8
+#   SAME  (кадр не изменился)
+#
+# Каждый блок начинается с опорного кадра и распаковывается отдельно:
+# переход к кадру N - распаковка одного блока. Блок закрывается, когда
+# набралось keyframe_interval кадров. flush() (сохранение прогресса)
+# записывает незаконченный блок на его место в конце файла, и следующий
+# flush() или закрытие блока переписывают его: опорный кадр остается
+# ровно раз в keyframe_interval кадров, а файл во время конвертации
+# читается до последнего записанного кадра.
+#
+# Сжатие - zlib, lzma (лучше, но медленнее) или none.
+
+MAGIC = b'ASCZ'
+VERSION = 1
+STREAM_EXT = '.ascz'
+
+# magic, версия, размер заголовка, ширина, высота, fps, интервал опорных кадров, сжатие, длина таблицы символов
+HEADER = struct.Struct('<4sHHHHdIBH')
+HEADER_ALIGN = 64
+# Заголовок блока: номер первого кадра, число кадров, размер сжатых данных
+CHUNK = struct.Struct('<III')
+COUNT = struct.Struct('<I')
+
+FRAME_FULL = 0
+FRAME_DELTA = 1
+FRAME_SAME = 2
+
+COMPRESSION = {'none': 0, 'zlib': 1, 'lzma': 2}
+DEFAULT_KEYFRAME_INTERVAL = 300
+
+
+def _compress(data, compression):
+    if compression == 'zlib':
+        return zlib.compress(data, 6)
+    if compression == 'lzma':
+        return lzma.compress(data)
+    return bytes(data)
+
+
+def _decompress(data, compression):
+    if compression == 'zlib':
+        return zlib.decompress(data)
+    if compression == 'lzma':
+        return lzma.decompress(data)
+    return data
+
+
+class AsciiStreamWriter:
+    """Дописывает кадры (сетки индексов символов) в файл .ascz
+
+    keep_frames > 0 продолжает прерванную запись: первые keep_frames кадров
+    существующего файла сохраняются, все после них отбрасываются.
+    """
+
+    def __init__(self, path, width, height, fps, glyphs, compression='zlib',
+                 keyframe_interval=DEFAULT_KEYFRAME_INTERVAL, keep_frames=0):
+        if compression not in COMPRESSION:
+            raise ValueError(f"Неизвестное сжатие {compression!r}, ожидается одно из: {', '.join(COMPRESSION)}")
+        self.path = path
+        self.width = width
+        self.height = height
+        self.compression = compression
+        self.keyframe_interval = max(1, keyframe_interval)
+        self.frame_count = 0
+        self.bytes_raw = 0
+
+        self._pending = []
+        self._pending_frames = 0
+        self._previous = None
+        # Начало незаконченного блока в файле
+        self._chunk_offset = 0
+
+        glyph_bytes = glyphs.encode('ascii')
+        header_size = -(-(HEADER.size + len(glyph_bytes)) // HEADER_ALIGN) * HEADER_ALIGN
+        header = HEADER.pack(MAGIC, VERSION, header_size, width, height, float(fps),
+                             self.keyframe_interval, COMPRESSION[compression], len(glyph_bytes))
+
+        if keep_frames > 0:
+            with AsciiStream(path) as existing:
+                same_format = (existing.width, existing.height, existing.glyphs, existing.compression) == \
+                    (width, height, glyphs, compression)
+                available = len(existing)
+                if not same_format or available < keep_frames:
+                    raise ValueError(f"{path}: нельзя продолжить запись ({available} кадров, нужно {keep_frames})")
+                # Блок, в котором кончаются сохраняемые кадры, записывается заново
+                end, first = existing.cut(keep_frames)
+                tail = [np.array(existing[index]) for index in range(first, keep_frames)]
+            self._file = open(path, 'r+b')
+            self._file.truncate(end)
+            self._chunk_offset = self._file.seek(0, os.SEEK_END)
+            self.frame_count = first
+            for indices in tail:
+                self.append(indices)
+            return
+
+        self._file = open(path, 'wb')
+        self._file.write(header + glyph_bytes)
+        self._file.write(b'\0' * (header_size - len(header) - len(glyph_bytes)))
+        self._chunk_offset = self._file.tell()
+
+    def append(self, indices):
+        if indices.shape != (self.height, self.width):
+            raise ValueError(f"Неверный размер кадра {indices.shape}, ожидается {(self.height, self.width)}")
+        indices = np.ascontiguousarray(indices, dtype=np.uint8)
+
+        if self._previous is None:
+            self._pending.append(bytes((FRAME_FULL,)))
+            self._pending.append(indices.tobytes())
+        else:
+            changed = np.flatnonzero(indices != self._previous)
+            if not len(changed):
+                self._pending.append(bytes((FRAME_SAME,)))
+            elif len(changed) * 5 < indices.size:
+                self._pending.append(bytes((FRAME_DELTA,)))
+                self._pending.append(COUNT.pack(len(changed)))
+                self._pending.append(changed.astype('<u4').tobytes())
+                self._pending.append(indices.ravel()[changed].tobytes())
+            else:
+                # Изменилась большая часть кадра: целиком короче
+                self._pending.append(bytes((FRAME_FULL,)))
+                self._pending.append(indices.tobytes())
+        self._previous = indices.copy()
+        self._pending_frames += 1
+        self.frame_count += 1
+        self.bytes_raw += indices.size + indices.shape[0]
+
+        if self._pending_frames >= self.keyframe_interval:
+            self._write_chunk(final=True)
+
+    def _write_chunk(self, final):
+        """Записывает незаконченный блок на его место; final - блок закрыт"""
+        if not self._pending_frames:
+            return
+        data = _compress(b''.join(self._pending), self.compression)
+        first = self.frame_count - self._pending_frames
+        self._file.seek(self._chunk_offset)
+        self._file.write(CHUNK.pack(first, self._pending_frames, len(data)))
+        self._file.write(data)
+        # Прошлая запись этого блока могла быть длиннее
+        self._file.truncate()
+        if final:
+            self._chunk_offset = self._file.tell()
+            self._pending = []
+            self._pending_frames = 0
+            # Следующий блок начинается с опорного кадра
+            self._previous = None
+
+    def flush(self):
+        """Записывает все кадры на диск (перед сохранением прогресса), блок не закрывается"""
+        if self._file.closed:
+            return
+        self._write_chunk(final=False)
+        self._file.flush()
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._write_chunk(final=True)
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class AsciiStream:
+    """Чтение .ascz: любой кадр распаковкой одного блока, по порядку - без повторной распаковки"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        header = self._file.read(HEADER.size)
+        if len(header) < HEADER.size:
+            self._file.close()
+            raise ValueError(f"{path}: слишком короткий файл")
+        magic, version, header_size, width, height, fps, keyframe_interval, compression, glyph_len = \
+            HEADER.unpack(header)
+        if magic != MAGIC:
+            self._file.close()
+            raise ValueError(f"{path}: не является файлом .ascz")
+        if version != VERSION or compression not in COMPRESSION.values():
+            self._file.close()
+            raise ValueError(f"{path}: неподдерживаемая версия {version}")
+        self.glyphs = self._file.read(glyph_len).decode('ascii')
+
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.keyframe_interval = keyframe_interval
+        self.compression = next(name for name, code in COMPRESSION.items() if code == compression)
+        self.header_size = header_size
+        self.frame_size = width * height
+        self._glyph_bytes = np.frombuffer(self.glyphs.encode('ascii'), dtype=np.uint8)
+        self._cached = (None, None)
+
+        self._scan_chunks(os.path.getsize(path))
+
+    def _scan_chunks(self, file_size):
+        """Находит блоки; недописанный блок в конце отбрасывается"""
+        self._chunks = []
+        self._firsts = []
+        frame_count = 0
+        position = self.header_size
+        while position + CHUNK.size <= file_size:
+            self._file.seek(position)
+            first, count, size = CHUNK.unpack(self._file.read(CHUNK.size))
+            if first != frame_count or not count or position + CHUNK.size + size > file_size:
+                break
+            self._chunks.append((first, count, position, size))
+            self._firsts.append(first)
+            frame_count += count
+            position += CHUNK.size + size
+        self.frame_count = frame_count
+        self.data_end = position
+
+    def __len__(self):
+        return self.frame_count
+
+    @property
+    def chunk_count(self):
+        return len(self._chunks)
+
+    def cut(self, count):
+        """Где обрезать файл, чтобы остались первые count кадров
+
+        Возвращает (смещение конца, первый кадр, который придется дописать заново).
+        Недобранные блоки перед обрезкой (запись прерывалась) тоже дописываются
+        заново, чтобы опорный кадр остался раз в keyframe_interval кадров.
+        """
+        if count >= self.frame_count:
+            index = len(self._chunks)
+        else:
+            index = bisect.bisect_right(self._firsts, count) - 1
+        while index > 0 and self._chunks[index - 1][1] < self.keyframe_interval:
+            index -= 1
+        if index == len(self._chunks):
+            return self.data_end, self.frame_count
+        first, _, position, _ = self._chunks[index]
+        return position, first
+
+    def _decode_chunk(self, chunk_index):
+        if self._cached[0] == chunk_index:
+            return self._cached[1]
+        first, count, position, size = self._chunks[chunk_index]
+        self._file.seek(position + CHUNK.size)
+        data = _decompress(self._file.read(size), self.compression)
+
+        frames = []
+        previous = None
+        offset = 0
+        for _ in range(count):
+            kind = data[offset]
+            offset += 1
+            if kind == FRAME_FULL:
+                frame = np.frombuffer(data, dtype=np.uint8, count=self.frame_size, offset=offset).copy()
+                offset += self.frame_size
+            elif kind == FRAME_DELTA:
+                changed_count, = COUNT.unpack_from(data, offset)
+                offset += COUNT.size
+                changed = np.frombuffer(data, dtype='<u4', count=changed_count, offset=offset)
+                offset += changed_count * 4
+                frame = previous.copy()
+                frame[changed] = np.frombuffer(data, dtype=np.uint8, count=changed_count, offset=offset)
+                offset += changed_count
+            elif kind == FRAME_SAME:
+                frame = previous
+            else:
+                raise ValueError(f"{self.path}: поврежденный блок кадров {first}-{first + count - 1}")
+            frames.append(frame)
+            previous = frame
+
+        frames = [frame.reshape(self.height, self.width) for frame in frames]
+        self._cached = (chunk_index, frames)
+        return frames
+
+    def __getitem__(self, index):
+        """Сетка индексов символов кадра (не изменять: общая с соседними кадрами)"""
+        if index < 0:
+            index += self.frame_count
+        if not 0 <= index < self.frame_count:
+            raise IndexError(index)
+        chunk_index = bisect.bisect_right(self._firsts, index) - 1
+        return self._decode_chunk(chunk_index)[index - self._firsts[chunk_index]]
+
+    def __iter__(self):
+        for chunk_index in range(len(self._chunks)):
+            yield from self._decode_chunk(chunk_index)
+
+    def text(self, index):
+        """Текст кадра в формате frame_XXXXXX.txt"""
+        indices = self[index]
+        buffer = np.empty((self.height, self.width + 1), dtype=np.uint8)
+        np.take(self._glyph_bytes, indices, out=buffer[:, :self.width])
+        buffer[:, self.width] = ord('\n')
+        return buffer.tobytes()[:-1].decode('ascii')
+
+    def close(self):
+        self._cached = (None, None)
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def pack_stream(source, path, compression='zlib', keyframe_interval=DEFAULT_KEYFRAME_INTERVAL,
+                fps=30.0, glyphs=ASCII_CHARS + " "):
+    """Сжимает .ascv или папку frame_XXXXXX.txt в поток .ascz; возвращает писатель (закрытый)"""
+    if os.path.isdir(source):
+        files = sorted(glob.glob(os.path.join(source, 'frame_*.txt')))
+        if not files:
+            raise FileNotFoundError(f"В {source} нет файлов frame_*.txt")
+        writer = None
+        try:
+            for name in files:
+                indices = read_text_frame(name, glyphs, (writer.height, writer.width) if writer else None)
+                if writer is None:
+                    height, width = indices.shape
+                    writer = AsciiStreamWriter(path, width, height, fps, glyphs, compression, keyframe_interval)
+                writer.append(indices)
+        finally:
+            if writer is not None:
+                writer.close()
+        return writer
+
+    with AsciiContainer(source) as container:
+        with AsciiStreamWriter(path, container.width, container.height, container.fps, container.glyphs,
+                               compression, keyframe_interval) as writer:
+            for indices in container:
+                writer.append(indices)
+    return writer
+
+
+def stream_to_txt(path, frames_dir):
+    """Раскладывает .ascz на frame_XXXXXX.txt"""
+    os.makedirs(frames_dir, exist_ok=True)
+    with AsciiStream(path) as stream:
+        for index in range(len(stream)):
+            with open(os.path.join(frames_dir, f"frame_{index:06d}.txt"), 'w', encoding='utf-8') as f:
+                f.write(stream.text(index))
+        return len(stream)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сжатый поток ASCII кадров .ascz")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    pack = sub.add_parser('pack', help=".ascv или папка TXT -> .ascz")
+    pack.add_argument('source')
+    pack.add_argument('output')
+    pack.add_argument('--compression', choices=list(COMPRESSION), default='zlib')
+    pack.add_argument('--keyframe-interval', type=int, default=DEFAULT_KEYFRAME_INTERVAL,
+                      help="кадров между опорными кадрами")
+    pack.add_argument('--fps', type=float, default=30.0, help="для папки TXT")
+
+    unpack = sub.add_parser('unpack', help=".ascz -> папка TXT")
+    unpack.add_argument('stream')
+    unpack.add_argument('frames_dir')
+
+    info = sub.add_parser('info', help="сведения о файле .ascz")
+    info.add_argument('stream')
+
+    args = parser.parse_args()
+    if args.command == 'pack':
+        try:
+            writer = pack_stream(args.source, args.output, args.compression, args.keyframe_interval, args.fps)
+        except (OSError, ValueError) as e:
+            parser.exit(1, f"Ошибка: {e}\n")
+        size = os.path.getsize(args.output)
+        print(f"Упаковано кадров: {writer.frame_count}, {size} байт "
+              f"(текст: {writer.bytes_raw} байт, в {writer.bytes_raw / max(size, 1):.0f} раз меньше)")
+    elif args.command == 'unpack':
+        count = stream_to_txt(args.stream, args.frames_dir)
+        print(f"Распаковано кадров: {count}")
+    else:
+        with AsciiStream(args.stream) as stream:
+            print(f"Размер: {stream.width}x{stream.height}, FPS: {stream.fps:.2f}, кадров: {len(stream)}, "
+                  f"блоков: {stream.chunk_count}, сжатие: {stream.compression}, символы: {stream.glyphs!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+import argparse
+import contextlib
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from ascii_stream import COMPRESSION
+from frame_pipeline import default_workers
+from vid2 import ASCII_COLORS, BACKGROUND_COLORS, DEFAULT_SETTINGS, Colors, check_ffmpeg, video_to_ascii
+
+# Пакетная конвертация без интерактивного меню (например, из cron):
+#   python batch_convert.py --png --video -j 4 "clips/*.mp4" other.mov
+#
+# Настройки те же, что в меню vid2.py: флаги командной строки или JSON
+# файл (--config) с ключами DEFAULT_SETTINGS; флаги важнее файла.
+# Файлы распределяются по пулу процессов (--jobs), каждый файл
+# конвертируется своим конвейером в ту же структуру папок, что и в
+# vid2.py. Код выхода: 0 - все файлы готовы, 1 - были ошибки,
+# 2 - неверные аргументы.
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm')
+
+# Флаг командной строки -> ключ настроек
+FLAG_SETTINGS = {
+    'width': 'width',
+    'invert': 'invert',
+    'transparent': 'transparent',
+    'threshold': 'threshold',
+    'color': 'color',
+    'random_colors': 'random_colors',
+    'background': 'background',
+    'font_quality': 'font_quality',
+    'txt': 'save_txt',
+    'png': 'save_frames',
+    'video': 'save_video',
+    'container': 'save_container',
+    'stream': 'save_stream',
+    'stream_compression': 'stream_compression',
+    'ffmpeg_decode': 'ffmpeg_decode',
+    'workers': 'workers',
+    'output': 'output_dir',
+    'resume': 'resume',
+    'cache_quota_gb': 'cache_quota_gb',
+    'profile': 'profile',
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетная конвертация видео в ASCII")
+    parser.add_argument('inputs', nargs='+', help="видеофайлы, папки или шаблоны (clips/*.mp4, **/*.mov)")
+    parser.add_argument('-c', '--config', help="JSON файл с настройками (ключи как в меню vid2.py)")
+    parser.add_argument('-o', '--output', help="папка для проектов (по умолчанию Загрузки/ASCII_Videos)")
+    parser.add_argument('-j', '--jobs', type=int, help="сколько файлов конвертировать одновременно")
+    parser.add_argument('--workers', type=int, help="процессов конвертации на один файл")
+    parser.add_argument('-v', '--verbose', action='store_true', help="показывать вывод конвертации")
+    parser.add_argument('--resume', action=argparse.BooleanOptionalAction,
+                        help="продолжать прерванные конвертации, пропускать законченные")
+    parser.add_argument('--cache-quota-gb', type=float,
+                        help="ограничение размера папки вывода: старые проекты удаляются")
+    parser.add_argument('--profile', action=argparse.BooleanOptionalAction,
+                        help="замер стадий: profile.json в папке проекта, узкое место в статусе")
+
+    style = parser.add_argument_group("настройки ASCII")
+    style.add_argument('--width', type=int, help="ширина в символах")
+    style.add_argument('--invert', action=argparse.BooleanOptionalAction)
+    style.add_argument('--transparent', action=argparse.BooleanOptionalAction)
+    style.add_argument('--threshold', type=int, help="порог прозрачности 0-255")
+    style.add_argument('--color', choices=[name for name in ASCII_COLORS if name != 'reset'])
+    style.add_argument('--random-colors', action=argparse.BooleanOptionalAction)
+    style.add_argument('--background', choices=list(BACKGROUND_COLORS))
+    style.add_argument('--font-quality', choices=['high', 'medium', 'low'])
+    style.add_argument('--ffmpeg-decode', action=argparse.BooleanOptionalAction,
+                       help="ffmpeg уменьшает кадры сразу до сетки символов")
+
+    save = parser.add_argument_group("сохранение")
+    save.add_argument('--txt', action=argparse.BooleanOptionalAction, help="frame_XXXXXX.txt")
+    save.add_argument('--png', action=argparse.BooleanOptionalAction, help="frame_XXXXXX.png")
+    save.add_argument('--video', action=argparse.BooleanOptionalAction, help="MP4 (нужен ffmpeg)")
+    save.add_argument('--container', action=argparse.BooleanOptionalAction, help="один файл frames.ascv")
+    save.add_argument('--stream', action=argparse.BooleanOptionalAction, help="сжатый поток frames.ascz")
+    save.add_argument('--stream-compression', choices=list(COMPRESSION), help="сжатие потока (по умолчанию zlib)")
+    return parser, parser.parse_args(argv)
+
+
+def load_settings(parser, args):
+    """Настройки по умолчанию <- JSON файл <- флаги командной строки"""
+    settings = dict(DEFAULT_SETTINGS)
+    if args.config:
+        try:
+            with open(args.config, encoding='utf-8') as f:
+                overrides = json.load(f)
+        except (OSError, ValueError) as e:
+            parser.error(f"не удалось прочитать {args.config}: {e}")
+        if not isinstance(overrides, dict):
+            parser.error(f"{args.config}: ожидается JSON объект с настройками")
+        unknown = set(overrides) - set(DEFAULT_SETTINGS)
+        if unknown:
+            parser.error(f"неизвестные ключи в {args.config}: {', '.join(sorted(unknown))}")
+        settings.update(overrides)
+
+    for flag, key in FLAG_SETTINGS.items():
+        value = getattr(args, flag)
+        if value is not None:
+            settings[key] = value
+
+    # Без терминала: ни просмотра, ни зацикливания
+    settings['preview'] = False
+    settings['loop'] = False
+    return settings
+
+
+def expand_inputs(patterns):
+    """Файлы, папки (видео внутри) и шаблоны -> список путей; ненайденное отдельно"""
+    files = []
+    missing = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = sorted(os.path.join(pattern, name) for name in os.listdir(pattern)
+                             if name.lower().endswith(VIDEO_EXTENSIONS))
+        elif os.path.isfile(pattern):
+            matches = [pattern]
+        else:
+            matches = sorted(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path))
+        if matches:
+            files.extend(matches)
+        else:
+            missing.append(pattern)
+
+    # Один файл, попавший под несколько шаблонов, конвертируется один раз
+    unique = list(dict.fromkeys(os.path.abspath(path) for path in files))
+    return unique, missing
+
+
+def convert_file(video_path, settings, verbose=False):
+    """Конвертация одного файла в процессе пула; возвращает статус"""
+    start = time.monotonic()
+    try:
+        if verbose:
+            result = video_to_ascii(video_path, settings, interactive=False)
+        else:
+            with open(os.devnull, 'w') as devnull, \
+                    contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+                result = video_to_ascii(video_path, settings, interactive=False)
+    except Exception as e:
+        result = {'ok': False, 'frames': 0, 'path': None, 'error': f"{type(e).__name__}: {e}"}
+    result['input'] = video_path
+    result['time'] = time.monotonic() - start
+    return result
+
+
+def print_status(result, done, total):
+    name = os.path.basename(result['input'])
+    prefix = f"[{done}/{total}]"
+    if result.get('skipped'):
+        print(f"{Colors.GREEN}{prefix} ПРОПУЩЕН {name}: уже сконвертирован -> {result['path']}{Colors.RESET}")
+    elif result['ok']:
+        duplicates = f" (повторов {result['duplicates']})" if result.get('duplicates') else ""
+        profile = result.get('profile')
+        speed = f", {profile['fps']:.1f} кадр/с, узкое место: {profile['bottleneck']}" if profile else ""
+        print(f"{Colors.GREEN}{prefix} OK {name}: {result['frames']} кадров{duplicates} за {result['time']:.1f} с"
+              f"{speed} -> {result['path']}{Colors.RESET}")
+    else:
+        print(f"{Colors.RED}{prefix} ОШИБКА {name}: {result['error']}{Colors.RESET}")
+    sys.stdout.flush()
+
+
+def main(argv=None):
+    parser, args = parse_args(argv)
+    settings = load_settings(parser, args)
+
+    if not (settings['save_txt'] or settings['save_frames'] or settings['save_video'] or settings['save_container']
+            or settings['save_stream']):
+        parser.error("не выбран ни один формат сохранения (--txt, --png, --video, --container, --stream)")
+    if (settings['save_video'] or settings['ffmpeg_decode']) and not check_ffmpeg():
+        parser.error("ffmpeg не найден, а --video/--ffmpeg-decode требуют его")
+
+    files, missing = expand_inputs(args.inputs)
+    for pattern in missing:
+        print(f"{Colors.RED}Не найдено: {pattern}{Colors.RESET}")
+    if not files:
+        return 1
+
+    # Ядра делятся между файлами: jobs файлов по workers процессов
+    jobs = max(1, min(args.jobs or max(1, (os.cpu_count() or 2) // 2), len(files)))
+    if settings['workers'] is None:
+        settings['workers'] = max(1, default_workers() // jobs)
+
+    print(f"{Colors.BLUE}Файлов: {len(files)}, одновременно: {jobs}, "
+          f"процессов на файл: {settings['workers']}{Colors.RESET}")
+
+    results = []
+    start = time.monotonic()
+    # ProcessPoolExecutor: процессы не демоны и могут запускать пул конвейера
+    executor = ProcessPoolExecutor(max_workers=jobs)
+    try:
+        # Папки проектов адресуются содержимым видео: одноименные файлы не пересекаются,
+        # а ограничение места действует на всю папку вывода
+        futures = [executor.submit(convert_file, path, settings, args.verbose) for path in files]
+        for future in as_completed(futures):
+            results.append(future.result())
+            print_status(results[-1], len(results), len(files))
+    except KeyboardInterrupt:
+        print(f"\n{Colors.YELLOW}Остановлено{Colors.RESET}")
+        executor.shutdown(wait=False, cancel_futures=True)
+        return 130
+    executor.shutdown()
+
+    failed = [r for r in results if not r['ok']]
+    print(f"\n{Colors.WHITE}Готово за {time.monotonic() - start:.1f} с: "
+          f"успешно {len(results) - len(failed)}, с ошибками {len(failed) + len(missing)}{Colors.RESET}")
+    for result in failed:
+        print(f"{Colors.RED}  {result['input']}: {result['error']}{Colors.RESET}")
+
+    return 1 if failed or missing else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
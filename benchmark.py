@@ -0,0 +1,330 @@
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from ascii_engine import AsciiMapper, resize_to_grid, to_gray
+from profiler import peak_rss_mb
+from vid2 import DEFAULT_SETTINGS, Colors, calculate_proper_height, check_ffmpeg, get_render_spec, video_to_ascii
+
+# Замер скорости стадий конвертации на синтетических видео:
+#   python benchmark.py                          # 480p и 1080p, все клипы и стадии
+#   python benchmark.py --resolutions 4k --clips noise motion
+#   python benchmark.py --save-baseline          # текущие результаты - эталон
+#
+# Клипы генерируются локально (и переиспользуются): плавный градиент,
+# шум (худший случай для сжатия и повторов), статичная сцена и быстрое
+# движение. Каждая стадия замеряется отдельно - время считается только
+# для нее, предыдущие стадии выполняются вне замера:
+#   decode   - cv2.VideoCapture.read()
+#   resize   - серый кадр и уменьшение до сетки символов
+#   map      - сетка индексов символов и текст кадра
+#   render   - отрисовка кадра в исходном разрешении (атлас глифов)
+#   png      - сжатие PNG и запись файла
+#   encode   - кодирование в MP4 через ffmpeg
+#   terminal - кодирование разницы кадров для терминала и вывод
+#   convert  - video_to_ascii целиком (TXT + PNG + MP4, без просмотра)
+# Каждая пара (клип, стадия) идет в своем процессе, поэтому пиковая
+# память (RSS) относится к одной стадии. Если есть эталон и кадров в
+# секунду меньше эталона больше чем на --tolerance, код выхода 1.
+
+RESOLUTIONS = {
+    '480p': (854, 480),
+    '1080p': (1920, 1080),
+    '4k': (3840, 2160),
+}
+CLIPS = ('gradient', 'noise', 'static', 'motion')
+STAGES = ('decode', 'resize', 'map', 'render', 'png', 'encode', 'terminal', 'convert')
+# Стадии, которым нужен ffmpeg
+FFMPEG_STAGES = ('encode', 'convert')
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+CLIP_FPS = 30
+
+
+def synthetic_frame(kind, index, width, height, rng):
+    """BGR кадр синтетического клипа"""
+    if kind == 'noise':
+        return rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    if kind == 'gradient':
+        # Градиент медленно сдвигается: соседние кадры почти одинаковы
+        gray = (x + y + index * 2) % 256
+    else:
+        gray = (x + y) / 2
+    frame = cv2.cvtColor(gray.astype(np.uint8), cv2.COLOR_GRAY2BGR)
+
+    radius = max(8, height // 8)
+    if kind == 'static':
+        cv2.circle(frame, (width // 3, height // 2), radius, (255, 255, 255), -1)
+        cv2.rectangle(frame, (width // 2, height // 4), (width * 3 // 4, height * 3 // 4), (0, 0, 0), -1)
+    elif kind == 'motion':
+        # Быстрое движение и панорама: меняется почти весь кадр
+        frame = np.roll(frame, index * width // 20, axis=1)
+        for shape in range(6):
+            cx = (index * (17 + shape * 9) + shape * width // 6) % width
+            cy = int(height / 2 + np.sin(index / 5 + shape) * height / 3)
+            cv2.circle(frame, (cx, cy), radius, (255, 255 - shape * 40, shape * 40), -1)
+    return frame
+
+
+def generate_clip(path, kind, size, frames):
+    """Записывает синтетический клип (если его еще нет)"""
+    if os.path.exists(path):
+        return path
+    width, height = size
+    temp_path = path + '.tmp.mp4'
+    writer = cv2.VideoWriter(temp_path, cv2.VideoWriter_fourcc(*'mp4v'), CLIP_FPS, (width, height))
+    if not writer.isOpened():
+        raise RuntimeError(f"OpenCV не может записать {temp_path}")
+    rng = np.random.default_rng(0)
+    for index in range(frames):
+        writer.write(synthetic_frame(kind, index, width, height, rng))
+    writer.release()
+    os.replace(temp_path, path)
+    return path
+
+
+class _NullStream:
+    def write(self, data):
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+def _timed_frames(path, limit):
+    cap = cv2.VideoCapture(path)
+    try:
+        for _ in range(limit):
+            started = time.perf_counter()
+            ret, frame = cap.read()
+            elapsed = time.perf_counter() - started
+            if not ret:
+                return
+            yield frame, elapsed
+    finally:
+        cap.release()
+
+
+def _convert_stage(path, width_chars, workdir):
+    config = dict(DEFAULT_SETTINGS, width=width_chars, save_txt=True, save_frames=True, save_video=True,
+                  preview=False, output_dir=workdir)
+    with open(os.devnull, 'w') as devnull, \
+            contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+        started = time.perf_counter()
+        result = video_to_ascii(path, config, interactive=False)
+        elapsed = time.perf_counter() - started
+    if not result['ok']:
+        raise RuntimeError(result['error'])
+    return result['frames'], elapsed
+
+
+def run_stage(stage, path, width_chars, frames):
+    """Замер одной стадии (в отдельном процессе); возвращает кадры, секунды и память"""
+    with tempfile.TemporaryDirectory(prefix='vid_bench_') as workdir:
+        if stage == 'convert':
+            count, elapsed = _convert_stage(path, width_chars, workdir)
+            return {'frames': count, 'seconds': elapsed, 'rss_mb': peak_rss_mb()}
+
+        cap = cv2.VideoCapture(path)
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        cap.release()
+        height_chars = calculate_proper_height(width_chars, width, height)
+        grid = (width_chars, height_chars)
+        mapper = AsciiMapper()
+
+        renderer = None
+        if stage in ('render', 'png', 'encode'):
+            from frame_pipeline import create_renderer
+            renderer = create_renderer(get_render_spec(width_chars, height_chars, width, height, DEFAULT_SETTINGS),
+                                       mapper.glyphs)
+        writer = None
+        if stage == 'encode':
+            from ffmpeg_io import FFmpegWriter
+            writer = FFmpegWriter(os.path.join(workdir, 'bench.mp4'), width, height, CLIP_FPS)
+        preview = None
+        if stage == 'terminal':
+            from terminal_player import TerminalPreview
+            preview = TerminalPreview(mapper, CLIP_FPS, stream=_NullStream(), paced=False)
+            preview.start()
+
+        count = 0
+        elapsed = 0.0
+        for frame, decode_time in _timed_frames(path, frames):
+            if stage == 'decode':
+                elapsed += decode_time
+                count += 1
+                continue
+
+            started = time.perf_counter()
+            resized = resize_to_grid(to_gray(frame), grid)
+            if stage == 'resize':
+                elapsed += time.perf_counter() - started
+                count += 1
+                continue
+
+            started = time.perf_counter()
+            indices = mapper.map(resized)
+            if stage == 'map':
+                mapper.to_text(indices)
+                elapsed += time.perf_counter() - started
+            elif stage == 'terminal':
+                started = time.perf_counter()
+                preview.show(indices)
+                elapsed += time.perf_counter() - started
+            else:
+                started = time.perf_counter()
+                rendered = renderer.render(indices)
+                if stage == 'render':
+                    elapsed += time.perf_counter() - started
+                elif stage == 'png':
+                    started = time.perf_counter()
+                    ok, encoded = cv2.imencode('.png', cv2.cvtColor(rendered, cv2.COLOR_RGB2BGR))
+                    with open(os.path.join(workdir, f"frame_{count:06d}.png"), 'wb') as f:
+                        f.write(encoded.tobytes())
+                    elapsed += time.perf_counter() - started
+                else:
+                    started = time.perf_counter()
+                    writer.write(rendered.copy())
+                    elapsed += time.perf_counter() - started
+            count += 1
+
+        if writer is not None:
+            # Кодирование идет в фоне: ждем его окончания в замере
+            started = time.perf_counter()
+            writer.close()
+            elapsed += time.perf_counter() - started
+        return {'frames': count, 'seconds': elapsed, 'rss_mb': peak_rss_mb()}
+
+
+def measure(stage, path, width_chars, frames, repeat):
+    """Лучший из repeat замеров, каждый в новом процессе"""
+    best = None
+    for _ in range(repeat):
+        # Новый процесс на каждый замер: память стадии не смешивается с другими.
+        # ProcessPoolExecutor, а не Pool: convert запускает свой пул процессов
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+            result = executor.submit(run_stage, stage, path, width_chars, frames).result()
+        result['fps'] = result['frames'] / result['seconds'] if result['seconds'] > 0 else float('inf')
+        if best is None or result['fps'] > best['fps']:
+            best = result
+    return best
+
+
+def load_baseline(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(path, settings, results, previous=None):
+    """Записывает результаты как эталон (замеры других клипов из старого эталона сохраняются)"""
+    stored = {}
+    if previous and previous.get('settings') == settings:
+        stored.update(previous['results'])
+    stored.update({key: round(result['fps'], 2) for key, result in results.items()})
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump({'settings': settings, 'results': stored}, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(temp_path, path)
+
+
+def print_result(key, result, reference, tolerance):
+    """Строка отчета; возвращает True, если скорость упала ниже эталона"""
+    rss = f"{result['rss_mb']:8.0f}" if result['rss_mb'] is not None else "     н/д"
+    line = f"{key:<28} {result['fps']:10.1f} {rss}"
+    if reference is None:
+        print(line)
+        return False
+    change = result['fps'] / reference - 1
+    regressed = change < -tolerance
+    color = Colors.RED if regressed else Colors.GREEN
+    print(f"{line} {color}{change:+8.0%}{' ЗАМЕДЛЕНИЕ' if regressed else ''}{Colors.RESET}")
+    return regressed
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Замер скорости стадий конвертации на синтетических видео")
+    parser.add_argument('--resolutions', nargs='+', choices=list(RESOLUTIONS), default=['480p', '1080p'])
+    parser.add_argument('--clips', nargs='+', choices=CLIPS, default=list(CLIPS))
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES))
+    parser.add_argument('--frames', type=int, default=90, help="кадров в клипе")
+    parser.add_argument('--width', type=int, default=120, help="ширина в символах")
+    parser.add_argument('--repeat', type=int, default=1, help="замеров на стадию (берется лучший)")
+    parser.add_argument('--videos-dir', default=os.path.join(tempfile.gettempdir(), 'vid_benchmark'),
+                        help="куда сохранять синтетические клипы")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="файл эталона")
+    parser.add_argument('--save-baseline', action='store_true', help="записать результаты как эталон")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="допустимое замедление относительно эталона (0.25 = 25%%)")
+    parser.add_argument('--json', help="сохранить результаты в JSON файл")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Процессы замеров импортируют pygame: без его приветствия в отчете
+    os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+    stages = list(args.stages)
+    if not check_ffmpeg():
+        skipped = [stage for stage in stages if stage in FFMPEG_STAGES]
+        if skipped:
+            print(f"{Colors.YELLOW}ffmpeg не найден, пропускаются: {', '.join(skipped)}{Colors.RESET}")
+        stages = [stage for stage in stages if stage not in FFMPEG_STAGES]
+
+    settings = {'frames': args.frames, 'width': args.width}
+    baseline = load_baseline(args.baseline)
+    references = {}
+    if baseline is not None:
+        if baseline.get('settings') == settings:
+            references = baseline['results']
+        else:
+            print(f"{Colors.YELLOW}Эталон {args.baseline} снят с другими настройками "
+                  f"({baseline.get('settings')}), сравнение пропускается{Colors.RESET}")
+
+    os.makedirs(args.videos_dir, exist_ok=True)
+    print(f"{Colors.WHITE}{'клип/стадия':<28} {'кадр/с':>10} {'RSS, МБ':>8} {'к эталону':>8}{Colors.RESET}")
+
+    results = {}
+    regressions = []
+    for resolution in args.resolutions:
+        for clip in args.clips:
+            name = f"{clip}_{resolution}"
+            path = generate_clip(os.path.join(args.videos_dir, f"{name}_{args.frames}.mp4"),
+                                 clip, RESOLUTIONS[resolution], args.frames)
+            for stage in stages:
+                key = f"{name}/{stage}"
+                results[key] = measure(stage, path, args.width, args.frames, max(1, args.repeat))
+                if print_result(key, results[key], references.get(key), args.tolerance):
+                    regressions.append(key)
+                sys.stdout.flush()
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'settings': settings, 'results': results}, f, ensure_ascii=False, indent=1)
+    if args.save_baseline:
+        save_baseline(args.baseline, settings, results, baseline)
+        print(f"{Colors.GREEN}Эталон записан: {args.baseline}{Colors.RESET}")
+    elif regressions:
+        print(f"\n{Colors.RED}Замедление больше {args.tolerance:.0%} относительно эталона: "
+              f"{', '.join(regressions)}{Colors.RESET}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
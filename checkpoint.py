@@ -0,0 +1,226 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+
+# Кеш результатов конвертации и продолжение прерванной конвертации.
+#
+# Папка проекта адресуется содержимым: ее имя - имя видео плюс хеш от
+# отпечатка исходного файла (размер, время изменения, хеш выборочных
+# кусков) и от всех настроек, влияющих на результат. Поэтому:
+#   - повторная конвертация того же видео с теми же настройками находит
+#     готовые файлы сразу, без перебора папок;
+#   - разные видео с одинаковым именем или другие настройки (качество
+#     шрифта, форматы сохранения) не попадают в чужую папку.
+#
+# В папке проекта лежит progress.json: сколько кадров уже записано во все
+# выбранные форматы. Прогресс записывается периодически и при остановке;
+# повторный запуск перематывает видео к первому незаписанному кадру и
+# дописывает файлы. Видео пишется отрезками (SegmentedVideoWriter), и
+# готовые отрезки тоже не кодируются заново.
+#
+# evict_projects() удаляет давно не использованные проекты, пока папка
+# вывода не уложится в ограничение места.
+
+CHECKPOINT_NAME = 'progress.json'
+
+# Выборка для отпечатка: столько кусков по столько байт равномерно по файлу
+SAMPLE_CHUNKS = 8
+SAMPLE_SIZE = 64 * 1024
+
+
+def source_fingerprint(video_path):
+    """Быстрый отпечаток файла: размер, время изменения и хеш выборочных кусков
+
+    Читается не больше SAMPLE_CHUNKS * SAMPLE_SIZE байт независимо от
+    размера видео. Путь в отпечаток не входит: перемещенный файл узнается.
+    """
+    stat = os.stat(video_path)
+    digest = hashlib.blake2b(digest_size=16)
+    with open(video_path, 'rb') as f:
+        if stat.st_size <= SAMPLE_CHUNKS * SAMPLE_SIZE:
+            digest.update(f.read())
+        else:
+            step = (stat.st_size - SAMPLE_SIZE) // (SAMPLE_CHUNKS - 1)
+            for chunk in range(SAMPLE_CHUNKS):
+                f.seek(chunk * step)
+                digest.update(f.read(SAMPLE_SIZE))
+    return {'size': stat.st_size, 'mtime': int(stat.st_mtime), 'sample': digest.hexdigest()}
+
+
+def _canonical(value):
+    """Каноническая запись: одинаковые настройки - одинаковые байты"""
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+
+
+def _normalize(value):
+    # Кортежи становятся списками, как после чтения из JSON
+    return json.loads(_canonical(value))
+
+
+def cache_id(source, key):
+    """Адрес результата: хеш отпечатка видео и полного набора настроек"""
+    return hashlib.blake2b(_canonical([source, key]).encode('utf-8'), digest_size=8).hexdigest()
+
+
+def project_folder(output_dir, video_path, source, key):
+    """Папка проекта для этого видео с этими настройками"""
+    video_name = os.path.splitext(os.path.basename(video_path))[0]
+    return os.path.join(output_dir, f"{video_name}_{cache_id(source, key)}")
+
+
+class ConversionCheckpoint:
+    """Прогресс конвертации одного видео в папке проекта
+
+    key - все, от чего зависит результат (сетка, настройки символов и
+    рендера, форматы): продолжить можно только с тем же ключом.
+    segments - готовые отрезки видео [{'file': имя, 'frames': кадров}].
+    last_used - когда проект последний раз создавался или выдавался из
+    кеша (по нему выбираются проекты для удаления).
+    """
+
+    def __init__(self, project_path, source, key, frames_done=0, segments=(), complete=False, last_used=None):
+        self.project_path = project_path
+        self.source = source
+        self.key = _normalize(key)
+        self.frames_done = frames_done
+        self.segments = list(segments)
+        self.complete = complete
+        self.last_used = last_used if last_used is not None else time.time()
+
+    @property
+    def path(self):
+        return os.path.join(self.project_path, CHECKPOINT_NAME)
+
+    @classmethod
+    def create(cls, project_path, source, key):
+        checkpoint = cls(project_path, source, key)
+        checkpoint.save()
+        return checkpoint
+
+    @classmethod
+    def load(cls, project_path):
+        """Прогресс из папки проекта (None, если его нет или он поврежден)"""
+        try:
+            with open(os.path.join(project_path, CHECKPOINT_NAME), encoding='utf-8') as f:
+                data = json.load(f)
+            return cls(project_path, data['source'], data['key'], data['frames_done'],
+                       data.get('segments', ()), data.get('complete', False), data.get('last_used'))
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def matches(self, source, key):
+        return self.source == source and self.key == _normalize(key)
+
+    def save(self):
+        data = {
+            'source': self.source,
+            'key': self.key,
+            'frames_done': self.frames_done,
+            'segments': self.segments,
+            'complete': self.complete,
+            'last_used': self.last_used,
+        }
+        # Запись через временный файл: прерывание не портит прогресс
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(temp_path, self.path)
+
+    def touch(self):
+        """Проект снова использован: удаляется позже остальных"""
+        self.last_used = time.time()
+        self.save()
+
+    def commit(self, frames_done, segments=None):
+        """Кадры 0..frames_done-1 записаны во все форматы"""
+        self.frames_done = frames_done
+        if segments is not None:
+            self.segments = list(segments)
+        self.save()
+
+    def commit_outputs(self, frames_done, container=None, video_writer=None, stream=None):
+        """Записывает прогресс: учитываются только кадры, записанные во все форматы
+
+        container - AsciiContainerWriter, video_writer - SegmentedVideoWriter,
+        stream - AsciiStreamWriter.
+        """
+        if container is not None:
+            container.flush()
+        if stream is not None:
+            stream.flush()
+        if video_writer is not None:
+            # Видео готово только до конца последнего отрезка, который ffmpeg
+            # уже дописал. После остановки отрезок закрыт, и в нем может
+            # оказаться кадр, который уже записан в остальные форматы, но еще
+            # не посчитан
+            self.commit(*video_writer.committed())
+        else:
+            self.commit(frames_done)
+
+    def finish(self):
+        self.complete = True
+        self.last_used = time.time()
+        self.save()
+
+
+def lookup(output_dir, video_path, key):
+    """Папка проекта и его прогресс (None, если конвертации еще не было)
+
+    Возвращает (project_path, source, checkpoint): source - отпечаток
+    видео для ConversionCheckpoint.create.
+    """
+    source = source_fingerprint(video_path)
+    project_path = project_folder(output_dir, video_path, source, key)
+    checkpoint = ConversionCheckpoint.load(project_path)
+    if checkpoint is not None and not checkpoint.matches(source, key):
+        checkpoint = None
+    return project_path, source, checkpoint
+
+
+def folder_size(path):
+    """Место на диске под папкой: повторы кадров - жесткие ссылки, файл считается один раз"""
+    total = 0
+    seen = set()
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                stat = os.stat(os.path.join(root, name))
+            except OSError:
+                continue
+            key = (stat.st_dev, stat.st_ino)
+            if key not in seen:
+                seen.add(key)
+                total += stat.st_size
+    return total
+
+
+def evict_projects(output_dir, max_bytes, keep=()):
+    """Удаляет давно не использованные проекты, пока их размер больше max_bytes
+
+    Учитываются только законченные проекты (папки с progress.json, созданные
+    этим кешем): незаконченный может сейчас писать другой процесс. Проекты
+    из keep (текущий) не удаляются. Возвращает удаленные папки.
+    """
+    if not os.path.isdir(output_dir):
+        return []
+    keep = {os.path.abspath(path) for path in keep}
+    projects = []
+    for name in os.listdir(output_dir):
+        path = os.path.join(output_dir, name)
+        checkpoint = ConversionCheckpoint.load(path)
+        if checkpoint is not None and checkpoint.complete:
+            projects.append((checkpoint.last_used, path, folder_size(path)))
+
+    total = sum(size for _, _, size in projects)
+    removed = []
+    for _, path, size in sorted(projects):
+        if total <= max_bytes:
+            break
+        if os.path.abspath(path) in keep:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        removed.append(path)
+    return removed
@@ -0,0 +1,373 @@
+import collections
+import os
+import queue
+import subprocess
+import threading
+
+import cv2
+import numpy as np
+
+# Потоковая работа с ffmpeg через пайпы.
+# Кадры передаются ffmpeg как rawvideo прямо в stdin, без временных PNG.
+# FFmpegGrayReader - обратное направление: ffmpeg сам уменьшает кадр до
+# сетки символов и переводит в серый при декодировании, в Python
+# приходят только ширина * высота байт на кадр.
+
+# yuv420p требует четных размеров кадра
+EVEN_SIZE_FILTER = "pad=ceil(iw/2)*2:ceil(ih/2)*2"
+
+# Ctrl+C в терминале получает вся группа процессов: ffmpeg, который пишет
+# видео, запускается отдельно и дописывает файл, пока программа
+# обрабатывает остановку
+if os.name == 'nt':
+    DETACHED = {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+else:
+    DETACHED = {'start_new_session': True}
+
+# Параметры кодирования по умолчанию (как при сборке из PNG)
+DEFAULT_VIDEO_ARGS = ['-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-crf', '18', '-preset', 'medium']
+
+
+class FFmpegError(RuntimeError):
+    """ffmpeg завершился с ошибкой или закрыл пайп раньше времени"""
+
+
+class FFmpegWriter:
+    """Кодирует RGB кадры в видео, отправляя их в stdin ffmpeg
+
+    Запись идет в отдельном потоке через ограниченную очередь, поэтому
+    кодирование перекрывается с подготовкой следующих кадров, а память
+    не растет, если ffmpeg не успевает. Если ffmpeg падает, следующий
+    write() или close() выбрасывает FFmpegError с хвостом его stderr.
+    """
+
+    def __init__(self, output_path, width, height, fps, video_args=None, queue_size=8):
+        self.output_path = output_path
+        self.width = width
+        self.height = height
+        self.frame_size = width * height * 3
+        self.frames_written = 0
+
+        if video_args is None:
+            video_args = DEFAULT_VIDEO_ARGS
+
+        command = [
+            'ffmpeg', '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+            '-s', f'{width}x{height}', '-framerate', str(fps),
+            '-i', '-',
+            '-vf', EVEN_SIZE_FILTER,
+        ] + list(video_args) + ['-r', str(fps), output_path]
+
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE,
+                                         stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, **DETACHED)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._error = None
+        self._closed = False
+        self._stderr_tail = collections.deque(maxlen=20)
+
+        self._stderr_thread = threading.Thread(target=self._drain_stderr, daemon=True)
+        self._stderr_thread.start()
+        self._writer_thread = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer_thread.start()
+
+    def _drain_stderr(self):
+        for line in self._process.stderr:
+            self._stderr_tail.append(line.decode('utf-8', 'replace').rstrip())
+
+    def _write_loop(self):
+        while True:
+            data = self._queue.get()
+            if data is None:
+                break
+            if self._error is not None:
+                # ffmpeg уже упал: разбираем очередь, чтобы не блокировать write()
+                continue
+            try:
+                self._process.stdin.write(data)
+            except (BrokenPipeError, OSError) as e:
+                self._error = e
+
+    def _raise_error(self, message):
+        details = "\n".join(self._stderr_tail)
+        raise FFmpegError(f"{message}: {details}" if details else message)
+
+    def write(self, frame):
+        """Ставит кадр (высота, ширина, 3) uint8 RGB в очередь на кодирование"""
+        if self._error is not None:
+            self.abort()
+            self._raise_error("ffmpeg прервал запись")
+        if frame.shape != (self.height, self.width, 3):
+            raise ValueError(f"Неверный размер кадра {frame.shape}, ожидается {(self.height, self.width, 3)}")
+        # Копия байтов: рендерер переиспользует свой буфер
+        self._queue.put(frame.tobytes())
+        self.frames_written += 1
+
+    @property
+    def queue_depth(self):
+        """Кадров в очереди на кодирование"""
+        return self._queue.qsize()
+
+    def close(self):
+        """Дожидается записи всех кадров и завершения ffmpeg"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer_thread.join()
+        try:
+            self._process.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+        returncode = self._process.wait()
+        self._stderr_thread.join()
+
+        if self._error is not None or returncode != 0:
+            self._raise_error(f"ffmpeg завершился с кодом {returncode}")
+
+    def abort(self):
+        """Останавливает ffmpeg без ожидания оставшихся кадров"""
+        if self._closed:
+            return
+        self._closed = True
+        self._process.kill()
+        self._queue.put(None)
+        self._writer_thread.join()
+        self._process.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None or exc_type is KeyboardInterrupt:
+            self.close()
+        else:
+            self.abort()
+
+
+def concat_videos(paths, output_path):
+    """Склеивает видео с одинаковыми параметрами без перекодирования"""
+    list_path = output_path + '.concat.txt'
+    with open(list_path, 'w', encoding='utf-8') as f:
+        for path in paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    try:
+        result = subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0',
+                                 '-i', list_path, '-c', 'copy', output_path],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    finally:
+        os.remove(list_path)
+    if result.returncode != 0:
+        details = result.stderr.decode('utf-8', 'replace').strip()
+        raise FFmpegError(f"ffmpeg не склеил отрезки видео: {details}")
+
+
+class SegmentedVideoWriter:
+    """FFmpegWriter, который пишет видео отрезками по segment_frames кадров
+
+    Закрытый отрезок - готовый файл, поэтому прерванная конвертация теряет
+    не больше одного отрезка, а продолжение (segments - уже готовые
+    отрезки) кодирует только недостающие кадры. close() закрывает текущий
+    отрезок и склеивает все отрезки в output_path.
+
+    Заполненный отрезок ffmpeg дописывает в фоновом потоке, пока идут
+    следующие кадры; в segments он попадает, только когда файл готов.
+    Ошибка ffmpeg при закрытии отрезка выбрасывается из следующего
+    write() или close().
+    """
+
+    def __init__(self, output_path, segments_dir, width, height, fps, video_args=None,
+                 segment_frames=1800, segments=()):
+        self.output_path = output_path
+        self.segments_dir = segments_dir
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.video_args = video_args
+        self.segment_frames = segment_frames
+        self.segments = list(segments)
+        self._next_segment = len(self.segments)
+        self._writer = None
+        self._segment_name = None
+        # Поток, который закрывает заполненный отрезок, и его ошибка
+        self._finishing = None
+        self._error = None
+        self._lock = threading.Lock()
+        os.makedirs(segments_dir, exist_ok=True)
+
+    def _segment_path(self, name):
+        return os.path.join(self.segments_dir, name)
+
+    def committed(self):
+        """Готовые отрезки и число кадров в них (для прогресса)"""
+        with self._lock:
+            segments = list(self.segments)
+        return sum(segment['frames'] for segment in segments), segments
+
+    def write(self, frame):
+        if self._error is not None:
+            raise self._error
+        if self._writer is None:
+            self._segment_name = f"segment_{self._next_segment:04d}.mp4"
+            self._next_segment += 1
+            self._writer = FFmpegWriter(self._segment_path(self._segment_name), self.width, self.height,
+                                        self.fps, self.video_args)
+        self._writer.write(frame)
+        if self._writer.frames_written >= self.segment_frames:
+            self._close_segment()
+
+    @property
+    def queue_depth(self):
+        return self._writer.queue_depth if self._writer is not None else 0
+
+    def _finish_writer(self, writer, name):
+        # Поток закрытия: Ctrl+C приходит в главный поток и его не прерывает
+        try:
+            writer.close()
+        except Exception as e:
+            self._error = e
+            return
+        with self._lock:
+            self.segments.append({'file': name, 'frames': writer.frames_written})
+
+    def _wait_finishing(self):
+        if self._finishing is not None:
+            if self._finishing.ident is None:
+                # Ctrl+C пришел между созданием потока и его запуском
+                self._finishing.start()
+            self._finishing.join()
+            self._finishing = None
+
+    def _close_segment(self):
+        """Закрывает текущий отрезок в фоне (одновременно закрывается не больше одного)"""
+        self._wait_finishing()
+        # Отрезок переходит к потоку одним присваиванием: остановка не теряет его
+        self._writer, self._finishing = None, threading.Thread(
+            target=self._finish_writer, args=(self._writer, self._segment_name))
+        self._finishing.start()
+
+    def close(self):
+        """Закрывает текущий отрезок и собирает итоговое видео"""
+        if self._writer is not None:
+            self._close_segment()
+        self._wait_finishing()
+        if self._error is not None:
+            raise self._error
+        if self.segments:
+            concat_videos([self._segment_path(segment['file']) for segment in self.segments], self.output_path)
+
+    def abort(self):
+        # Заполненный отрезок дописывается: он уже мог попасть в прогресс
+        self._wait_finishing()
+        if self._writer is not None:
+            self._writer.abort()
+            self._writer = None
+
+    def discard_segments(self):
+        """Удаляет отрезки после сборки законченного видео"""
+        for segment in self.segments:
+            try:
+                os.remove(self._segment_path(segment['file']))
+            except OSError:
+                pass
+        try:
+            os.rmdir(self.segments_dir)
+        except OSError:
+            pass
+
+
+class FFmpegGrayReader:
+    """Источник кадров вместо cv2.VideoCapture: серые кадры размера grid_size
+
+    Поддерживает то, что используют CLI и GUI: read(), grab(), get(),
+    set(cv2.CAP_PROP_POS_FRAMES, n), isOpened(), release(). get() отдает
+    свойства исходного видео (FPS, число кадров, исходные ширину и высоту).
+    """
+
+    def __init__(self, path, grid_size, interpolation='area'):
+        self.path = path
+        self.width, self.height = grid_size
+        self.frame_size = self.width * self.height
+        self.filter = f"scale={self.width}:{self.height}:flags={interpolation},format=gray"
+
+        # Свойства видео читаем через OpenCV: ffprobe не нужен
+        probe = cv2.VideoCapture(path)
+        self._opened = probe.isOpened()
+        self._props = {prop: probe.get(prop) for prop in (
+            cv2.CAP_PROP_FPS, cv2.CAP_PROP_FRAME_COUNT, cv2.CAP_PROP_FRAME_WIDTH, cv2.CAP_PROP_FRAME_HEIGHT)}
+        probe.release()
+
+        self.position = 0
+        self._process = None
+        self._grab_buffer = None
+        if self._opened:
+            self._start(0)
+
+    def _start(self, frame_index):
+        self._stop()
+        command = ['ffmpeg', '-loglevel', 'error', '-nostdin']
+        fps = self._props[cv2.CAP_PROP_FPS]
+        if frame_index > 0 and fps > 0:
+            command += ['-ss', f"{frame_index / fps:.6f}"]
+        command += ['-i', self.path, '-vf', self.filter, '-an', '-sn',
+                    '-f', 'rawvideo', '-pix_fmt', 'gray', '-']
+        self._process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                         bufsize=self.frame_size * 4)
+        self.position = frame_index
+
+    def _stop(self):
+        if self._process is not None:
+            self._process.kill()
+            self._process.stdout.close()
+            self._process.wait()
+            self._process = None
+
+    def _read_into(self, image):
+        """Читает кадр прямо в буфер image; False в конце видео"""
+        if self._process is None:
+            return False
+        view = memoryview(image).cast('B')
+        filled = 0
+        while filled < self.frame_size:
+            count = self._process.stdout.readinto(view[filled:])
+            if not count:
+                return False
+            filled += count
+        self.position += 1
+        return True
+
+    def isOpened(self):
+        return self._opened
+
+    def read(self, image=None):
+        """(True, кадр (высота, ширина) uint8) или (False, None) в конце видео
+
+        Как и у cv2.VideoCapture, кадр читается в image, если он подходит.
+        """
+        shape = (self.height, self.width)
+        if image is None or image.shape != shape or image.dtype != np.uint8 or not image.flags.c_contiguous:
+            image = np.empty(shape, dtype=np.uint8)
+        if not self._read_into(image):
+            return False, None
+        return True, image
+
+    def grab(self):
+        if self._grab_buffer is None:
+            self._grab_buffer = np.empty((self.height, self.width), dtype=np.uint8)
+        return self._read_into(self._grab_buffer)
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.position)
+        return self._props.get(prop, 0.0)
+
+    def set(self, prop, value):
+        """Перемотка: ffmpeg перезапускается с нужного кадра"""
+        if prop != cv2.CAP_PROP_POS_FRAMES or not self._opened:
+            return False
+        self._start(int(value))
+        return True
+
+    def release(self):
+        self._stop()
@@ -0,0 +1,253 @@
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import cv2
+
+from ascii_engine import AsciiMapper, grid_digest, resize_to_grid, to_gray
+from profiler import StageClock
+
+# Многопроцессный конвейер конвертации кадров.
+#
+#   декодер (поток)  ->  пул процессов  ->  потребители (frame_sinks)
+#   cap.read() или       серый, ресайз,     TXT / PNG / .ascv / ffmpeg /
+#   FFmpegGrayReader     ASCII, рендер,     терминал, строго по номеру
+#                        сжатие PNG         кадра
+#
+# Число кадров "в работе" ограничено, поэтому память не растет на
+# длинных видео, даже если запись не успевает за декодером.
+#
+# Что делать с кадром, описывает словарь spec (передается в процессы):
+#   'grid'        - (ширина, высота) сетки символов
+#   'interpolation' - интерполяция cv2.resize
+#   'mapper'      - аргументы AsciiMapper (включая camera и invert:
+#                   они применяются таблицей к уменьшенной сетке)
+#   'txt'         - собирать текст кадра
+#   'render'      - None или параметры рендера (см. create_renderer)
+#   'png'         - сжимать отрисованный кадр в PNG
+#   'keep_frame'  - возвращать RGB кадр (например, для ffmpeg)
+#
+# Повторы кадров: процесс хеширует сетку символов (digest) и, если такая
+# же сетка недавно уже была у него, отдает прежние текст, PNG и RGB кадр
+# без рендера и сжатия. Номер первого такого кадра (duplicate_of)
+# проставляет FrameSinks, который видит все кадры по порядку.
+#
+# С profiler (ConversionProfiler) процессы возвращают время своих стадий
+# в timings, а конвейер записывает ожидание кадров и глубину очередей.
+
+FrameResult = namedtuple('FrameResult',
+                         ['index', 'indices', 'text', 'png', 'frame', 'digest', 'duplicate_of', 'timings'],
+                         defaults=(None, None, None))
+
+# Сколько последних отрисованных сеток помнит процесс (RGB кадры большие)
+RECENT_FRAMES = 2
+
+# Сколько ждать кадр, который процесс уже обрабатывает, при остановке (секунды)
+DRAIN_TIMEOUT = 5.0
+
+
+def default_workers():
+    """Число процессов по умолчанию: все ядра, кроме одного под декодер"""
+    return max(1, (os.cpu_count() or 2) - 1)
+
+
+def create_renderer(render, glyphs):
+    """Создает FrameRenderer по параметрам рендера из spec"""
+    from ascii_render import FrameRenderer, get_glyph_atlas
+
+    atlas = get_glyph_atlas(render['font_name'], render['font_size'], glyphs,
+                            render['text_color'], render['bg_color'], render['cell_size'])
+    return FrameRenderer(atlas, render['grid_size'], render['canvas_size'])
+
+
+class FrameProcessor:
+    """Обработка одного кадра: все, что делает рабочий процесс
+
+    profile=True замеряет стадии кадра (FrameResult.timings).
+    """
+
+    def __init__(self, spec, profile=False):
+        self.spec = spec
+        self.profile = profile
+        self.mapper = AsciiMapper(**spec['mapper'])
+        self.renderer = None
+        if spec.get('render'):
+            self.renderer = create_renderer(spec['render'], self.mapper.glyphs)
+        self.frames_reused = 0
+        self._recent = OrderedDict()
+
+    def process(self, index, frame):
+        spec = self.spec
+        clock = StageClock() if self.profile else None
+        # Кадр из FFmpegGrayReader уже серый и размера сетки
+        resized = resize_to_grid(to_gray(frame), spec['grid'], spec.get('interpolation', cv2.INTER_LINEAR))
+        if clock is not None:
+            clock.lap('resize')
+        indices = self.mapper.map(resized)
+        digest = grid_digest(indices)
+        if clock is not None:
+            clock.lap('map')
+        timings = clock.timings if clock is not None else None
+
+        recent = self._recent.get(digest)
+        if recent is not None:
+            # Та же сетка: кадр не рисуется и не сжимается заново
+            self._recent.move_to_end(digest)
+            self.frames_reused += 1
+            return FrameResult(index, indices, *recent, digest, timings=timings)
+
+        text = None
+        if spec.get('txt'):
+            text = self.mapper.to_text(indices)
+            if clock is not None:
+                clock.lap('text')
+
+        png = None
+        rendered = None
+        if self.renderer is not None:
+            rendered = self.renderer.render(indices)
+            if clock is not None:
+                clock.lap('render')
+            if spec.get('png'):
+                ok, encoded = cv2.imencode('.png', cv2.cvtColor(rendered, cv2.COLOR_RGB2BGR))
+                png = encoded.tobytes() if ok else None
+                if clock is not None:
+                    clock.lap('png')
+            # Буфер рендерера переиспользуется, наружу отдаем копию
+            rendered = rendered.copy() if spec.get('keep_frame') else None
+
+        self._recent[digest] = (text, png, rendered)
+        if len(self._recent) > RECENT_FRAMES:
+            self._recent.popitem(last=False)
+        return FrameResult(index, indices, text, png, rendered, digest, timings=timings)
+
+
+# Состояние рабочего процесса (создается один раз в initializer)
+_processor = None
+
+
+def _init_worker(spec, profile):
+    global _processor
+    # Ctrl+C обрабатывает главный процесс
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _processor = FrameProcessor(spec, profile)
+
+
+def _process_frame(task):
+    index, frame = task
+    return _processor.process(index, frame)
+
+
+class FramePipeline:
+    """Итератор по обработанным кадрам видео в исходном порядке
+
+    workers=1 обрабатывает кадры в текущем процессе (без пула).
+    max_pending ограничивает число кадров между декодером и записью.
+    start - номер первого кадра (источник уже перемотан к нему).
+    profiler - ConversionProfiler для замера стадий (None - без замеров).
+    """
+
+    def __init__(self, source, spec, workers=None, max_pending=None, loop=False, start=0, profiler=None):
+        self.source = source
+        self.spec = spec
+        self.workers = workers or default_workers()
+        self.max_pending = max_pending or self.workers * 2
+        self.loop = loop
+        self.profiler = profiler
+        self.frames_decoded = start
+        # Номер кадра после последнего отданного процессам
+        self._dispatched = start
+        self._pool = None
+        self._results = None
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._stopped = threading.Event()
+
+    def _decode(self):
+        """Стадия декодирования: читает кадры, пока есть свободные слоты"""
+        while not self._stopped.is_set():
+            self._slots.acquire()
+            if self._stopped.is_set():
+                return
+            started = time.perf_counter()
+            ret, frame = self.source.read()
+            if self.profiler is not None and ret:
+                self.profiler.add('decode', time.perf_counter() - started)
+            if not ret:
+                if self.loop and self.frames_decoded > 0:
+                    self.source.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    ret, frame = self.source.read()
+                if not ret:
+                    self._slots.release()
+                    return
+            self._dispatched = self.frames_decoded + 1
+            yield self.frames_decoded, frame
+            self.frames_decoded += 1
+
+    def __iter__(self):
+        profile = self.profiler is not None
+        if self.workers == 1:
+            processor = FrameProcessor(self.spec, profile)
+            results = (processor.process(index, frame) for index, frame in self._decode())
+        else:
+            self._pool = multiprocessing.Pool(self.workers, initializer=_init_worker,
+                                              initargs=(self.spec, profile))
+            # imap возвращает результаты строго в порядке кадров
+            results = self._results = self._pool.imap(_process_frame, self._decode())
+
+        try:
+            waiting = time.perf_counter()
+            for result in results:
+                self._slots.release()
+                if profile:
+                    self._profile_frame(result, time.perf_counter() - waiting)
+                yield result
+                waiting = time.perf_counter()
+        finally:
+            self.close()
+
+    def _profile_frame(self, result, waited):
+        profiler = self.profiler
+        profiler.add('wait', waited)
+        profiler.add_frame(result)
+        if self._pool is not None:
+            # Кадры, отданные процессам и еще не записанные
+            profiler.sample_queue('pipeline', self._dispatched - result.index - 1, self.max_pending)
+        # Кадры, декодированные наперед
+        if hasattr(self.source, 'buffered'):
+            profiler.sample_queue('decoded', self.source.buffered, self.source.slots)
+
+    def close(self):
+        """Останавливает декодер и рабочие процессы
+
+        Возвращает ошибку процесса на кадре, который еще не забрали (или
+        None), а не бросает ее: close() вызывается и при остановке по другой
+        ошибке или Ctrl+C, которые она не должна подменять.
+        """
+        error = None
+        self._stopped.set()
+        # Будим декодер, если он ждет свободный слот
+        try:
+            self._slots.release()
+        except ValueError:
+            pass
+        if self._pool is not None:
+            # Кадры, которые процессы уже обрабатывают, забираются до остановки:
+            # процесс, отправляющий большой кадр, держит общую блокировку
+            # очереди результатов, и terminate() ждал бы ее вечно
+            try:
+                while True:
+                    self._results.next(DRAIN_TIMEOUT)
+            except (StopIteration, multiprocessing.TimeoutError):
+                # Кадры кончились или процесс завис: пул все равно останавливается
+                pass
+            except Exception as e:
+                # Ошибка процесса на кадре, который еще не забрали
+                error = e
+            self._results = None
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+        return error
@@ -0,0 +1,223 @@
+import os
+import shutil
+import time
+
+from ascii_engine import DuplicateTracker
+
+# Потребители обработанных кадров (sinks).
+#
+# Кадр растеризуется один раз в рабочем процессе конвейера, после чего
+# один и тот же результат (FrameResult) раздается всем подключенным
+# потребителям по порядку кадров:
+#   TextSink      - frame_XXXXXX.txt
+#   PngSink       - frame_XXXXXX.png (PNG сжат в рабочем процессе)
+#   ContainerSink - один файл .ascv
+#   StreamSink    - сжатый поток изменений .ascz
+#   VideoSink     - RGB кадр в ffmpeg
+#   PreviewSink   - вывод в терминал
+#
+# У потребителя два метода: write(result) и close(), а stage - имя
+# стадии в профиле конвертации (см. profiler.py).
+#
+# Повтор уже встречавшегося кадра (result.duplicate_of) не занимает места:
+# TXT и PNG становятся жесткими ссылками на файлы первого такого кадра,
+# в .ascv пишется ссылка на его номер. В ffmpeg и терминал кадр уходит
+# как обычно.
+
+
+def frame_name(frames_dir, index):
+    return os.path.join(frames_dir, f"frame_{index:06d}")
+
+
+def _remove(path):
+    # Файл мог остаться ссылкой на другой кадр (после продолжения
+    # конвертации): запись в него изменила бы и тот кадр
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def link_frame_file(source, path):
+    """Повтор кадра: жесткая ссылка на файл первого кадра (или копия)
+
+    Возвращает False, если файла первого кадра нет.
+    """
+    _remove(path)
+    try:
+        os.link(source, path)
+    except OSError:
+        # Файловая система без жестких ссылок
+        try:
+            shutil.copyfile(source, path)
+        except OSError:
+            return False
+    return True
+
+
+class TextSink:
+    """Текст кадра в frame_XXXXXX.txt"""
+
+    stage = 'txt'
+
+    def __init__(self, frames_dir):
+        self.frames_dir = frames_dir
+
+    def write(self, result):
+        path = frame_name(self.frames_dir, result.index) + ".txt"
+        if result.duplicate_of is not None and \
+                link_frame_file(frame_name(self.frames_dir, result.duplicate_of) + ".txt", path):
+            return
+        if result.text is not None:
+            _remove(path)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(result.text)
+
+    def close(self):
+        pass
+
+
+class PngSink:
+    """Готовые байты PNG в frame_XXXXXX.png"""
+
+    stage = 'png_file'
+
+    def __init__(self, frames_dir):
+        self.frames_dir = frames_dir
+
+    def write(self, result):
+        path = frame_name(self.frames_dir, result.index) + ".png"
+        if result.duplicate_of is not None and \
+                link_frame_file(frame_name(self.frames_dir, result.duplicate_of) + ".png", path):
+            return
+        if result.png is not None:
+            _remove(path)
+            with open(path, 'wb') as f:
+                f.write(result.png)
+
+    def close(self):
+        pass
+
+
+class ContainerSink:
+    """Сетки индексов символов в файл .ascv (AsciiContainerWriter)"""
+
+    stage = 'ascv'
+
+    def __init__(self, container):
+        self.container = container
+
+    def write(self, result):
+        self.container.append(result.indices, reference=result.duplicate_of)
+
+    def close(self):
+        self.container.close()
+
+
+class StreamSink:
+    """Сетки индексов символов в сжатый поток .ascz (AsciiStreamWriter)"""
+
+    stage = 'ascz'
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, result):
+        self.stream.append(result.indices)
+
+    def close(self):
+        self.stream.close()
+
+
+class VideoSink:
+    """Отрисованный кадр в ffmpeg (FFmpegWriter); ошибки ffmpeg пробрасываются"""
+
+    stage = 'ffmpeg'
+
+    def __init__(self, video_writer):
+        self.video_writer = video_writer
+
+    def write(self, result):
+        if result.frame is not None:
+            self.video_writer.write(result.frame)
+
+    @property
+    def queue_depth(self):
+        return self.video_writer.queue_depth
+
+    def close(self):
+        self.video_writer.close()
+
+
+class PreviewSink:
+    """Кадр в терминал (TerminalPreview); при зацикливании еще и в FrameCache"""
+
+    stage = 'terminal'
+
+    def __init__(self, preview, cache=None):
+        self.preview = preview
+        self.cache = cache
+
+    def write(self, result):
+        if self.cache is not None:
+            self.cache.add(result.indices)
+        self.preview.show(result.indices)
+
+    def close(self):
+        pass
+
+
+class FrameSinks:
+    """Раздает каждый кадр всем потребителям в порядке их добавления
+
+    Перед раздачей кадр сверяется с уже записанными: повтору проставляется
+    duplicate_of (см. DuplicateTracker). С profiler (ConversionProfiler)
+    замеряется запись в каждого потребителя.
+    """
+
+    def __init__(self, sinks=(), profiler=None):
+        self.sinks = [sink for sink in sinks if sink is not None]
+        self.frames_written = 0
+        self.duplicates = DuplicateTracker()
+        self.profiler = profiler
+
+    def add(self, sink):
+        self.sinks.append(sink)
+        return sink
+
+    def remove(self, sink):
+        """Отключает потребителя (например, после ошибки ffmpeg)"""
+        if sink in self.sinks:
+            self.sinks.remove(sink)
+
+    @property
+    def frames_duplicate(self):
+        return self.duplicates.duplicates
+
+    def write(self, result):
+        if result.digest is not None:
+            original = self.duplicates.check(result.index, result.digest)
+            if original is not None:
+                result = result._replace(duplicate_of=original)
+        for sink in list(self.sinks):
+            if self.profiler is None:
+                sink.write(result)
+                continue
+            started = time.perf_counter()
+            sink.write(result)
+            self.profiler.add(sink.stage, time.perf_counter() - started)
+            if isinstance(sink, VideoSink):
+                self.profiler.sample_queue('ffmpeg', sink.queue_depth)
+        self.frames_written += 1
+
+    def close(self):
+        """Закрывает всех потребителей; первая ошибка пробрасывается после закрытия остальных"""
+        error = None
+        for sink in self.sinks:
+            try:
+                sink.close()
+            except Exception as e:
+                if error is None:
+                    error = e
+        if error is not None:
+            raise error
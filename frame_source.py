@@ -0,0 +1,311 @@
+import queue
+import threading
+import time
+
+import cv2
+
+# Опережающее декодирование кадров.
+#
+# cap.read() блокирует цикл конвертации или воспроизведения, и
+# декодирование идет последовательно с обработкой кадра. PrefetchedSource
+# декодирует следующие кадры в своем потоке, пока обрабатывается текущий.
+# Кадры пишутся в кольцо заранее выделенных буферов (source.read(buffer),
+# как у cv2.VideoCapture), поэтому память на каждый кадр не выделяется.
+#
+# LatestFrameSource - для живых источников (камера, поток): обработка
+# берет самый новый кадр, а не следующий по порядку, и задержка от
+# захвата до показа не растет, даже если обработка не успевает.
+
+
+class PrefetchedSource:
+    """Источник кадров (cv2.VideoCapture, FFmpegGrayReader) с декодированием наперед
+
+    Кадр, отданный read(), лежит в буфере кольца и действителен до
+    следующего read() или grab(): к этому моменту потребитель должен его
+    обработать или скопировать (конвейер отправляет кадр в процесс раньше,
+    чем читает следующий).
+
+    set(cv2.CAP_PROP_POS_FRAMES, n) перематывает источник и отбрасывает
+    уже декодированные кадры. С loop=True видео перематывается в начало
+    внутри обертки, и конец видео не наступает.
+
+    Поток декодирует каждый кадр, поэтому grab() здесь ничего не экономит.
+    Проигрывание с пропуском опоздавших кадров (RealtimePlayer) получает
+    источник без обертки: там grab() пропускает кадр без декодирования.
+    """
+
+    def __init__(self, source, slots=4, loop=False):
+        if slots < 2:
+            raise ValueError("Нужно хотя бы два буфера")
+        self.source = source
+        self.loop = loop
+        self.position = 0
+        self._buffers = [None] * slots
+        self._free = queue.Queue()
+        for slot in range(slots):
+            self._free.put(slot)
+        self._ready = queue.Queue()
+        self._current = None
+        self._eof = False
+        self._generation = 0
+        self._pass_frames = 0
+        self._closed = False
+        self._error = None
+        # Защищает source: его использует и поток декодирования, и set()/get()
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _read_slot(self, slot):
+        ret, frame = self.source.read(self._buffers[slot])
+        if ret:
+            # Буфер того же размера cv2 заполняет на месте, иначе выделяет новый
+            self._buffers[slot] = frame
+        return ret
+
+    def _run(self):
+        while True:
+            slot = self._free.get()
+            if slot is None or self._closed:
+                return
+            with self._cond:
+                generation = self._generation
+                try:
+                    ret = self._read_slot(slot)
+                    rewound = False
+                    if not ret and self.loop and self._pass_frames > 0:
+                        self.source.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                        self._pass_frames = 0
+                        ret = self._read_slot(slot)
+                        rewound = ret
+                except Exception as e:
+                    # Ошибка декодера пробрасывается потребителю в read()
+                    self._error = e
+                    self._ready.put((generation, slot, False, False))
+                    return
+                if ret:
+                    self._pass_frames += 1
+            self._ready.put((generation, slot, ret, rewound))
+
+            if not ret:
+                # Конец видео: ждем перемотки или закрытия
+                with self._cond:
+                    while not self._closed and generation == self._generation:
+                        self._cond.wait()
+
+    def _recycle(self):
+        """Возвращает в кольцо буфер, отданный прошлым read()"""
+        if self._current is not None:
+            self._free.put(self._current)
+            self._current = None
+
+    def read(self):
+        self._recycle()
+        if self._eof:
+            return False, None
+        while True:
+            if self._error is not None:
+                raise self._error
+            generation, slot, ret, rewound = self._ready.get()
+            if self._error is not None:
+                raise self._error
+            if generation != self._generation:
+                # Кадр декодирован до перемотки
+                self._free.put(slot)
+                continue
+            if not ret:
+                self._free.put(slot)
+                self._eof = True
+                return False, None
+            if rewound:
+                self.position = 0
+            self._current = slot
+            self.position += 1
+            return True, self._buffers[slot]
+
+    def grab(self):
+        # Кадр уже декодирован потоком: пропуск стоит столько же, сколько read()
+        ret, _ = self.read()
+        return ret
+
+    @property
+    def slots(self):
+        return len(self._buffers)
+
+    @property
+    def buffered(self):
+        """Сколько кадров уже декодировано наперед"""
+        return self._ready.qsize()
+
+    def set(self, prop, value):
+        if prop != cv2.CAP_PROP_POS_FRAMES:
+            with self._cond:
+                return self.source.set(prop, value)
+        self._recycle()
+        with self._cond:
+            self._generation += 1
+            ok = self.source.set(prop, value)
+            self._pass_frames = 0
+            self._cond.notify_all()
+        self._eof = False
+        self.position = int(value)
+        return ok
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.position)
+        with self._cond:
+            return self.source.get(prop)
+
+    def isOpened(self):
+        return self.source.isOpened()
+
+    def _stop(self):
+        if not self._closed:
+            with self._cond:
+                self._closed = True
+                self._cond.notify_all()
+            self._free.put(None)
+            self._thread.join()
+
+    def detach(self):
+        """Останавливает поток и возвращает исходный источник (не закрывая его)"""
+        self._stop()
+        return self.source
+
+    def release(self):
+        self._stop()
+        self.source.release()
+
+
+class LatestFrameSource:
+    """Живой источник (камера, устройство захвата, поток): всегда самый новый кадр
+
+    Поток захвата читает источник без остановки. Новый кадр заменяет
+    непрочитанный (тройная буферизация: кадр в захвате, последний готовый
+    и отданный потребителю), поэтому очередь не копится, и медленная
+    обработка означает пропуск устаревших кадров, а не растущую задержку.
+
+    read() ждет кадр новее уже отданного; timestamp - время захвата
+    этого кадра (time.monotonic() сразу после чтения из источника).
+    Кадр действителен до следующего read().
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.timestamp = None
+        self.frames_captured = 0
+        self.frames_dropped = 0
+        self._buffers = [None, None, None]
+        self._capture_slot = 0
+        self._ready_slot = None
+        self._ready_time = None
+        self._current_slot = None
+        self._eof = False
+        self._closed = False
+        self._error = None
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._closed:
+            slot = self._capture_slot
+            try:
+                ret, frame = self.source.read(self._buffers[slot])
+            except Exception as e:
+                ret, frame = False, None
+                self._error = e
+            captured_at = time.monotonic()
+            with self._cond:
+                if not ret:
+                    self._eof = True
+                    self._cond.notify_all()
+                    return
+                self._buffers[slot] = frame
+                self.frames_captured += 1
+                if self._ready_slot is not None:
+                    # Прошлый кадр так и не забрали - он устарел
+                    self.frames_dropped += 1
+                # Свободный буфер: не готовый и не отданный потребителю
+                free = ({0, 1, 2} - {slot, self._current_slot}).pop() if self._ready_slot is None \
+                    else self._ready_slot
+                self._ready_slot, self._ready_time = slot, captured_at
+                self._capture_slot = free
+                self._cond.notify_all()
+
+    def read(self):
+        with self._cond:
+            while self._ready_slot is None and not self._eof and not self._closed:
+                self._cond.wait()
+            if self._error is not None:
+                raise self._error
+            if self._ready_slot is None:
+                return False, None
+            self._current_slot, self._ready_slot = self._ready_slot, None
+            self.timestamp = self._ready_time
+            return True, self._buffers[self._current_slot]
+
+    def grab(self):
+        ret, _ = self.read()
+        return ret
+
+    def get(self, prop):
+        return self.source.get(prop)
+
+    def isOpened(self):
+        return self.source.isOpened()
+
+    def release(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self.source.release()
+
+
+class ReplaySource:
+    """Видеофайл, который ведет себя как камера: кадры не быстрее родного fps
+
+    Замена живого источника для проверки без камеры. read() блокирует до
+    момента, когда кадр "снят" (start + N / fps); кадры, которые никто не
+    успел забрать, LatestFrameSource отбрасывает, как у настоящей камеры.
+    С loop=True видео повторяется бесконечно.
+    """
+
+    def __init__(self, path, loop=True):
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise IOError(f"Не удалось открыть видео: {path}")
+        fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.frame_time = 1.0 / fps if fps > 0 else 1.0 / 30
+        self.loop = loop
+        self._start = None
+        self._index = 0
+
+    def read(self, image=None):
+        if self._start is None:
+            self._start = time.monotonic()
+        ret, frame = self.cap.read(image)
+        if not ret and self.loop and self._index > 0:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.cap.read(image)
+        if not ret:
+            return False, None
+        delay = self._start + self._index * self.frame_time - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self._index += 1
+        return True, frame
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            # Живой источник не знает длины
+            return 0.0
+        return self.cap.get(prop)
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def release(self):
+        self.cap.release()
@@ -0,0 +1,173 @@
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+
+# Фоновый рендер предпросмотра для GUI.
+#
+# Каждое изменение ползунка - новая заявка. Ожидающая заявка заменяется
+# новой, а начинается выполнение только после паузы delay (дебаунс):
+# пока ползунок тянут, ничего не рендерится. Задача - генератор: каждый
+# yield (черновик, затем полный кадр) передается в deliver, только если
+# за это время не появилась более новая заявка; иначе задача бросается.
+#
+# FrameSeeker дает предпросмотру любой кадр видео. Декодированные кадры
+# хранятся уменьшенными в сером (4K кадр не нужен сетке в сотни символов)
+# в LRU кеше с ограничением по памяти вместе с готовыми сетками, поэтому
+# перемотка туда-обратно и смена настроек не декодируют видео заново.
+
+
+class LatestOnlyWorker:
+    """Фоновый поток, выполняющий только последнюю заявку
+
+    deliver(generation, result) вызывается из фонового потока: в GUI он
+    должен передать результат в главный поток (root.after) и там еще раз
+    проверить is_current(generation). Так же вызывается on_error(generation,
+    error), если задача упала: поток продолжает брать следующие заявки.
+    """
+
+    def __init__(self, deliver, on_error, delay=0.08):
+        self.deliver = deliver
+        self.on_error = on_error
+        self.delay = delay
+        self.generation = 0
+        self._pending = None
+        self._submitted_at = 0.0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, task, *args):
+        """Ставит задачу task(*args) вместо ожидающей; возвращает ее номер"""
+        with self._cond:
+            self.generation += 1
+            self._pending = (self.generation, task, args)
+            self._submitted_at = time.monotonic()
+            self._cond.notify()
+            return self.generation
+
+    def is_current(self, generation):
+        """Заявка generation еще не заменена более новой"""
+        return generation == self.generation
+
+    def _next_task(self):
+        with self._cond:
+            while True:
+                if self._closed:
+                    return None
+                if self._pending is None:
+                    self._cond.wait()
+                    continue
+                # Ждем, пока заявки перестанут приходить
+                remaining = self._submitted_at + self.delay - time.monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+                task, self._pending = self._pending, None
+                return task
+
+    def _run(self):
+        while True:
+            task = self._next_task()
+            if task is None:
+                return
+            generation, func, args = task
+            try:
+                for result in func(*args):
+                    if not self.is_current(generation):
+                        break
+                    self.deliver(generation, result)
+            except Exception as e:
+                self.on_error(generation, e)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+
+class FrameSeeker:
+    """Произвольный доступ к кадрам видео для предпросмотра
+
+    Используется только из одного (фонового) потока: cv2.VideoCapture
+    не потокобезопасен. release() можно вызвать из любого потока.
+    """
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024, max_width=1280):
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise IOError(f"Не удалось открыть видео: {path}")
+        self.frame_count = max(1, int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+        self.max_bytes = max_bytes
+        self.max_width = max_width
+        self.nbytes = 0
+        self._cache = OrderedDict()
+        # Номер кадра, который вернет следующий cap.read()
+        self._position = 0
+        # release() ждет, пока фоновый поток дочитает кадр
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        value = self._cache.get(key)
+        if value is not None:
+            self._cache.move_to_end(key)
+        return value
+
+    def _put(self, key, value):
+        self._cache[key] = value
+        self.nbytes += value.nbytes
+        while self.nbytes > self.max_bytes and len(self._cache) > 1:
+            _, old = self._cache.popitem(last=False)
+            self.nbytes -= old.nbytes
+
+    def _decode(self, index):
+        with self._lock:
+            if self.cap is None:
+                return None
+            # Следующий по порядку кадр читается без перемотки
+            if index != self._position:
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+            ret, frame = self.cap.read()
+            if not ret:
+                self._position = -1
+                return None
+            self._position = index + 1
+            return frame
+
+    def release(self):
+        """Закрывает видео; кадры из кеша остаются доступны"""
+        with self._lock:
+            if self.cap is not None:
+                self.cap.release()
+                self.cap = None
+
+    def gray(self, index):
+        """Уменьшенный серый кадр index (или None, если кадр не читается)"""
+        index = min(max(0, index), self.frame_count - 1)
+        key = ('frame', index)
+        gray = self._get(key)
+        if gray is None:
+            frame = self._decode(index)
+            if frame is None:
+                return None
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            height, width = gray.shape
+            if width > self.max_width:
+                size = (self.max_width, max(1, height * self.max_width // width))
+                gray = cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+            self._put(key, gray)
+        return gray
+
+    def grid(self, index, grid_size):
+        """Серая сетка grid_size для кадра index (настройки яркости применяет маппер)"""
+        key = ('grid', index, grid_size)
+        grid = self._get(key)
+        if grid is None:
+            gray = self.gray(index)
+            if gray is None:
+                return None
+            grid = cv2.resize(gray, grid_size, interpolation=cv2.INTER_AREA)
+            self._put(key, grid)
+        return grid
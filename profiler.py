@@ -0,0 +1,201 @@
+import json
+import sys
+import time
+from array import array
+
+import numpy as np
+
+# Профиль конвертации: на что уходит время каждого кадра.
+#
+# Включается настройкой 'profile' (меню vid2.py, флаг --profile пакетной
+# конвертации, галочка в GUI). Конвейер и потребители записывают время
+# каждой стадии для каждого кадра:
+#   decode   - ожидание декодированного кадра (поток декодера)
+#   resize   - серый кадр и уменьшение до сетки (процессы)
+#   map      - сетка индексов символов и ее хеш (процессы)
+#   text     - текст кадра (процессы)
+#   render   - отрисовка кадра (процессы)
+#   png      - сжатие PNG (процессы)
+#   wait     - ожидание следующего готового кадра (главный поток)
+#   txt, png_file, ascv, ascz - запись на диск (главный поток)
+#   ffmpeg   - передача кадра в ffmpeg (ждет, если кодирование не успевает)
+#   terminal - вывод в терминал
+# Повторы кадров не рисуются и не сжимаются заново, поэтому у render и
+# png кадров может быть меньше.
+#
+# Загрузка стадии - ее суммарное время, деленное на время конвертации и
+# на число исполнителей (процессов для стадий процессов). Стадия с
+# загрузкой около 100% и ограничивает скорость; большое wait значит, что
+# запись ждет декодер или процессы.
+
+# Стадии, которые выполняются в рабочих процессах параллельно
+WORKER_STAGES = ('resize', 'map', 'text', 'render', 'png')
+# Порядок стадий в отчете (остальные - в конце по алфавиту)
+STAGE_ORDER = ('decode', 'resize', 'map', 'text', 'render', 'png', 'wait',
+               'txt', 'png_file', 'ascv', 'ascz', 'ffmpeg', 'terminal')
+PERCENTILES = (50, 95, 99)
+
+
+def _rss_mb(who):
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux - килобайты, macOS - байты
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def memory_high_water():
+    """Пиковая память (RSS) в МБ: 'main' - этот процесс, 'children' - самый
+    большой из завершенных дочерних (рабочие процессы, ffmpeg); None на
+    системах без модуля resource (Windows)"""
+    try:
+        import resource
+    except ImportError:
+        return {'main': None, 'children': None}
+    return {'main': _rss_mb(resource.RUSAGE_SELF), 'children': _rss_mb(resource.RUSAGE_CHILDREN)}
+
+
+def peak_rss_mb():
+    """Пиковая память процесса и дочерних процессов в МБ; None, если не узнать"""
+    memory = memory_high_water()
+    if memory['main'] is None:
+        return None
+    return max(memory['main'], memory['children'])
+
+
+class StageClock:
+    """Секундомер стадий одного кадра: lap(stage) - время с прошлой отметки"""
+
+    def __init__(self):
+        self.timings = []
+        self._last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.timings.append((stage, now - self._last))
+        self._last = now
+
+
+class ConversionProfiler:
+    """Время стадий по кадрам, глубина очередей и пропущенные кадры
+
+    workers - число рабочих процессов (для загрузки стадий процессов).
+    add() можно вызывать из потока декодера.
+    """
+
+    def __init__(self, workers=1):
+        self.workers = workers
+        self.timings = {}
+        self.queues = {}
+        self.queue_capacity = {}
+        self.frames = 0
+        self.dropped = 0
+        self.memory = None
+        self._started = time.perf_counter()
+        self._last_frame = self._started
+
+    def add(self, stage, seconds):
+        samples = self.timings.get(stage)
+        if samples is None:
+            samples = self.timings.setdefault(stage, array('d'))
+        samples.append(seconds)
+
+    def add_frame(self, result):
+        """Готовый кадр конвейера: время стадий, посчитанное процессом"""
+        for stage, seconds in result.timings or ():
+            self.add(stage, seconds)
+        self.frames += 1
+        self._last_frame = time.perf_counter()
+
+    def sample_queue(self, name, depth, capacity=None):
+        samples = self.queues.get(name)
+        if samples is None:
+            samples = self.queues[name] = array('i')
+            self.queue_capacity[name] = capacity
+        samples.append(depth)
+
+    @property
+    def elapsed(self):
+        """Время от создания до последнего кадра (показ после конвертации не считается)"""
+        return self._last_frame - self._started
+
+    def finish(self, dropped=0):
+        """Конвертация закончена: вызывается после остановки конвейера,
+        чтобы в память вошли завершенные рабочие процессы"""
+        self.dropped = dropped
+        self.memory = memory_high_water()
+
+    def stage_lanes(self, stage):
+        return self.workers if stage in WORKER_STAGES else 1
+
+    def ordered_stages(self):
+        known = [stage for stage in STAGE_ORDER if stage in self.timings]
+        return known + sorted(set(self.timings) - set(STAGE_ORDER))
+
+    def summary(self):
+        """Сводка: fps, по стадиям p50/p95/p99/макс (мс) и загрузка, очереди, память"""
+        elapsed = self.elapsed
+        stages = {}
+        for stage in self.ordered_stages():
+            ms = np.frombuffer(self.timings[stage], dtype=np.float64) * 1000
+            stats = {'count': len(ms), 'total_s': float(ms.sum()) / 1000, 'mean': float(ms.mean())}
+            for percentile, value in zip(PERCENTILES, np.percentile(ms, PERCENTILES)):
+                stats[f'p{percentile}'] = float(value)
+            stats['max'] = float(ms.max())
+            stats['load'] = stats['total_s'] / elapsed / self.stage_lanes(stage) if elapsed > 0 else 0.0
+            stages[stage] = stats
+
+        queues = {}
+        for name, samples in self.queues.items():
+            depth = np.frombuffer(samples, dtype=np.int32)
+            queues[name] = {'mean': float(depth.mean()), 'p95': float(np.percentile(depth, 95)),
+                            'max': int(depth.max()), 'capacity': self.queue_capacity[name]}
+
+        # Узкое место - самая загруженная стадия (wait - только следствие)
+        busy = {stage: stats['load'] for stage, stats in stages.items() if stage != 'wait'}
+        return {
+            'frames': self.frames,
+            'elapsed': elapsed,
+            'fps': self.frames / elapsed if elapsed > 0 else 0.0,
+            'workers': self.workers,
+            'dropped': self.dropped,
+            'bottleneck': max(busy, key=busy.get) if busy else None,
+            'memory_mb': self.memory if self.memory is not None else memory_high_water(),
+            'stages': stages,
+            'queues': queues,
+        }
+
+    def report_lines(self, summary=None):
+        """Отчет для вывода: строки без цвета"""
+        summary = summary or self.summary()
+        lines = [f"Профиль: {summary['frames']} кадров за {summary['elapsed']:.1f} с, "
+                 f"{summary['fps']:.1f} кадр/с, процессов: {summary['workers']}"]
+        if summary['stages']:
+            lines.append(f"{'стадия':<10}{'кадров':>8}{'p50 мс':>9}{'p95 мс':>9}{'p99 мс':>9}"
+                         f"{'макс мс':>9}{'загрузка':>10}")
+            for stage, stats in summary['stages'].items():
+                lines.append(f"{stage:<10}{stats['count']:>8}{stats['p50']:>9.2f}{stats['p95']:>9.2f}"
+                             f"{stats['p99']:>9.2f}{stats['max']:>9.1f}{stats['load']:>10.0%}")
+        for name, stats in summary['queues'].items():
+            capacity = f" из {stats['capacity']}" if stats['capacity'] else ""
+            lines.append(f"Очередь {name}: в среднем {stats['mean']:.1f}, p95 {stats['p95']:.0f}, "
+                         f"макс {stats['max']}{capacity}")
+        lines.append(f"Пропущено кадров: {summary['dropped']}")
+        memory = summary['memory_mb']
+        if memory['main'] is not None:
+            lines.append(f"Пиковая память: главный процесс {memory['main']:.0f} МБ, "
+                         f"дочерние до {memory['children']:.0f} МБ")
+        if summary['bottleneck']:
+            load = summary['stages'][summary['bottleneck']]['load']
+            lines.append(f"Узкое место: {summary['bottleneck']} (загрузка {load:.0%})")
+        return lines
+
+    def save(self, path, summary=None):
+        """Сводка и время каждой стадии каждого кадра (мс) в JSON"""
+        data = dict(summary or self.summary())
+        data['samples_ms'] = {stage: [round(seconds * 1000, 3) for seconds in self.timings[stage]]
+                              for stage in self.ordered_stages()}
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
@@ -0,0 +1,429 @@
+import sys
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+# Вывод ASCII кадров в терминал.
+# Предпросмотр - необязательный потребитель потока кадров конвейера:
+# конвертация без него идет с максимальной скоростью.
+#
+# Темп задают не паузы после каждого кадра, а сроки показа от момента
+# старта по монотонным часам: кадр N показывается в start + N / fps.
+# Время обработки не накапливается, а кадры, чей срок уже прошел,
+# пропускаются, и воспроизведение не отстает от исходного видео. Если
+# источник сам медленнее fps, пропуски не помогут: после короткой попытки
+# догнать расписание оно сдвигается за источником.
+#
+# На экран выводится только разница с предыдущим кадром: перемещения
+# курсора и изменившиеся участки строк. Если изменилась большая часть
+# экрана, кадр перерисовывается целиком.
+#
+# При зацикливании первый проход сохраняет сконвертированные кадры в
+# памяти (FrameCache), следующие проходы показывают их без декодирования.
+#
+# Живой источник (LivePlayer) темп задает сам: кадр показывается сразу,
+# а LatencyStats считает задержку от захвата кадра до вывода на экран.
+
+HIDE_CURSOR = "\033[?25l"
+SHOW_CURSOR = "\033[?25h"
+CURSOR_HOME = "\033[H"
+
+
+def cursor_to(row, col):
+    """ANSI перемещение курсора (нумерация с нуля)"""
+    return f"\033[{row + 1};{col + 1}H"
+
+
+class ScreenDiff:
+    """Кодирует кадр как изменения относительно уже выведенного на экран
+
+    encode_rows(indices) возвращает строки для терминала (с ANSI цветом);
+    цвет клетки определяется индексом символа, поэтому сравнение сеток
+    индексов учитывает и символ, и цвет.
+    """
+
+    def __init__(self, full_redraw_ratio=0.5, merge_gap=6):
+        # Доля изменившихся клеток, после которой выгоднее полная перерисовка
+        self.full_redraw_ratio = full_redraw_ratio
+        # Неизменные участки короче этого выводятся заново вместо перемещения курсора
+        self.merge_gap = merge_gap
+        self.previous = None
+        self.full_redraws = 0
+        self.diff_frames = 0
+
+    def reset(self):
+        """Следующий кадр будет нарисован целиком"""
+        self.previous = None
+
+    def encode(self, indices, encode_rows):
+        if self.previous is None or self.previous.shape != indices.shape:
+            payload = self._full(indices, encode_rows)
+        else:
+            changed = indices != self.previous
+            count = np.count_nonzero(changed)
+            if count == 0:
+                payload = ""
+            elif count > self.full_redraw_ratio * changed.size:
+                payload = self._full(indices, encode_rows)
+            else:
+                payload = self._diff(indices, changed, encode_rows)
+                self.diff_frames += 1
+
+        self.previous = indices.copy()
+        return payload
+
+    def _full(self, indices, encode_rows):
+        self.full_redraws += 1
+        return CURSOR_HOME + "\n".join(encode_rows(indices))
+
+    def _diff(self, indices, changed, encode_rows):
+        parts = []
+        for row in np.flatnonzero(changed.any(axis=1)):
+            cols = np.flatnonzero(changed[row])
+            # Соседние изменения с коротким промежутком объединяются в один участок
+            breaks = np.flatnonzero(np.diff(cols) > self.merge_gap) + 1
+            for run in np.split(cols, breaks):
+                start, end = run[0], run[-1] + 1
+                parts.append(cursor_to(row, start))
+                parts.append(encode_rows(indices[row:row + 1, start:end])[0])
+        return "".join(parts)
+
+
+class PlaybackClock:
+    """Сроки показа кадров по монотонным часам"""
+
+    def __init__(self, fps, late_tolerance=0.5):
+        self.frame_time = 1.0 / fps if fps > 0 else 0.033
+        # Кадр считается опоздавшим, если показан позже срока на эту долю кадра
+        self.late_tolerance = late_tolerance * self.frame_time
+        self.start_time = None
+
+    def start(self):
+        self.start_time = time.monotonic()
+
+    @property
+    def started(self):
+        return self.start_time is not None
+
+    def deadline(self, index):
+        """Момент показа кадра index"""
+        return self.start_time + index * self.frame_time
+
+    def is_behind(self, index):
+        """Срок кадра уже прошел: пора показывать следующий"""
+        return time.monotonic() >= self.deadline(index + 1)
+
+    def restart(self, index):
+        """Сдвигает расписание: срок кадра index - сейчас"""
+        self.start_time = time.monotonic() - index * self.frame_time
+
+    def wait(self, index):
+        """Ждет срока кадра; возвращает опоздание в секундах (0 - вовремя)"""
+        delay = self.deadline(index) - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+            return 0.0
+        return -delay
+
+
+class TerminalPreview:
+    """Показывает кадры в терминале в темпе исходного видео
+
+    Кадр, который уже пора сменить следующим, пропускается (dropped), но
+    не больше max_catchup секунд кадров подряд. Если так догнать
+    расписание не вышло, источник медленнее fps: кадры выводятся без
+    пропусков (опоздал, late), а расписание сдвигается за источником,
+    чтобы отставание не копилось, пока кадр снова не придет вовремя.
+    С paced=False кадр выводится сразу (темп задает живой источник).
+    """
+
+    def __init__(self, mapper, fps, color=None, random_colors=False, stream=None, paced=True,
+                 max_catchup=0.5):
+        self.mapper = mapper
+        self.clock = PlaybackClock(fps)
+        self.paced = paced
+        self.max_catchup = max(1, round(max_catchup / self.clock.frame_time))
+        self.color = color
+        self.random_colors = random_colors
+        self.stream = stream or sys.stdout
+        self.screen = ScreenDiff()
+        self.bytes_written = 0
+        self.frame_index = 0
+        self.source_slow = False
+        self._catchup = 0
+        self.frames_shown = 0
+        self.frames_dropped = 0
+        self.frames_late = 0
+
+    def start(self):
+        # Скрываем курсор, первый кадр рисуется целиком
+        self.screen.reset()
+        self.stream.write(HIDE_CURSOR)
+        self.stream.flush()
+
+    def _encode_rows(self, indices):
+        return self.mapper.terminal_rows(indices, self.color, self.random_colors)
+
+    def is_behind(self):
+        """Следующий кадр уже опоздал (его можно не декодировать)"""
+        if not self.paced or not self.clock.started or self.source_slow:
+            return False
+        if not self.clock.is_behind(self.frame_index):
+            return False
+        if self._catchup < self.max_catchup:
+            return True
+        # Пропуски не помогли догнать: источник не успевает за fps
+        self.source_slow = True
+        return False
+
+    def skip(self):
+        """Пропускает следующий кадр без вывода"""
+        self.frame_index += 1
+        self.frames_dropped += 1
+        self._catchup += 1
+
+    def show(self, indices):
+        """Выводит кадр (сетку индексов символов) в его срок
+
+        Возвращает False, если кадр опоздал и был пропущен.
+        """
+        if not self.clock.started:
+            self.clock.start()
+        if self.is_behind():
+            self.skip()
+            return False
+
+        payload = self.screen.encode(indices, self._encode_rows)
+
+        if self.paced:
+            lateness = self.clock.wait(self.frame_index)
+            if lateness > self.clock.late_tolerance:
+                self.frames_late += 1
+            if self.source_slow:
+                if lateness > 0:
+                    # Расписание идет за медленным источником
+                    self.clock.restart(self.frame_index)
+                else:
+                    self.source_slow = False
+
+        self._write(payload, indices)
+        self.bytes_written += len(payload)
+        self._catchup = 0
+        self.frame_index += 1
+        self.frames_shown += 1
+        return True
+
+    def _write(self, payload, indices):
+        """Вывод кадра: payload - разница с прошлым выведенным кадром"""
+        self.stream.write(payload)
+        self.stream.flush()
+
+    def stop(self):
+        # Показываем курсор обратно
+        self.stream.write(SHOW_CURSOR)
+        self.stream.flush()
+
+    def stats(self):
+        return {
+            'shown': self.frames_shown,
+            'dropped': self.frames_dropped,
+            'late': self.frames_late,
+            'bytes': self.bytes_written,
+            'full_redraws': self.screen.full_redraws,
+        }
+
+
+class FrameCache:
+    """Сконвертированные кадры в памяти для повторных проходов
+
+    Сетки индексов символов хранятся упакованными: если символов не
+    больше 16, по два индекса в байте. Цвет не хранится, он задается
+    индексом символа при выводе. Если кадры не помещаются в max_bytes,
+    кеш освобождает память и больше не заполняется.
+    """
+
+    def __init__(self, max_bytes, glyph_count):
+        self.max_bytes = max_bytes
+        self.nibbles = glyph_count <= 16
+        self.frames = []
+        self.shape = None
+        self.nbytes = 0
+        self.overflowed = False
+        self.complete = False
+
+    def __len__(self):
+        return len(self.frames)
+
+    def _pack(self, indices):
+        flat = indices.ravel()
+        if not self.nibbles:
+            return flat.copy()
+        if flat.size % 2:
+            flat = np.concatenate((flat, np.zeros(1, dtype=np.uint8)))
+        return (flat[0::2] << 4) | flat[1::2]
+
+    def add(self, indices):
+        """Добавляет кадр; False, если кеш переполнен"""
+        if self.overflowed:
+            return False
+        if self.shape is not None and indices.shape != self.shape:
+            self.clear()
+            return False
+        packed = self._pack(indices)
+        if self.nbytes + packed.nbytes > self.max_bytes:
+            self.clear()
+            return False
+        self.shape = indices.shape
+        self.frames.append(packed)
+        self.nbytes += packed.nbytes
+        return True
+
+    def clear(self):
+        """Отключает кеш: дальше кадры придется декодировать заново"""
+        self.overflowed = True
+        self.frames = []
+        self.nbytes = 0
+
+    def finish(self):
+        """Проход закончен; True, если в кеше все кадры видео"""
+        self.complete = not self.overflowed and len(self.frames) > 0
+        return self.complete
+
+    def __getitem__(self, index):
+        packed = self.frames[index]
+        if not self.nibbles:
+            return packed.reshape(self.shape)
+        size = self.shape[0] * self.shape[1]
+        flat = np.empty(packed.size * 2, dtype=np.uint8)
+        flat[0::2] = packed >> 4
+        flat[1::2] = packed & 0x0F
+        return flat[:size].reshape(self.shape)
+
+
+def replay_cache(cache, preview):
+    """Бесконечно показывает кадры из кеша (до Ctrl+C)"""
+    while True:
+        for index in range(len(cache)):
+            if preview.is_behind():
+                preview.skip()
+                continue
+            preview.show(cache[index])
+
+
+class RealtimePlayer:
+    """Проигрывание видео в терминале без сохранения
+
+    Кадры, которые уже не успеть показать, пропускаются через
+    source.grab() без retrieve() и без конвертации.
+    convert(frame) возвращает сетку индексов символов.
+
+    С кешем (при зацикливании) первый проход конвертирует все кадры,
+    а опоздавшие отбрасывает при показе; следующие проходы идут из кеша.
+    Если кеш переполнился, видео перематывается и декодируется заново.
+    """
+
+    def __init__(self, source, preview, convert, loop=False, cache=None):
+        self.source = source
+        self.preview = preview
+        self.convert = convert
+        self.loop = loop
+        self.cache = cache
+
+    def _rewind(self):
+        self.source.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+    def run(self):
+        self.preview.start()
+        frames_read = 0
+        try:
+            while True:
+                caching = self.cache is not None and not self.cache.overflowed
+                if self.preview.is_behind() and not caching:
+                    if not self.source.grab():
+                        if self.loop and frames_read > 0:
+                            self._rewind()
+                            continue
+                        break
+                    frames_read += 1
+                    self.preview.skip()
+                    continue
+
+                ret, frame = self.source.read()
+                if not ret:
+                    if self.loop and frames_read > 0:
+                        if self.cache is not None and self.cache.finish():
+                            replay_cache(self.cache, self.preview)
+                        self._rewind()
+                        continue
+                    break
+                frames_read += 1
+                indices = self.convert(frame)
+                if caching:
+                    self.cache.add(indices)
+                self.preview.show(indices)
+        finally:
+            self.preview.stop()
+
+        return self.preview.stats()
+
+
+class LatencyStats:
+    """Задержка от захвата кадра до показа (последние window кадров)"""
+
+    def __init__(self, window=1000):
+        self.samples = deque(maxlen=window)
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+    def summary(self):
+        """Средняя, p50, p95 и максимальная задержка в миллисекундах"""
+        if not self.samples:
+            return None
+        ms = np.array(self.samples) * 1000
+        return {
+            'count': len(ms),
+            'mean': float(ms.mean()),
+            'p50': float(np.percentile(ms, 50)),
+            'p95': float(np.percentile(ms, 95)),
+            'max': float(ms.max()),
+        }
+
+
+class LivePlayer:
+    """Показ живого источника (LatestFrameSource) в терминале
+
+    Каждый показ берет самый новый кадр источника; пока кадр
+    обрабатывается, источник отбрасывает устаревшие. Задержка от
+    захвата до вывода копится в latency.
+    """
+
+    def __init__(self, source, preview, convert, latency=None):
+        self.source = source
+        self.preview = preview
+        self.convert = convert
+        self.latency = latency if latency is not None else LatencyStats()
+
+    def run(self):
+        self.preview.start()
+        try:
+            while True:
+                ret, frame = self.source.read()
+                if not ret:
+                    break
+                self.preview.show(self.convert(frame))
+                self.latency.add(time.monotonic() - self.source.timestamp)
+        finally:
+            self.preview.stop()
+
+        return self.stats()
+
+    def stats(self):
+        """Статистика показа; dropped включает кадры, устаревшие в источнике"""
+        stats = self.preview.stats()
+        stats['dropped'] += self.source.frames_dropped
+        stats['captured'] = self.source.frames_captured
+        stats['latency'] = self.latency.summary()
+        return stats
@@ -5,7 +5,18 @@ import sys
 import time
 import shutil
 import subprocess
-from datetime import datetime
+
+from ascii_container import AsciiContainerWriter, frame_digests
+from ascii_stream import AsciiStreamWriter
+from ascii_engine import AsciiMapper, resize_to_grid, to_gray
+from ascii_server import BroadcastPreview, BroadcastServer
+from checkpoint import ConversionCheckpoint, evict_projects, lookup
+from ffmpeg_io import FFmpegError, FFmpegGrayReader, SegmentedVideoWriter
+from frame_pipeline import FramePipeline, default_workers
+from frame_sinks import ContainerSink, FrameSinks, PngSink, PreviewSink, StreamSink, TextSink, VideoSink
+from frame_source import LatestFrameSource, PrefetchedSource, ReplaySource
+from profiler import ConversionProfiler
+from terminal_player import FrameCache, LivePlayer, RealtimePlayer, TerminalPreview, replay_cache
 
 # ANSI цвета для интерфейса
 class Colors:
@@ -51,6 +62,46 @@ BACKGROUND_COLORS = {
     'light_gray': (192, 192, 192)
 }
 
+# Настройки по умолчанию (меню CLI и пакетная конвертация batch_convert.py)
+DEFAULT_SETTINGS = {
+    'width': None,  # Авто-размер по умолчанию для терминала
+    'invert': False,
+    'transparent': False,
+    'threshold': 150,
+    'color': None,
+    'random_colors': False,
+    'save_txt': True,
+    'save_frames': False,
+    'save_video': False,
+    'save_container': False,  # Все кадры в одном файле frames.ascv
+    'save_stream': False,  # Сжатый поток изменений кадров frames.ascz (для длинных архивов)
+    'stream_compression': 'zlib',  # Сжатие потока: zlib, lzma (меньше, но медленнее) или none
+    'loop': False,
+    'loop_cache_mb': 256,  # Память под кадры для повторных проходов при зацикливании
+    'preview': True,  # Показ в терминале (без него - конвертация на максимальной скорости)
+    'ffmpeg_decode': False,  # ffmpeg сам уменьшает кадр до сетки и переводит в серый
+    'live_replay': False,  # Файл как живой источник в родном темпе (проверка живого режима без камеры)
+    'broadcast_port': None,  # Трансляция по TCP (telnet/nc) вместо вывода в свой терминал
+    'resume': False,  # Продолжать прерванную конвертацию того же видео
+    'cache_quota_gb': None,  # Ограничение места под проекты: старые удаляются (None - без ограничения)
+    'background': 'black',  # Цвет фона по умолчанию
+    'font_quality': 'high',  # Качество шрифта
+    'workers': None,  # Число процессов конвертации (None - по числу ядер)
+    'profile': False,  # Замер стадий конвертации: отчет в конце и profile.json в папке проекта
+    'output_dir': None  # Папка для проектов (None - Загрузки/ASCII_Videos)
+}
+
+# Настройки, от которых зависит результат конвертации: вместе с отпечатком
+# видео они задают папку проекта в кеше (ширину заменяет размер сетки)
+OUTPUT_SETTINGS = ('invert', 'transparent', 'threshold', 'color', 'random_colors', 'background',
+                   'font_quality', 'save_txt', 'save_frames', 'save_video', 'save_container',
+                   'save_stream', 'stream_compression', 'ffmpeg_decode')
+
+# Как часто записывается прогресс конвертации (секунды)
+CHECKPOINT_INTERVAL = 2.0
+# Длина отрезка видео в кадрах: при сбое теряется не больше одного отрезка
+VIDEO_SEGMENT_FRAMES = 1800
+
 def check_ffmpeg():
     """Проверяет наличие ffmpeg в системе"""
     try:
@@ -73,58 +124,22 @@ def get_downloads_folder():
     
     return ascii_downloads
 
-def create_project_folder(video_path, settings):
-    """Создает уникальную папку для проекта на основе настроек"""
-    downloads_folder = get_downloads_folder()
-    
-    # Получаем имя файла без расширения
-    video_name = os.path.splitext(os.path.basename(video_path))[0]
-    
-    # Создаем уникальный идентификатор на основе настроек
-    settings_hash = ""
-    if settings['invert']:
-        settings_hash += "inv_"
-    if settings['transparent']:
-        settings_hash += f"tr{settings['threshold']}_"
-    if settings['color']:
-        settings_hash += f"{settings['color']}_"
-    if settings['random_colors']:
-        settings_hash += "rand_"
-    if settings['width']:
-        settings_hash += f"w{settings['width']}_"
-    if settings['background'] != 'black':
-        settings_hash += f"bg{settings['background']}_"
-    
-    # Убираем последний символ подчеркивания если есть
-    if settings_hash.endswith('_'):
-        settings_hash = settings_hash[:-1]
-    
-    # Если нет особых настроек, используем timestamp
-    if not settings_hash:
-        settings_hash = datetime.now().strftime("%H%M%S")
-    
-    # Создаем имя папки
-    project_name = f"{video_name}_{settings_hash}"
-    project_path = os.path.join(downloads_folder, project_name)
-    
-    # Создаем подпапки
+def create_project_folder(project_path):
+    """Создает папку проекта (адрес в кеше результатов) с подпапками"""
     frames_dir = os.path.join(project_path, 'frames')
     video_dir = os.path.join(project_path, 'videos')
-    
-    if not os.path.exists(frames_dir):
-        os.makedirs(frames_dir)
-    if not os.path.exists(video_dir):
-        os.makedirs(video_dir)
-    
+    os.makedirs(frames_dir, exist_ok=True)
+    os.makedirs(video_dir, exist_ok=True)
     return project_path, frames_dir, video_dir
 
 def clear_screen():
     """Очистка экрана"""
     os.system('cls' if os.name == 'nt' else 'clear')
 
-def print_header(title):
+def print_header(title, clear=True):
     """Заголовок меню"""
-    clear_screen()
+    if clear:
+        clear_screen()
     print("=" * 60)
     print(f"{Colors.CYAN}{title:^60}{Colors.RESET}")
     print("=" * 60)
@@ -138,8 +153,8 @@ def get_video_path():
     """Получение пути к видео"""
     while True:
         print_header("ВЫБОР ВИДЕО ФАЙЛА")
-        print(f"{Colors.WHITE}Введите путь к видео файлу:{Colors.RESET}")
-        print(f"{Colors.BLUE}Пример: C:/videos/my_video.mp4{Colors.RESET}")
+        print(f"{Colors.WHITE}Введите путь к видео файлу, номер камеры или адрес потока:{Colors.RESET}")
+        print(f"{Colors.BLUE}Пример: C:/videos/my_video.mp4, 0, rtsp://192.168.1.10/stream{Colors.RESET}")
         print()
         
         video_path = input(f"{Colors.GREEN}> {Colors.RESET}").strip()
@@ -147,7 +162,7 @@ def get_video_path():
         if not video_path:
             continue
             
-        if os.path.exists(video_path):
+        if os.path.exists(video_path) or is_live_source(video_path):
             return video_path
         else:
             print(f"{Colors.RED}Файл не найден! Проверьте путь.{Colors.RESET}")
@@ -158,20 +173,7 @@ def display_settings_menu():
     downloads_folder = get_downloads_folder()
     has_ffmpeg = check_ffmpeg()
     
-    settings = {
-        'width': None,  # Авто-размер по умолчанию для терминала
-        'invert': False,
-        'transparent': False,
-        'threshold': 150,
-        'color': None,
-        'random_colors': False,
-        'save_txt': True,
-        'save_frames': False,
-        'save_video': False,
-        'loop': False,
-        'background': 'black',  # Цвет фона по умолчанию
-        'font_quality': 'high'  # Качество шрифта
-    }
+    settings = dict(DEFAULT_SETTINGS)
     
     while True:
         print_header("НАСТРОЙКИ КОНВЕРТАЦИИ")
@@ -226,6 +228,10 @@ def display_settings_menu():
                 save_options.append("видео (оригинальное разрешение)")
             else:
                 save_options.append("видео (требуется ffmpeg)")
+        if settings['save_container']:
+            save_options.append("один файл .ascv")
+        if settings['save_stream']:
+            save_options.append(f"сжатый поток .ascz ({settings['stream_compression']})")
         save_display = ", ".join(save_options) if save_options else "только просмотр"
         print_menu_option(7, f"Сохранение: {save_display}")
         
@@ -233,12 +239,26 @@ def display_settings_menu():
         print(f"\n{Colors.WHITE}Дополнительно:{Colors.RESET}")
         loop_display = "да" if settings['loop'] else "нет"
         print_menu_option(8, f"Зацикливание: {loop_display}")
+        preview_display = "да" if settings['preview'] else "нет (максимальная скорость)"
+        print_menu_option(10, f"Просмотр в терминале: {preview_display}")
+        decode_display = "ffmpeg (сразу в сетку символов)" if settings['ffmpeg_decode'] else "OpenCV"
+        print_menu_option(11, f"Декодирование: {decode_display}")
+        replay_display = "да (файл в темпе камеры)" if settings['live_replay'] else "нет"
+        print_menu_option(12, f"Живой режим для файла: {replay_display}")
+        broadcast_display = f"порт {settings['broadcast_port']}" if settings['broadcast_port'] else "нет"
+        print_menu_option(13, f"Трансляция по сети (telnet): {broadcast_display}")
+        resume_display = "да (с первого незаписанного кадра)" if settings['resume'] else "нет"
+        print_menu_option(14, f"Продолжать прерванную конвертацию: {resume_display}")
+        quota_display = f"{settings['cache_quota_gb']} ГБ" if settings['cache_quota_gb'] else "без ограничения"
+        print_menu_option(15, f"Место под проекты: {quota_display}")
+        profile_display = "да (отчет по стадиям и profile.json)" if settings['profile'] else "нет"
+        print_menu_option(16, f"Профилирование конвертации: {profile_display}")
         
         print(f"\n{Colors.WHITE}Управление:{Colors.RESET}")
         print(f"  {Colors.YELLOW} 9.{Colors.RESET} {Colors.GREEN}Начать конвертацию{Colors.RESET}")
         print(f"  {Colors.YELLOW} 0.{Colors.RESET} {Colors.RED}Выход{Colors.RESET}")
         
-        print(f"\n{Colors.BLUE}Выберите пункт меню (0-9):{Colors.RESET}")
+        print(f"\n{Colors.BLUE}Выберите пункт меню (0-16):{Colors.RESET}")
         
         try:
             choice = input(f"{Colors.GREEN}> {Colors.RESET}").strip()
@@ -261,6 +281,20 @@ def display_settings_menu():
                 settings = get_save_settings(settings, has_ffmpeg)
             elif choice == '8':
                 settings['loop'] = not settings['loop']
+            elif choice == '10':
+                settings['preview'] = not settings['preview']
+            elif choice == '11':
+                settings['ffmpeg_decode'] = not settings['ffmpeg_decode']
+            elif choice == '12':
+                settings['live_replay'] = not settings['live_replay']
+            elif choice == '13':
+                settings['broadcast_port'] = get_broadcast_port()
+            elif choice == '14':
+                settings['resume'] = not settings['resume']
+            elif choice == '15':
+                settings['cache_quota_gb'] = get_cache_quota()
+            elif choice == '16':
+                settings['profile'] = not settings['profile']
             elif choice == '9':
                 return settings
             else:
@@ -282,6 +316,42 @@ def get_width_setting():
     width = input(f"{Colors.GREEN}> {Colors.RESET}").strip()
     return int(width) if width.isdigit() else None
 
+def get_broadcast_port():
+    """Порт для трансляции по сети"""
+    print_header("ТРАНСЛЯЦИЯ ПО СЕТИ")
+    print(f"{Colors.WHITE}Введите TCP порт (например, 2323):{Colors.RESET}")
+    print(f"{Colors.BLUE}Клиенты подключаются командой: telnet <адрес> <порт> или nc <адрес> <порт>{Colors.RESET}")
+    print(f"{Colors.YELLOW}Оставьте пустым, чтобы выключить трансляцию{Colors.RESET}")
+    print()
+    
+    while True:
+        port = input(f"{Colors.GREEN}> {Colors.RESET}").strip()
+        if not port:
+            return None
+        if port.isdigit() and 0 < int(port) < 65536:
+            return int(port)
+        print(f"{Colors.RED}Введите число от 1 до 65535!{Colors.RESET}")
+
+def get_cache_quota():
+    """Ограничение места под проекты в папке сохранения"""
+    print_header("МЕСТО ПОД ПРОЕКТЫ")
+    print(f"{Colors.WHITE}Введите ограничение в гигабайтах (например, 20):{Colors.RESET}")
+    print(f"{Colors.BLUE}Повторная конвертация того же видео с теми же настройками берет готовый проект.{Colors.RESET}")
+    print(f"{Colors.BLUE}При превышении удаляются проекты, которые дольше всего не использовались.{Colors.RESET}")
+    print(f"{Colors.YELLOW}Оставьте пустым, чтобы не ограничивать{Colors.RESET}")
+    print()
+    
+    while True:
+        quota = input(f"{Colors.GREEN}> {Colors.RESET}").strip().replace(',', '.')
+        if not quota:
+            return None
+        try:
+            if float(quota) > 0:
+                return float(quota)
+        except ValueError:
+            pass
+        print(f"{Colors.RED}Введите положительное число!{Colors.RESET}")
+
 def get_style_settings(settings):
     """Настройка стиля (можно выбрать несколько)"""
     while True:
@@ -424,7 +494,9 @@ def get_save_settings(settings, has_ffmpeg):
     else:
         options.append((3, "Видео файл (.mp4) - ffmpeg не найден", False))
     
-    options.append((4, "Только просмотр (сбросить все)", False))
+    options.append((4, "Один файл кадров (.ascv)", settings['save_container']))
+    options.append((5, "Сжатый поток кадров (.ascz)", settings['save_stream']))
+    options.append((6, "Только просмотр (сбросить все)", False))
     
     for num, text, selected in options:
         print_menu_option(num, text, selected)
@@ -435,16 +507,30 @@ def get_save_settings(settings, has_ffmpeg):
     
     choice = input(f"{Colors.GREEN}> {Colors.RESET}").strip()
     
-    if choice == '4':
+    if choice == '6':
         settings['save_txt'] = False
         settings['save_frames'] = False
         settings['save_video'] = False
+        settings['save_container'] = False
+        settings['save_stream'] = False
         return settings
     
     choices = choice.split()
     settings['save_txt'] = '1' in choices
     settings['save_frames'] = '2' in choices
     settings['save_video'] = '3' in choices and has_ffmpeg
+    settings['save_container'] = '4' in choices
+    settings['save_stream'] = '5' in choices
+    
+    if settings['save_stream']:
+        print()
+        print(f"{Colors.WHITE}Сжатие потока:{Colors.RESET}")
+        print_menu_option(1, "zlib (быстрее)", settings['stream_compression'] == 'zlib')
+        print_menu_option(2, "lzma (меньше файл, медленнее)", settings['stream_compression'] == 'lzma')
+        print_menu_option(3, "без сжатия", settings['stream_compression'] == 'none')
+        compression = input(f"{Colors.GREEN}> {Colors.RESET}").strip()
+        settings['stream_compression'] = {'1': 'zlib', '2': 'lzma', '3': 'none'}.get(
+            compression, settings['stream_compression'])
     
     if '3' in choices and not has_ffmpeg:
         print(f"{Colors.RED}FFmpeg не найден! Видео не будет сохранено.{Colors.RESET}")
@@ -472,23 +558,6 @@ def calculate_font_size(width_chars, target_width, quality='high'):
     
     return font_size
 
-def center_ascii_content(ascii_content, target_width_chars):
-    """Центрирует ASCII контент по горизонтали"""
-    lines = ascii_content.split('\n')
-    centered_lines = []
-    
-    for line in lines:
-        if len(line.strip()) == 0:
-            centered_lines.append('')
-            continue
-            
-        # Вычисляем отступ для центрирования
-        padding = max(0, (target_width_chars - len(line)) // 2)
-        centered_line = ' ' * padding + line
-        centered_lines.append(centered_line)
-    
-    return '\n'.join(centered_lines)
-
 def get_video_resolution(video_path):
     """Получает разрешение исходного видео"""
     cap = cv2.VideoCapture(video_path)
@@ -505,71 +574,120 @@ def calculate_proper_height(width_chars, original_width, original_height):
     
     return max(1, proper_height_chars)
 
-def create_ascii_for_terminal(gray_frame, width_chars, height_chars, config):
+def create_ascii_for_terminal(gray_frame, width_chars, height_chars, config, mapper=None):
     """Создает ASCII арт для терминала с цветами"""
-    ascii_chars = "@%#*+=-:. "
-    color_codes = [c for k, c in ASCII_COLORS.items() if k != 'reset']
-    
-    ascii_lines = []
-    for row in gray_frame:
-        ascii_line = ""
-        for pixel in row:
-            if config['transparent'] and pixel > config['threshold']:
-                ascii_line += " "
-            else:
-                char_index = min(pixel // 32, len(ascii_chars) - 1)
-                char = ascii_chars[char_index]
-                
-                # Применяем цвет только для терминала
-                if config['random_colors']:
-                    color_code = color_codes[char_index % len(color_codes)]
-                    ascii_line += f"{color_code}{char}{ASCII_COLORS['reset']}"
-                elif config['color'] and config['color'] in ASCII_COLORS:
-                    ascii_line += f"{ASCII_COLORS[config['color']]}{char}{ASCII_COLORS['reset']}"
-                else:
-                    ascii_line += char
-        ascii_lines.append(ascii_line)
-    
-    return "\n".join(ascii_lines)
-
-def create_ascii_for_save(gray_frame, width_chars, height_chars, config):
+    # gray_frame уже инвертирован вызывающим кодом, поэтому без invert
+    if mapper is None:
+        mapper = AsciiMapper(transparent=config['transparent'], threshold=config['threshold'])
+    indices = mapper.map(gray_frame)
+    return mapper.to_terminal(indices, config['color'], config['random_colors'])
+
+def create_ascii_for_save(gray_frame, width_chars, height_chars, config, mapper=None):
     """Создает ASCII арт для сохранения в файлы (без ANSI кодов)"""
-    ascii_chars = "@%#*+=-:. "
-    
-    ascii_lines = []
-    for row in gray_frame:
-        ascii_line = ""
-        for pixel in row:
-            if config['transparent'] and pixel > config['threshold']:
-                ascii_line += " "
-            else:
-                char_index = min(pixel // 32, len(ascii_chars) - 1)
-                char = ascii_chars[char_index]
-                ascii_line += char  # Просто символ, без цветовых кодов
-        ascii_lines.append(ascii_line)
-    
-    return "\n".join(ascii_lines)
+    if mapper is None:
+        mapper = AsciiMapper(transparent=config['transparent'], threshold=config['threshold'])
+    return mapper.to_text(mapper.map(gray_frame))
 
-def video_to_ascii(video_path, config):
-    """Основная функция конвертации"""
+def video_to_ascii(video_path, config, interactive=True):
+    """Основная функция конвертации
+    
+    Возвращает словарь: 'ok', 'frames' (сохранено кадров), 'path' (папка
+    проекта), 'error' (текст ошибки или None), а с resume еще 'skipped',
+    если проект уже был сконвертирован. interactive=False убирает паузу
+    перед стартом и очистку экрана (пакетная конвертация).
+    """
     has_ffmpeg = check_ffmpeg()
     
     cap = cv2.VideoCapture(video_path)
     
     if not cap.isOpened():
         print(f"{Colors.RED}Ошибка открытия видео!{Colors.RESET}")
-        return
+        return {'ok': False, 'frames': 0, 'path': None, 'error': "Ошибка открытия видео"}
     
     # Получаем информацию о видео
     fps = cap.get(cv2.CAP_PROP_FPS)
     total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
     original_width, original_height = get_video_resolution(video_path)
     
-    # Создаем уникальную папку для проекта
-    project_path, frames_dir, video_dir = create_project_folder(video_path, config)
+    if config['save_video'] and not has_ffmpeg:
+        video_unavailable = True
+        config['save_video'] = False
+    else:
+        video_unavailable = False
+    
+    # Определяем ширину для терминала (авто или указанная)
+    if config['width'] is None:
+        terminal_size = shutil.get_terminal_size()
+        terminal_width = terminal_size.columns - 1
+    else:
+        terminal_width = config['width']
+    
+    # Рассчитываем правильную высоту для сохранения пропорций
+    terminal_height = calculate_proper_height(terminal_width, original_width, original_height)
     
-    print_header("КОНВЕРТАЦИЯ")
+    # Папка проекта адресуется отпечатком видео и настройками (кеш результатов)
+    key = conversion_key(config, terminal_width, terminal_height)
+    output_dir = config.get('output_dir') or get_downloads_folder()
+    project_path, source, checkpoint = lookup(output_dir, video_path, key)
+    
+    if checkpoint is not None and checkpoint.complete:
+        # То же видео с теми же настройками уже сконвертировано
+        checkpoint.touch()
+        print(f"{Colors.GREEN}Уже сконвертировано: {project_path}{Colors.RESET}")
+        if config['preview'] and interactive:
+            play_in_terminal(cap, AsciiMapper.from_config(config),
+                             terminal_width, terminal_height, fps, config)
+        else:
+            cap.release()
+        return {'ok': True, 'frames': checkpoint.frames_done, 'path': project_path,
+                'error': None, 'skipped': True}
+    
+    if checkpoint is not None and not config.get('resume'):
+        # Незаконченный проект без продолжения начинается с чистой папки
+        shutil.rmtree(project_path, ignore_errors=True)
+        checkpoint = None
+    project_path, frames_dir, video_dir = create_project_folder(project_path)
+    
+    # Таблица яркость -> символ строится один раз на весь запуск
+    mapper = AsciiMapper.from_config(config)
+    
+    # Все кадры в одном файле: сетки индексов символов с доступом к любому кадру
+    start_frame = checkpoint.frames_done if checkpoint else 0
+    container = None
+    if config['save_container']:
+        container_path = os.path.join(project_path, 'frames.ascv')
+        try:
+            container = AsciiContainerWriter(container_path, terminal_width, terminal_height,
+                                             fps if fps > 0 else 30, mapper.glyphs, keep_frames=start_frame)
+        except (OSError, ValueError):
+            # Файл кадров потерян или поврежден: конвертация начинается заново
+            checkpoint = None
+            start_frame = 0
+            container = AsciiContainerWriter(container_path, terminal_width, terminal_height,
+                                             fps if fps > 0 else 30, mapper.glyphs)
+    
+    # Сжатый поток: опорные кадры и изменения клеток между кадрами
+    stream = None
+    if config['save_stream']:
+        stream_path = os.path.join(project_path, 'frames.ascz')
+        try:
+            stream = AsciiStreamWriter(stream_path, terminal_width, terminal_height, fps if fps > 0 else 30,
+                                       mapper.glyphs, config['stream_compression'], keep_frames=start_frame)
+        except (OSError, ValueError):
+            # Поток потерян или поврежден: конвертация начинается заново
+            if start_frame and container:
+                container.close()
+                container = AsciiContainerWriter(container_path, terminal_width, terminal_height,
+                                                 fps if fps > 0 else 30, mapper.glyphs)
+            checkpoint = None
+            start_frame = 0
+            stream = AsciiStreamWriter(stream_path, terminal_width, terminal_height, fps if fps > 0 else 30,
+                                       mapper.glyphs, config['stream_compression'])
+    
+    print_header("КОНВЕРТАЦИЯ", clear=interactive)
     print(f"{Colors.GREEN}Сохранение в: {project_path}{Colors.RESET}")
+    if start_frame:
+        print(f"{Colors.GREEN}Продолжение прерванной конвертации с кадра {start_frame}{Colors.RESET}")
     print(f"{Colors.WHITE}Информация о видео:{Colors.RESET}")
     print(f"  FPS: {fps:.1f}")
     print(f"  Всего кадров: {total_frames}")
@@ -577,9 +695,8 @@ def video_to_ascii(video_path, config):
     print(f"  Цвет фона: {config['background']}")
     print(f"  Качество шрифта: {config['font_quality']}")
     
-    if config['save_video'] and not has_ffmpeg:
+    if video_unavailable:
         print(f"{Colors.RED}Внимание: FFmpeg не найден! Видео не будет сохранено.{Colors.RESET}")
-        config['save_video'] = False
     
     print()
     print(f"{Colors.WHITE}Настройки:{Colors.RESET}")
@@ -607,267 +724,479 @@ def video_to_ascii(video_path, config):
         save_parts.append("PNG")
     if config['save_video']:
         save_parts.append("видео")
+    if config['save_container']:
+        save_parts.append(".ascv")
+    if config['save_stream']:
+        save_parts.append(f".ascz ({config['stream_compression']})")
     save_display = ", ".join(save_parts) if save_parts else "нет"
     print(f"  Сохранение: {save_display}")
     
     print(f"  Зацикливание: {'да' if config['loop'] else 'нет'}")
+    print(f"  Просмотр в терминале: {'да' if config['preview'] else 'нет (максимальная скорость)'}")
+    print(f"  Процессов: {config.get('workers') or default_workers()}")
+    if config.get('profile'):
+        print("  Профилирование: да")
+    if config.get('ffmpeg_decode') and not has_ffmpeg:
+        print(f"{Colors.RED}Внимание: FFmpeg не найден! Кадры декодирует OpenCV.{Colors.RESET}")
     print()
     print(f"{Colors.YELLOW}Нажмите Ctrl+C для остановки{Colors.RESET}")
     print()
-    time.sleep(2)
+    if interactive:
+        time.sleep(2)
     
-    # Определяем ширину для терминала (авто или указанная)
-    if config['width'] is None:
-        terminal_size = shutil.get_terminal_size()
-        terminal_width = terminal_size.columns - 1
-    else:
-        terminal_width = config['width']
+    # Для видео высокого разрешения: ffmpeg отдает сразу серую сетку символов
+    if config.get('ffmpeg_decode') and has_ffmpeg:
+        cap.release()
+        cap = FFmpegGrayReader(video_path, (terminal_width, terminal_height))
     
-    # Рассчитываем правильную высоту для сохранения пропорций
-    terminal_height = calculate_proper_height(terminal_width, original_width, original_height)
+    # Уже записанные кадры не обрабатываются заново
+    if start_frame:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
     
-    # Для сохранения видео
-    temp_frames_dir = None
+    # Для сохранения видео: кадры идут в ffmpeg напрямую, без временных PNG,
+    # отрезками, чтобы прерванная конвертация не кодировала их заново
+    video_writer = None
+    video_output_path = None
     if config['save_video'] and has_ffmpeg:
-        temp_frames_dir = os.path.join(project_path, "temp_frames")
-        if not os.path.exists(temp_frames_dir):
-            os.makedirs(temp_frames_dir)
-    
+        video_output_path = os.path.join(video_dir, "ascii_video.mp4")
+        video_writer = SegmentedVideoWriter(video_output_path, os.path.join(video_dir, 'segments'),
+                                            original_width, original_height, fps if fps > 0 else 30,
+                                            segment_frames=VIDEO_SEGMENT_FRAMES,
+                                            segments=checkpoint.segments if checkpoint else ())
+    
+    # Только просмотр: кадры декодируются к сроку показа, опоздавшие пропускаются
+    if config['preview'] and not (config['save_txt'] or config['save_frames'] or video_writer or container or stream):
+        play_in_terminal(cap, mapper, terminal_width, terminal_height, fps, config)
+        return {'ok': True, 'frames': 0, 'path': project_path, 'error': None}
+    
+    # Следующие кадры декодируются в отдельном потоке, пока обрабатывается текущий.
+    # Просмотр выше идет без этого: опоздавшие кадры там пропускаются без декодирования
+    cap = PrefetchedSource(cap)
+    
+    # Прогресс в папке проекта: с него продолжит следующий запуск
+    if checkpoint is None:
+        checkpoint = ConversionCheckpoint.create(project_path, source, key)
+    
+    # Описание обработки кадра для рабочих процессов
+    spec = build_frame_spec(config, terminal_width, terminal_height, original_width, original_height,
+                            keep_frame=video_writer is not None)
+    # Замер стадий конвертации (только по запросу)
+    workers = config.get('workers') or default_workers()
+    profiler = ConversionProfiler(workers) if config.get('profile') else None
+    # Конвейер проходит видео один раз: повторы при зацикливании только показываются
+    pipeline = FramePipeline(cap, spec, workers=workers, start=start_frame, profiler=profiler)
+    
+    # Просмотр в терминале - необязательный потребитель того же потока кадров
+    preview = None
+    cache = None
+    if config['preview']:
+        preview = TerminalPreview(mapper, fps, config['color'], config['random_colors'])
+        if config['loop']:
+            cache = create_loop_cache(config, mapper)
+            if start_frame:
+                # Начала видео в кеше не будет: повторы декодируют видео заново
+                cache.clear()
+    
+    # Каждый кадр отрисован один раз и раздается всем потребителям
+    sinks = FrameSinks([
+        TextSink(frames_dir) if config['save_txt'] else None,
+        PngSink(frames_dir) if config['save_frames'] else None,
+        ContainerSink(container) if container else None,
+        StreamSink(stream) if stream else None,
+        PreviewSink(preview, cache) if preview else None,
+    ], profiler=profiler)
+    video_sink = sinks.add(VideoSink(video_writer)) if video_writer else None
+    if container and start_frame:
+        # Повторы ищутся и среди кадров, записанных до остановки
+        sinks.duplicates.seed(frame_digests(container.path, start_frame))
+    
+    frame_count = 0
+    error = None
+    start_time = time.monotonic()
+    last_progress = 0.0
+    last_checkpoint = start_time
     try:
-        clear_screen()
-        frame_count = 0
+        if preview:
+            clear_screen()
+            preview.start()
         
-        # Скрываем курсор
-        print("\033[?25l", end='')
-        
-        while True:
-            ret, frame = cap.read()
-            
-            if not ret:
-                if config['loop']:
-                    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-                    continue
-                else:
-                    break
-            
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            
-            # Ресайзим с сохранением пропорций
-            resized = cv2.resize(gray, (terminal_width, terminal_height))
-            
-            if config['invert']:
-                resized = 255 - resized
-            
-            # Создаем ASCII для терминала (с цветами)
-            terminal_ascii = create_ascii_for_terminal(resized, terminal_width, terminal_height, config)
+        # Кадры приходят из конвейера строго по порядку
+        for result in pipeline:
+            # Сохранение TXT, PNG, .ascv, вывод в терминал и отправка кадра в ffmpeg
+            try:
+                sinks.write(result)
+            except FFmpegError as e:
+                print(f"{Colors.RED}Ошибка FFmpeg, видео не будет сохранено: {e}{Colors.RESET}")
+                error = f"Ошибка FFmpeg: {e}"
+                sinks.remove(video_sink)
+                video_writer.abort()
+                video_writer = None
+                # Дальше прогресс не записывается: продолжение начнется с кадров, где видео еще есть
+                checkpoint = None
             
-            # Создаем ASCII для сохранения (без цветов)
-            save_ascii = create_ascii_for_save(resized, terminal_width, terminal_height, config)
-            
-            # Центрируем контент для терминала
-            centered_content = center_ascii_content(terminal_ascii, terminal_width)
-            
-            # Сохранение в текстовый файл (без цветов)
-            if config['save_txt']:
-                txt_filename = os.path.join(frames_dir, f"frame_{frame_count:06d}.txt")
-                with open(txt_filename, 'w', encoding='utf-8') as f:
-                    f.write(save_ascii)
-            
-            # Сохранение как изображение в оригинальном разрешении
-            if config['save_frames']:
-                save_ascii_as_image_original_res(save_ascii, frame_count, frames_dir, 
-                                               terminal_width, terminal_height, original_width, original_height, 
-                                               config)
-            
-            # Сохранение кадра для видео в оригинальном разрешении
-            if config['save_video'] and temp_frames_dir:
-                save_frame_for_video_original_res(save_ascii, frame_count, temp_frames_dir, 
-                                                terminal_width, terminal_height, original_width, original_height,
-                                                config)
+            frame_count += 1
             
-            # Вывод в терминал (только ASCII арт, без лишних сообщений)
-            print("\033[H" + centered_content, end='', flush=True)
+            if checkpoint and time.monotonic() - last_checkpoint >= CHECKPOINT_INTERVAL:
+                last_checkpoint = time.monotonic()
+                checkpoint.commit_outputs(start_frame + frame_count, container, video_writer, stream)
             
-            time.sleep(1.0 / fps if fps > 0 else 0.033)
-            frame_count += 1
+            if not preview and time.monotonic() - last_progress >= 0.5:
+                last_progress = time.monotonic()
+                print_progress(start_frame + frame_count, total_frames, last_progress - start_time, start_frame)
+        
+        # Все уже сохранено, дальше кадры только показываются до Ctrl+C
+        if cache is not None and frame_count:
+            if cache.finish():
+                replay_cache(cache, preview)
+            else:
+                # Кадры не поместились в память: повторные проходы декодируют видео,
+                # опоздавшие кадры пропускаются без декодирования
+                cap = cap.detach()
+                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                convert = create_terminal_converter(mapper, terminal_width, terminal_height)
+                RealtimePlayer(cap, preview, convert, loop=True).run()
             
-        # Показываем курсор обратно
-        print("\033[?25h", end='')
+        if preview:
+            preview.stop()
+        else:
+            print_progress(start_frame + frame_count, total_frames, time.monotonic() - start_time, start_frame)
         
-        print(f"\n{Colors.GREEN}Готово! Сохранено {frame_count} кадров{Colors.RESET}")
+        print(f"\n{Colors.GREEN}Готово! Сохранено {start_frame + frame_count} кадров{Colors.RESET}")
+        if sinks.frames_duplicate:
+            print(f"{Colors.BLUE}Повторов кадров: {sinks.frames_duplicate} "
+                  f"(сохранены ссылками на первый такой кадр){Colors.RESET}")
         print(f"{Colors.GREEN}Файлы находятся в: {project_path}{Colors.RESET}")
+        if preview:
+            print_playback_stats(preview.stats())
         
-        # Сборка видео в оригинальном разрешении
-        if config['save_video'] and temp_frames_dir and has_ffmpeg:
-            video_filename = f"ascii_video_{datetime.now().strftime('%H%M%S')}.mp4"
-            video_output_path = os.path.join(video_dir, video_filename)
-            
-            success = create_video_original_res_from_frames(temp_frames_dir, video_output_path, fps)
-            if success:
-                print(f"{Colors.GREEN}Видео успешно сохранено: {video_output_path}{Colors.RESET}")
-            else:
-                print(f"{Colors.RED}Ошибка при создании видео!{Colors.RESET}")
+        # Завершение видео в оригинальном разрешении
+        if video_writer and not finish_video(video_writer, video_output_path):
+            error = "Ошибка FFmpeg при сборке видео"
+        if start_frame + frame_count == 0 and error is None:
+            error = "В видео не прочитано ни одного кадра"
+        
+        if checkpoint and error is None:
+            checkpoint.commit_outputs(start_frame + frame_count, container, video_writer, stream)
+            checkpoint.finish()
+            if video_writer:
+                video_writer.discard_segments()
             
     except KeyboardInterrupt:
         # Показываем курсор обратно при прерывании
-        print("\033[?25h", end='')
-        print(f"\n{Colors.YELLOW}Остановлено. Сохранено {frame_count} кадров{Colors.RESET}")
+        if preview:
+            preview.stop()
+        print(f"\n{Colors.YELLOW}Остановлено. Сохранено {start_frame + frame_count} кадров{Colors.RESET}")
         print(f"{Colors.GREEN}Файлы находятся в: {project_path}{Colors.RESET}")
+        # Уже закодированные кадры сохраняются как готовое видео
+        if video_writer:
+            finish_video(video_writer, video_output_path)
+        if checkpoint:
+            checkpoint.commit_outputs(start_frame + frame_count, container, video_writer, stream)
+            print(f"{Colors.BLUE}Продолжить можно с этого места: пункт меню "
+                  f"«Продолжать прерванную конвертацию»{Colors.RESET}")
+        error = "Остановлено"
     finally:
+        # Конвейер останавливается первым (его декодер читает cap), а остальное
+        # освобождается, даже если остановка не удалась
+        try:
+            pipeline_error = pipeline.close()
+        finally:
+            cap.release()
+            if container:
+                container.close()
+            if stream:
+                stream.close()
+            # При ошибке останавливаем ffmpeg (после close() ничего не делает)
+            if video_writer:
+                video_writer.abort()
+    if pipeline_error is not None and error is None:
+        error = f"Ошибка обработки кадра: {pipeline_error}"
+    
+    # Отчет профиля: после остановки конвейера, чтобы в память вошли его процессы
+    profile = None
+    if profiler is not None and profiler.frames:
+        profiler.finish(dropped=preview.stats()['dropped'] if preview else 0)
+        profile = print_profile(profiler, os.path.join(project_path, 'profile.json'))
+    
+    # Место под проекты ограничено: удаляются давно не использованные
+    if error is None and config.get('cache_quota_gb'):
+        removed = evict_projects(output_dir, config['cache_quota_gb'] * 1024 ** 3, keep=[project_path])
+        if removed:
+            print(f"{Colors.BLUE}Удалено старых проектов: {len(removed)}{Colors.RESET}")
+    
+    return {'ok': error is None, 'frames': start_frame + frame_count, 'duplicates': sinks.frames_duplicate,
+            'path': project_path, 'error': error, 'profile': profile}
+
+def conversion_key(config, width_chars, height_chars):
+    """Все, от чего зависит результат конвертации (для продолжения)"""
+    key = {name: config[name] for name in OUTPUT_SETTINGS}
+    key['grid'] = [width_chars, height_chars]
+    return key
+
+def is_live_source(video_path):
+    """Номер камеры или адрес потока вместо файла"""
+    return video_path.isdigit() or '://' in video_path
+
+def open_live_source(video_path):
+    """Живой источник: камера, поток или файл в темпе камеры (live_replay)"""
+    if video_path.isdigit():
+        cap = cv2.VideoCapture(int(video_path))
+    elif is_live_source(video_path):
+        cap = cv2.VideoCapture(video_path)
+    else:
+        return ReplaySource(video_path)
+    # Свой буфер драйвера тоже копит старые кадры
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    if not cap.isOpened():
+        raise IOError(f"Не удалось открыть источник: {video_path}")
+    return cap
+
+def live_to_ascii(video_path, config):
+    """Живой режим: всегда самый новый кадр, устаревшие отбрасываются"""
+    try:
+        cap = open_live_source(video_path)
+    except IOError as e:
+        print(f"{Colors.RED}{e}{Colors.RESET}")
+        return
+    
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    original_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    original_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    
+    print_header("ЖИВОЙ РЕЖИМ")
+    print(f"{Colors.WHITE}Источник: {video_path}{Colors.RESET}")
+    print(f"  FPS: {fps:.1f}" if fps > 0 else "  FPS: неизвестно")
+    print(f"  Разрешение: {original_width}x{original_height}")
+    print(f"{Colors.BLUE}Сохранение в живом режиме не выполняется{Colors.RESET}")
+    print()
+    print(f"{Colors.YELLOW}Нажмите Ctrl+C для остановки{Colors.RESET}")
+    time.sleep(2)
+    
+    if config['width'] is None:
+        # Терминал клиентов трансляции неизвестен: 120 символов
+        terminal_width = 120 if config.get('broadcast_port') else shutil.get_terminal_size().columns - 1
+    else:
+        terminal_width = config['width']
+    if original_width > 0 and original_height > 0:
+        terminal_height = calculate_proper_height(terminal_width, original_width, original_height)
+    else:
+        terminal_height = max(1, shutil.get_terminal_size().lines - 1)
+    
+    mapper = AsciiMapper.from_config(config)
+    convert = create_terminal_converter(mapper, terminal_width, terminal_height)
+    server = start_broadcast(config)
+    if config['broadcast_port'] and server is None:
         cap.release()
-        # Удаляем временные файлы
-        if temp_frames_dir and os.path.exists(temp_frames_dir):
-            import shutil as shutil_module
-            shutil_module.rmtree(temp_frames_dir)
+        return
+    # Темп задает источник: кадр выводится сразу, без ожидания срока
+    preview = create_preview(server, mapper, fps, config, paced=False)
+    source = LatestFrameSource(cap)
+    player = LivePlayer(source, preview, convert)
+    
+    try:
+        if server is None:
+            clear_screen()
+        player.run()
+        print(f"\n{Colors.GREEN}Источник закончился{Colors.RESET}")
+    except KeyboardInterrupt:
+        print(f"\n{Colors.YELLOW}Остановлено{Colors.RESET}")
+    finally:
+        source.release()
+        if server:
+            server.close()
+    
+    stats = player.stats()
+    print_playback_stats(stats)
+    print_latency_stats(stats)
+    if server:
+        print_broadcast_stats(server.stats())
 
-def save_ascii_as_image_original_res(ascii_content, frame_num, output_dir, width_chars, height_chars, target_width, target_height, config):
-    """Сохраняет ASCII как PNG изображение в оригинальном разрешении с центрированием"""
+def start_broadcast(config):
+    """Сервер трансляции, если в настройках задан порт"""
+    if not config.get('broadcast_port'):
+        return None
     try:
-        import pygame
-        
-        # Рассчитываем размер шрифта с учетом качества
-        font_size = calculate_font_size(width_chars, target_width, config['font_quality'])
-        
-        # Создаем поверхность с оригинальным разрешением
-        img_width = target_width
-        img_height = target_height
-        
-        pygame.init()
-        
-        # Используем шрифт с антиалиасингом для лучшего качества
-        font = pygame.font.SysFont('Courier New', font_size, bold=True)
-        surface = pygame.Surface((img_width, img_height))
-        
-        # Устанавливаем цвет фона
-        bg_color = BACKGROUND_COLORS.get(config['background'], (0, 0, 0))
-        surface.fill(bg_color)
-        
-        # Определяем цвет текста
-        if config['color'] and config['color'] in RGB_COLORS:
-            text_color = RGB_COLORS[config['color']]
-        elif config['random_colors']:
-            # Для случайных цветов используем белый или черный в зависимости от фона
-            text_color = (255, 255, 255) if config['background'] in ['black', 'dark_gray'] else (0, 0, 0)
-        else:
-            # По умолчанию - белый на темном фоне, черный на светлом
-            text_color = (255, 255, 255) if config['background'] in ['black', 'dark_gray'] else (0, 0, 0)
-        
-        lines = ascii_content.split('\n')
-        
-        # Рассчитываем общую высоту текста
-        total_text_height = len(lines) * font_size
-        
-        # Центрируем по вертикали
-        start_y = (img_height - total_text_height) // 2
-        
-        for y, line in enumerate(lines):
-            if y >= height_chars:
-                break
-                
-            text_surface = font.render(line, True, text_color)
-            
-            # Центрируем текст по горизонтали
-            text_width = text_surface.get_width()
-            x_position = (img_width - text_width) // 2
-            
-            # Позиция по вертикали
-            y_position = start_y + y * font_size
-            
-            surface.blit(text_surface, (x_position, y_position))
-        
-        # Сохраняем PNG с максимальным качеством
-        pygame.image.save(surface, os.path.join(output_dir, f"frame_{frame_num:06d}.png"))
-        
-    except ImportError:
-        print(f"{Colors.RED}Ошибка: pygame не установлен. Установите: pip install pygame{Colors.RESET}")
-    except Exception as e:
-        print(f"{Colors.RED}Ошибка при сохранении PNG: {e}{Colors.RESET}")
+        server = BroadcastServer(port=config['broadcast_port']).start()
+    except OSError as e:
+        print(f"{Colors.RED}Не удалось открыть порт {config['broadcast_port']}: {e}{Colors.RESET}")
+        return None
+    print(f"{Colors.GREEN}Трансляция: telnet <адрес этого компьютера> {server.port} "
+          f"(или nc). Кадры в этот терминал не выводятся.{Colors.RESET}")
+    return server
+
+def create_preview(server, mapper, fps, config, paced=True):
+    """Вывод кадров: в свой терминал или всем клиентам трансляции"""
+    if server is not None:
+        return BroadcastPreview(server, mapper, fps, config['color'], config['random_colors'], paced=paced)
+    return TerminalPreview(mapper, fps, config['color'], config['random_colors'], paced=paced)
 
-def save_frame_for_video_original_res(ascii_content, frame_num, output_dir, width_chars, height_chars, target_width, target_height, config):
-    """Сохраняет кадр для сборки видео в оригинальном разрешении с центрированием"""
+def broadcast_video(video_path, config):
+    """Трансляция видео по сети в темпе исходного видео (без сохранения)"""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        print(f"{Colors.RED}Ошибка открытия видео!{Colors.RESET}")
+        return
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    original_width, original_height = get_video_resolution(video_path)
+    
+    print_header("ТРАНСЛЯЦИЯ")
+    server = start_broadcast(config)
+    if server is None:
+        cap.release()
+        return
+    print(f"{Colors.YELLOW}Нажмите Ctrl+C для остановки{Colors.RESET}")
+    
+    # Клиентский терминал неизвестен: без заданной ширины берем 120 символов
+    width_chars = config['width'] or 120
+    height_chars = calculate_proper_height(width_chars, original_width, original_height)
+    mapper = AsciiMapper.from_config(config)
+    convert = create_terminal_converter(mapper, width_chars, height_chars)
+    preview = create_preview(server, mapper, fps, config)
+    cache = create_loop_cache(config, mapper) if config['loop'] else None
+    player = RealtimePlayer(cap, preview, convert, loop=config['loop'], cache=cache)
+    
     try:
-        import pygame
-        
-        # Используем тот же расчет что и для PNG
-        font_size = calculate_font_size(width_chars, target_width, config['font_quality'])
-        
-        img_width = target_width
-        img_height = target_height
-        
-        pygame.init()
-        font = pygame.font.SysFont('Courier New', font_size, bold=True)
-        surface = pygame.Surface((img_width, img_height))
-        
-        # Устанавливаем цвет фона
-        bg_color = BACKGROUND_COLORS.get(config['background'], (0, 0, 0))
-        surface.fill(bg_color)
-        
-        # Определяем цвет текста
-        if config['color'] and config['color'] in RGB_COLORS:
-            text_color = RGB_COLORS[config['color']]
-        elif config['random_colors']:
-            # Для случайных цветов используем белый или черный в зависимости от фона
-            text_color = (255, 255, 255) if config['background'] in ['black', 'dark_gray'] else (0, 0, 0)
-        else:
-            # По умолчанию - белый на темном фоне, черный на светлом
-            text_color = (255, 255, 255) if config['background'] in ['black', 'dark_gray'] else (0, 0, 0)
-        
-        lines = ascii_content.split('\n')
-        
-        # Рассчитываем общую высоту текста
-        total_text_height = len(lines) * font_size
-        
-        # Центрируем по вертикали
-        start_y = (img_height - total_text_height) // 2
-        
-        for y, line in enumerate(lines):
-            if y >= height_chars:
-                break
-                
-            text_surface = font.render(line, True, text_color)
-            
-            # Центрируем текст по горизонтали
-            text_width = text_surface.get_width()
-            x_position = (img_width - text_width) // 2
-            
-            # Позиция по вертикали
-            y_position = start_y + y * font_size
-            
-            surface.blit(text_surface, (x_position, y_position))
-        
-        pygame.image.save(surface, os.path.join(output_dir, f"frame_{frame_num:06d}.png"))
-        
-    except ImportError:
-        print(f"{Colors.RED}Ошибка: pygame не установлен{Colors.RESET}")
-    except Exception as e:
-        print(f"{Colors.RED}Ошибка при сохранении кадра: {e}{Colors.RESET}")
+        player.run()
+        print(f"\n{Colors.GREEN}Готово!{Colors.RESET}")
+    except KeyboardInterrupt:
+        print(f"\n{Colors.YELLOW}Остановлено{Colors.RESET}")
+    finally:
+        player.source.release()
+        server.close()
+    
+    print_playback_stats(preview.stats())
+    print_broadcast_stats(server.stats())
 
-def create_video_original_res_from_frames(frames_dir, output_video, fps):
-    """Собирает видео из кадров в оригинальном разрешении"""
+def play_in_terminal(cap, mapper, width_chars, height_chars, fps, config):
+    """Воспроизведение в терминале без сохранения, в темпе исходного видео"""
+    convert = create_terminal_converter(mapper, width_chars, height_chars)
+    preview = TerminalPreview(mapper, fps, config['color'], config['random_colors'])
+    # При зацикливании повторные проходы идут из памяти, без декодирования
+    cache = create_loop_cache(config, mapper) if config['loop'] else None
+    player = RealtimePlayer(cap, preview, convert, loop=config['loop'], cache=cache)
+    
     try:
-        print(f"{Colors.BLUE}Сборка видео...{Colors.RESET}")
-        
-        # Используем более надежные настройки FFmpeg
-        result = subprocess.run([
-            'ffmpeg', '-y',
-            '-framerate', str(fps),  # Используем framerate вместо -r
-            '-i', f'{frames_dir}/frame_%06d.png',
-            '-c:v', 'libx264',
-            '-pix_fmt', 'yuv420p',
-            '-crf', '18',  # Высокое качество
-            '-preset', 'medium',
-            '-r', str(fps),  # Дублируем FPS для надежности
-            output_video
-        ], capture_output=True, text=True)
-        
-        if result.returncode == 0:
-            return True
-        else:
-            print(f"{Colors.RED}Ошибка FFmpeg: {result.stderr}{Colors.RESET}")
-            return False
-            
-    except Exception as e:
-        print(f"{Colors.RED}Ошибка при создании видео: {e}{Colors.RESET}")
+        clear_screen()
+        player.run()
+        print(f"\n{Colors.GREEN}Готово!{Colors.RESET}")
+    except KeyboardInterrupt:
+        print(f"\n{Colors.YELLOW}Остановлено{Colors.RESET}")
+    finally:
+        cap.release()
+    
+    print_playback_stats(preview.stats())
+
+def create_terminal_converter(mapper, width_chars, height_chars):
+    """Кадр видео -> сетка индексов символов для терминала"""
+    def convert(frame):
+        return mapper.map(resize_to_grid(to_gray(frame), (width_chars, height_chars)))
+    return convert
+
+def create_loop_cache(config, mapper):
+    """Кеш кадров для зацикливания с ограничением памяти из настроек"""
+    return FrameCache(config.get('loop_cache_mb', 256) * 1024 * 1024, len(mapper.glyphs))
+
+def print_playback_stats(stats):
+    """Статистика воспроизведения в терминале"""
+    print(f"{Colors.WHITE}Показано кадров: {stats['shown']}, пропущено: {stats['dropped']}, "
+          f"с опозданием: {stats['late']}{Colors.RESET}")
+    print(f"{Colors.WHITE}Выведено в терминал: {stats['bytes'] / 1024:.0f} КБ, "
+          f"полных перерисовок: {stats['full_redraws']}{Colors.RESET}")
+
+def print_profile(profiler, json_path=None):
+    """Отчет профиля конвертации; json_path - куда сохранить полный профиль"""
+    summary = profiler.summary()
+    lines = profiler.report_lines(summary)
+    print(f"\n{Colors.WHITE}{lines[0]}{Colors.RESET}")
+    for line in lines[1:]:
+        print(f"{Colors.BLUE}{line}{Colors.RESET}")
+    if json_path:
+        profiler.save(json_path, summary)
+        print(f"{Colors.GREEN}Профиль по кадрам: {json_path}{Colors.RESET}")
+    return summary
+
+def print_latency_stats(stats):
+    """Задержка от захвата кадра до вывода в терминал"""
+    latency = stats['latency']
+    if latency is None:
+        return
+    print(f"{Colors.WHITE}Захвачено кадров: {stats['captured']}, задержка захват -> экран: "
+          f"средняя {latency['mean']:.0f} мс, p50 {latency['p50']:.0f} мс, "
+          f"p95 {latency['p95']:.0f} мс, макс {latency['max']:.0f} мс{Colors.RESET}")
+
+def print_broadcast_stats(stats):
+    """Статистика трансляции"""
+    print(f"{Colors.WHITE}Разослано кадров: {stats['frames']}, "
+          f"подключалось клиентов: {stats['clients_total']}{Colors.RESET}")
+
+def print_progress(frame_count, total_frames, elapsed, start_frame=0):
+    """Строка прогресса для конвертации без просмотра"""
+    speed = (frame_count - start_frame) / elapsed if elapsed > 0 else 0
+    if total_frames > 0:
+        percent = min(100, frame_count * 100 // total_frames)
+        print(f"\r{Colors.BLUE}Кадр {frame_count}/{total_frames} ({percent}%), {speed:.1f} кадр/с{Colors.RESET}", end='', flush=True)
+    else:
+        print(f"\r{Colors.BLUE}Кадр {frame_count}, {speed:.1f} кадр/с{Colors.RESET}", end='', flush=True)
+
+def get_text_color(config):
+    """Цвет текста для PNG/видео"""
+    if config['color'] and config['color'] in RGB_COLORS:
+        return RGB_COLORS[config['color']]
+    # Для случайных цветов и по умолчанию - белый на темном фоне, черный на светлом
+    return (255, 255, 255) if config['background'] in ['black', 'dark_gray'] else (0, 0, 0)
+
+def get_render_spec(width_chars, height_chars, target_width, target_height, config):
+    """Параметры отрисовки кадров в оригинальном разрешении"""
+    from ascii_render import get_font
+    
+    # Рассчитываем размер шрифта с учетом качества
+    font_size = calculate_font_size(width_chars, target_width, config['font_quality'])
+    
+    # Строки идут с шагом font_size, символы - с шагом моноширинного шрифта
+    font = get_font('Courier New', font_size, bold=True)
+    
+    return {
+        'font_name': 'Courier New',
+        'font_size': font_size,
+        'text_color': get_text_color(config),
+        'bg_color': BACKGROUND_COLORS.get(config['background'], (0, 0, 0)),
+        'cell_size': (font.size('X')[0], font_size),
+        'grid_size': (width_chars, height_chars),
+        'canvas_size': (target_width, target_height),
+    }
+
+def build_frame_spec(config, width_chars, height_chars, target_width, target_height, keep_frame=False):
+    """Описание обработки кадра для конвейера (см. frame_pipeline)"""
+    spec = {
+        'grid': (width_chars, height_chars),
+        'mapper': {
+            'transparent': config['transparent'],
+            'threshold': config['threshold'],
+            'invert': config['invert'],
+        },
+        'txt': config['save_txt'],
+        'render': None,
+        'png': config['save_frames'],
+        'keep_frame': keep_frame,
+    }
+    
+    if config['save_frames'] or keep_frame:
+        try:
+            spec['render'] = get_render_spec(width_chars, height_chars, target_width, target_height, config)
+        except ImportError:
+            print(f"{Colors.RED}Ошибка: pygame не установлен. Установите: pip install pygame{Colors.RESET}")
+    
+    return spec
+
+def finish_video(video_writer, output_video):
+    """Дожидается окончания кодирования видео"""
+    print(f"{Colors.BLUE}Сборка видео...{Colors.RESET}")
+    try:
+        video_writer.close()
+        print(f"{Colors.GREEN}Видео успешно сохранено: {output_video}{Colors.RESET}")
+        return True
+    except FFmpegError as e:
+        print(f"{Colors.RED}Ошибка FFmpeg: {e}{Colors.RESET}")
         return False
 
 def main():
@@ -891,8 +1220,13 @@ def main():
         if not config:
             return
         
-        # Запускаем конвертацию
-        video_to_ascii(video_path, config)
+        # Камера и поток (или файл в темпе камеры) - живой режим, иначе конвертация
+        if is_live_source(video_path) or config.get('live_replay'):
+            live_to_ascii(video_path, config)
+        elif config.get('broadcast_port'):
+            broadcast_video(video_path, config)
+        else:
+            video_to_ascii(video_path, config)
         
     except KeyboardInterrupt:
         print(f"\n{Colors.YELLOW}Выход из программы{Colors.RESET}")
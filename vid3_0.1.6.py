@@ -1,16 +1,27 @@
 import os
+import shutil
 import cv2
 import pygame
 import threading
-import subprocess
-import shutil
-from datetime import datetime
+import time
 from tkinter import *
 from tkinter import filedialog, messagebox, colorchooser
 from tkinter.ttk import Progressbar
 import customtkinter as ctk
 from PIL import Image, ImageTk
-import numpy as np
+
+from ascii_container import AsciiContainerWriter, frame_digests
+from ascii_stream import COMPRESSION, AsciiStreamWriter
+from ascii_engine import AsciiMapper
+from ascii_render import FrameRenderer, get_font, get_glyph_atlas
+from checkpoint import ConversionCheckpoint, evict_projects, lookup
+from ffmpeg_io import FFmpegError, FFmpegGrayReader, SegmentedVideoWriter
+from frame_pipeline import FramePipeline, default_workers
+from frame_sinks import ContainerSink, FrameSinks, PngSink, StreamSink, TextSink, VideoSink
+from frame_source import PrefetchedSource
+from preview_worker import FrameSeeker, LatestOnlyWorker
+from profiler import ConversionProfiler
+from vid2 import check_ffmpeg
 
 # pip install customtkinter opencv-python pygame pillow
 
@@ -18,6 +29,10 @@ ctk.set_appearance_mode("dark")
 ctk.set_default_color_theme("green")
 
 ASCII_CHARS = "@%#*+=-:. "[::-1]
+# Ширина сетки черновика предпросмотра (показывается, пока рендерится полный)
+PREVIEW_DRAFT_WIDTH = 80
+# Как часто записывается прогресс конвертации (секунды)
+CHECKPOINT_INTERVAL = 2.0
 
 class ASCIIConverterApp:
     def __init__(self):
@@ -26,7 +41,8 @@ class ASCIIConverterApp:
         self.root.title("ASCII Video Converter")
         self.root.geometry("1600x1000")
 
-        self.first_frame = None
+        # Доступ к кадрам видео для предпросмотра (только из фонового потока)
+        self.seeker = None
 
         # Переменные
         self.video_path = StringVar()
@@ -41,13 +57,29 @@ class ASCIIConverterApp:
         self.save_txt = ctk.BooleanVar(value=True)
         self.save_png = ctk.BooleanVar(value=True)
         self.save_video = ctk.BooleanVar(value=False)
+        self.save_container = ctk.BooleanVar(value=False)
+        self.save_stream = ctk.BooleanVar(value=False)
+        self.stream_compression = ctk.StringVar(value="zlib")
         self.video_quality = ctk.StringVar(value="Высокое")
+        self.workers = ctk.IntVar(value=default_workers())
+        self.ffmpeg_decode = ctk.BooleanVar(value=False)
+        self.resume = ctk.BooleanVar(value=False)
+        self.profile = ctk.BooleanVar(value=False)
+        # Ограничение места под проекты в ГБ (пусто - без ограничения)
+        self.cache_quota_gb = ctk.StringVar(value="")
+        self.frame_index = ctk.IntVar(value=0)
 
         # Камера
         self.brightness = ctk.IntVar(value=0)
         self.contrast = ctk.DoubleVar(value=1.0)
         self.gamma = ctk.DoubleVar(value=1.0)
 
+        # Предпросмотр рендерится в фоне, устаревшие заявки отбрасываются
+        self.preview_worker = LatestOnlyWorker(self.deliver_preview, self.preview_failed)
+        # Текст ошибки предпросмотра в строке статуса и статус до нее
+        self.preview_error = None
+        self.status_before_error = None
+
         self.setup_ui()
         self.bind_changes()
 
@@ -113,12 +145,28 @@ class ASCIIConverterApp:
         # Качество видео
         ctk.CTkLabel(left_scroll, text="Качество MP4", font=("Segoe UI", 16, "bold"), text_color="#bdf282").pack(anchor="w", padx=30, pady=(20,10))
         ctk.CTkComboBox(left_scroll, values=["Низкое", "Среднее", "Высокое", "Без потерь"], variable=self.video_quality).pack(padx=50, pady=5)
+        max_workers = max(2, os.cpu_count() or 1)
+        slider("Процессов конвертации", self.workers, 1, max_workers, 1)
+        ctk.CTkCheckBox(left_scroll, text="Декодировать через ffmpeg сразу в сетку (быстрее для 4K)",
+                        variable=self.ffmpeg_decode).pack(anchor="w", padx=50, pady=(10,0))
 
         # Сохранение
         ctk.CTkLabel(left_scroll, text="Сохранить как", font=("Segoe UI", 16, "bold"), text_color="#bdf282").pack(anchor="w", padx=30, pady=(20,10))
         ctk.CTkCheckBox(left_scroll, text="TXT файлы", variable=self.save_txt).pack(anchor="w", padx=50)
         ctk.CTkCheckBox(left_scroll, text="PNG кадры", variable=self.save_png).pack(anchor="w", padx=50)
         ctk.CTkCheckBox(left_scroll, text="MP4 видео", variable=self.save_video).pack(anchor="w", padx=50)
+        ctk.CTkCheckBox(left_scroll, text="Один файл .ascv", variable=self.save_container).pack(anchor="w", padx=50)
+        ctk.CTkCheckBox(left_scroll, text="Сжатый поток .ascz (архив)", variable=self.save_stream).pack(anchor="w", padx=50)
+        ctk.CTkComboBox(left_scroll, values=list(COMPRESSION), variable=self.stream_compression,
+                        state="readonly").pack(padx=50, pady=5)
+        ctk.CTkCheckBox(left_scroll, text="Продолжать прерванную конвертацию",
+                        variable=self.resume).pack(anchor="w", padx=50, pady=(10,0))
+        ctk.CTkCheckBox(left_scroll, text="Профилирование (отчет по стадиям, profile.json)",
+                        variable=self.profile).pack(anchor="w", padx=50, pady=(10,0))
+        ctk.CTkLabel(left_scroll, text="Место под проекты, ГБ (старые удаляются; пусто - без ограничения)",
+                     font=("Segoe UI", 12)).pack(anchor="w", padx=50, pady=(10,0))
+        ctk.CTkEntry(left_scroll, textvariable=self.cache_quota_gb, placeholder_text="например, 20",
+                     width=200).pack(anchor="w", padx=50, pady=5)
 
         ctk.CTkButton(left_scroll, text="ЗАПУСТИТЬ КОНВЕРТАЦИЮ", command=self.start_conversion,
                       font=("Segoe UI", 18, "bold"), height=50, corner_radius=15).pack(fill=X, padx=80, pady=40)
@@ -127,6 +175,14 @@ class ASCIIConverterApp:
         right = ctk.CTkFrame(main, fg_color="#1a1a1a")
         right.pack(side=RIGHT, fill=BOTH, expand=True, padx=20, pady=20)
 
+        # Шкала времени: предпросмотр любого кадра видео
+        timeline = ctk.CTkFrame(right, fg_color="transparent")
+        timeline.pack(side=BOTTOM, fill=X, padx=20, pady=(10,0))
+        self.frame_label = ctk.CTkLabel(timeline, text="Кадр 0 / 0", font=("Segoe UI", 12), width=140)
+        self.frame_label.pack(side=RIGHT, padx=(10,0))
+        self.timeline = ctk.CTkSlider(timeline, from_=0, to=1, variable=self.frame_index, state="disabled")
+        self.timeline.pack(side=LEFT, fill=X, expand=True)
+
         self.preview_canvas = Canvas(right, bg="#1a1a1a", highlightthickness=0)
         self.preview_canvas.pack(fill=BOTH, expand=True)
 
@@ -150,86 +206,142 @@ class ASCIIConverterApp:
 
     def bind_changes(self):
         for var in [self.invert, self.transparent, self.threshold, self.char_width, self.height_ratio,
-                    self.brightness, self.contrast, self.gamma]:
-            var.trace_add("write", lambda *args: self.root.after_idle(self.update_preview))
+                    self.brightness, self.contrast, self.gamma, self.frame_index]:
+            var.trace_add("write", lambda *args: self.update_preview())
 
     def browse_video(self):
         path = filedialog.askopenfilename(filetypes=[("Видео", "*.mp4 *.avi *.mov *.mkv *.webm")])
         if path:
             self.video_path.set(path)
-            self.load_first_frame()
+            self.load_video()
 
-    def load_first_frame(self):
+    def load_video(self):
         path = self.video_path.get()
         if not path: return
-        cap = cv2.VideoCapture(path)
-        ret, frame = cap.read()
-        cap.release()
-        if ret:
-            self.first_frame = frame
-            self.update_preview()
-
-    def apply_camera_settings(self, gray):
-        img = gray.astype(np.float32)
-        img = img * self.contrast.get() + self.brightness.get()
-        img = np.clip(img, 0, 255)
-        img = np.power(img / 255.0, self.gamma.get()) * 255.0
-        return np.clip(img, 0, 255).astype(np.uint8)
+        try:
+            seeker = FrameSeeker(path)
+        except IOError as e:
+            messagebox.showerror("Ошибка", str(e))
+            return
+        # Старое видео закрывается сразу (release дождется кадра, который читается в фоне)
+        if self.seeker is not None:
+            self.seeker.release()
+        self.seeker = seeker
+        last = seeker.frame_count - 1
+        self.timeline.configure(state="normal", from_=0, to=max(1, last), number_of_steps=max(1, last))
+        self.frame_index.set(0)
+        self.update_preview()
+
+    def create_mapper(self):
+        return AsciiMapper(**self.mapper_settings())
+
+    def mapper_settings(self):
+        # Камера и инверсия входят в таблицу яркость -> символ
+        return {
+            "charset": ASCII_CHARS,
+            "transparent": self.transparent.get(),
+            "threshold": self.threshold.get(),
+            "invert": self.invert.get(),
+            "camera": (self.brightness.get(), self.contrast.get(), self.gamma.get()),
+        }
 
     def update_preview(self):
-        if self.first_frame is None:
+        """Заявка на предпросмотр: настройки читаются здесь, рендер идет в фоне"""
+        if self.seeker is None:
             return
-
-        frame = self.first_frame.copy()
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        gray = self.apply_camera_settings(gray)
-        if self.invert.get():
-            gray = 255 - gray
-
-        chars_w = self.char_width.get()
-        chars_h = int(chars_w * self.height_ratio.get())
-        if chars_h < 20: chars_h = 20
-
-        resized = cv2.resize(gray, (chars_w, chars_h), interpolation=cv2.INTER_AREA)
+        index = min(self.frame_index.get(), self.seeker.frame_count - 1)
+        self.frame_label.configure(text=f"Кадр {index + 1} / {self.seeker.frame_count}")
 
         canvas_w = self.preview_canvas.winfo_width()
         canvas_h = self.preview_canvas.winfo_height()
         if canvas_w <= 1 or canvas_h <= 1:
             canvas_w, canvas_h = 1200, 800
 
-        char_w = canvas_w // chars_w
-        char_h = canvas_h // chars_h
-        char_size = min(char_w, char_h)
-        if char_size < 4: char_size = 4
-
-        surf = pygame.Surface((chars_w * char_size, chars_h * char_size))
-        surf.fill(self.bg_color_hex)
-
-        font = pygame.font.SysFont("Courier New", char_size, bold=True)
-        color = self.text_color if not self.random_colors.get() else "#ffffff"
+        chars_w = self.char_width.get()
+        chars_h = int(chars_w * self.height_ratio.get())
+        if chars_h < 20: chars_h = 20
 
-        for y in range(chars_h):
-            for x in range(chars_w):
-                p = resized[y, x]
-                if self.transparent.get() and p > self.threshold.get():
-                    char = " "
-                else:
-                    char = ASCII_CHARS[min(len(ASCII_CHARS)-1, p // 32)]
-                txt = font.render(char, True, color)
-                surf.blit(txt, (x * char_size, y * char_size))
-
-        data = pygame.image.tostring(surf, 'RGB')
-        image = Image.frombytes('RGB', surf.get_size(), data)
+        settings = {
+            "grid": (chars_w, chars_h),
+            "canvas": (canvas_w, canvas_h),
+            "color": self.text_color if not self.random_colors.get() else "#ffffff",
+            "bg_color": self.bg_color_hex,
+        }
+        self.preview_worker.submit(self.render_preview, self.seeker, index, self.create_mapper(), settings)
+
+    def render_preview(self, seeker, index, mapper, settings):
+        """Фоновый рендер: сначала черновик с крупной сеткой, затем полный кадр"""
+        chars_w, chars_h = settings["grid"]
+        grids = [(chars_w, chars_h)]
+        if chars_w > PREVIEW_DRAFT_WIDTH * 2:
+            draft_h = max(1, chars_h * PREVIEW_DRAFT_WIDTH // chars_w)
+            grids.insert(0, (PREVIEW_DRAFT_WIDTH, draft_h))
+
+        canvas_w, canvas_h = settings["canvas"]
+        for grid_w, grid_h in grids:
+            # Кадр и сетки берутся из LRU кеша, декодирование только при промахе;
+            # смена камеры/порога меняет только таблицу маппера
+            resized = seeker.grid(index, (grid_w, grid_h))
+            if resized is None:
+                return
+            indices = mapper.map(resized)
+
+            char_size = min(canvas_w // grid_w, canvas_h // grid_h)
+            if char_size < 4: char_size = 4
+
+            atlas = get_glyph_atlas("Courier New", char_size, mapper.glyphs, settings["color"], settings["bg_color"], (char_size, char_size))
+            rendered = FrameRenderer(atlas, (grid_w, grid_h)).render(indices)
+            yield Image.fromarray(rendered), (canvas_w, canvas_h)
+
+    def deliver_preview(self, generation, result):
+        # Вызывается из фонового потока: Tk трогаем только в главном
+        self.root.after(0, self.show_preview, generation, result)
+
+    def show_preview(self, generation, result):
+        if not self.preview_worker.is_current(generation):
+            return
+        image, (canvas_w, canvas_h) = result
         image_tk = ImageTk.PhotoImage(image)
 
         self.preview_canvas.delete("all")
         self.preview_canvas.create_image(canvas_w//2, canvas_h//2, image=image_tk, anchor="center")
         self.preview_image = image_tk
+        # Предпросмотр снова работает: убираем сообщение об ошибке, если его не сменил другой статус
+        if self.preview_error is not None:
+            if self.status.cget("text") == self.preview_error:
+                self.status.configure(text=self.status_before_error)
+            self.preview_error = None
+
+    def preview_failed(self, generation, error):
+        # Вызывается из фонового потока: Tk трогаем только в главном
+        self.root.after(0, self.show_preview_error, generation, error)
+
+    def show_preview_error(self, generation, error):
+        if not self.preview_worker.is_current(generation):
+            return
+        if self.preview_error is None:
+            self.status_before_error = self.status.cget("text")
+        self.preview_error = f"Ошибка предпросмотра: {error} (на экране прошлый кадр)"
+        self.status.configure(text=self.preview_error)
+
+    def cache_quota_bytes(self):
+        """Ограничение места под проекты в байтах; None - без ограничения"""
+        quota = self.cache_quota_gb.get().strip().replace(',', '.')
+        if not quota:
+            return None
+        if float(quota) <= 0:
+            raise ValueError(quota)
+        return float(quota) * 1024 ** 3
 
     def start_conversion(self):
         if not self.video_path.get():
             messagebox.showerror("Ошибка", "Выберите видео!")
             return
+        try:
+            self.cache_quota_bytes()
+        except ValueError:
+            messagebox.showerror("Ошибка", "Место под проекты - положительное число ГБ или пусто!")
+            return
         self.progress['value'] = 0
         self.status.configure(text="Конвертация...")
         threading.Thread(target=self.convert, daemon=True).start()
@@ -241,100 +353,234 @@ class ASCIIConverterApp:
         total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
         w, h = int(cap.get(3)), int(cap.get(4))
 
-        out_dir = os.path.join(os.path.expanduser("~"), "Downloads", "ASCII_Videos")
-        os.makedirs(out_dir, exist_ok=True)
-        folder = os.path.join(out_dir, datetime.now().strftime("%Y-%m-%d_%H-%M-%S"))
-        os.makedirs(folder, exist_ok=True)
-        frames_dir = os.path.join(folder, "frames")
-        os.makedirs(frames_dir, exist_ok=True)
-
-        temp_dir = os.path.join(folder, "temp") if self.save_video.get() else None
-        if temp_dir:
-            os.makedirs(temp_dir, exist_ok=True)
+        container = stream = video_writer = pipeline = None
+        error = video_error = None
+        decode_note = ""
+        try:
+            out_dir = os.path.join(os.path.expanduser("~"), "Downloads", "ASCII_Videos")
+            os.makedirs(out_dir, exist_ok=True)
+
+            chars_w = self.char_width.get()
+            chars_h = int(chars_w * self.height_ratio.get())
+            if chars_h < 20: chars_h = 20
+
+            # Без ffmpeg кадры декодирует OpenCV, как в консольной версии
+            ffmpeg_decode = self.ffmpeg_decode.get()
+            if ffmpeg_decode and not check_ffmpeg():
+                ffmpeg_decode = False
+                decode_note = " (FFmpeg не найден, кадры декодирует OpenCV)"
+                self.root.after(0, lambda: self.status.configure(text=f"Конвертация...{decode_note}"))
+
+            spec = self.build_frame_spec(w, h, chars_w, chars_h, keep_frame=self.save_video.get())
+            # Папка проекта адресуется отпечатком видео и всеми настройками (кеш результатов)
+            key = {
+                "spec": spec,
+                "container": self.save_container.get(),
+                "stream": self.stream_compression.get() if self.save_stream.get() else None,
+                "ffmpeg_decode": ffmpeg_decode,
+                "video": self.video_args() if self.save_video.get() else None,
+            }
+            folder, source, checkpoint = lookup(out_dir, path, key)
+            if checkpoint and checkpoint.complete:
+                # То же видео с теми же настройками уже сконвертировано
+                checkpoint.touch()
+                self.root.after(0, lambda: (
+                    self.progress.config(value=100),
+                    self.status.configure(text=f"Уже сконвертировано. Папка: {folder}")
+                ))
+                return
+
+            if checkpoint and not self.resume.get():
+                # Незаконченный проект без продолжения начинается с чистой папки
+                shutil.rmtree(folder, ignore_errors=True)
+                checkpoint = None
+            os.makedirs(folder, exist_ok=True)
+            frames_dir = os.path.join(folder, "frames")
+            os.makedirs(frames_dir, exist_ok=True)
+
+            # Все кадры в одном файле с доступом к любому кадру
+            start = checkpoint.frames_done if checkpoint else 0
+            if self.save_container.get():
+                container_path = os.path.join(folder, "frames.ascv")
+                glyphs = AsciiMapper(**spec["mapper"]).glyphs
+                try:
+                    container = AsciiContainerWriter(container_path, chars_w, chars_h, fps, glyphs, keep_frames=start)
+                except (OSError, ValueError):
+                    # Файл кадров потерян: конвертация начинается заново
+                    checkpoint, start = None, 0
+                    container = AsciiContainerWriter(container_path, chars_w, chars_h, fps, glyphs)
+
+            # Сжатый поток изменений кадров
+            if self.save_stream.get():
+                stream_path = os.path.join(folder, "frames.ascz")
+                glyphs = AsciiMapper(**spec["mapper"]).glyphs
+                compression = self.stream_compression.get()
+                try:
+                    stream = AsciiStreamWriter(stream_path, chars_w, chars_h, fps, glyphs, compression, keep_frames=start)
+                except (OSError, ValueError):
+                    # Поток потерян: конвертация начинается заново
+                    if start and container:
+                        container.close()
+                        container = AsciiContainerWriter(container_path, chars_w, chars_h, fps, glyphs)
+                    checkpoint, start = None, 0
+                    stream = AsciiStreamWriter(stream_path, chars_w, chars_h, fps, glyphs, compression)
+
+            # ffmpeg уменьшает кадр до сетки и переводит в серый при декодировании
+            if ffmpeg_decode:
+                cap.release()
+                cap = FFmpegGrayReader(path, (chars_w, chars_h))
+            # Уже записанные кадры не обрабатываются заново
+            if start:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+            # Декодирование наперед в отдельном потоке
+            cap = PrefetchedSource(cap)
+
+            # Кадры для MP4 отправляются в ffmpeg напрямую, без временных PNG, отрезками
+            if self.save_video.get():
+                video_path = os.path.join(folder, "ascii_video.mp4")
+                video_writer = SegmentedVideoWriter(video_path, os.path.join(folder, "segments"), w, h, fps,
+                                                    self.video_args(), segments=checkpoint.segments if checkpoint else ())
+
+            if checkpoint is None:
+                checkpoint = ConversionCheckpoint.create(folder, source, key)
+            # Замер стадий конвертации (только по запросу)
+            profiler = ConversionProfiler(self.workers.get()) if self.profile.get() else None
+            pipeline = FramePipeline(cap, spec, workers=self.workers.get(), start=start, profiler=profiler)
+            # Кадр отрисован один раз и раздается всем выбранным форматам
+            sinks = FrameSinks([
+                TextSink(frames_dir) if self.save_txt.get() else None,
+                PngSink(frames_dir) if self.save_png.get() else None,
+                ContainerSink(container) if container else None,
+                StreamSink(stream) if stream else None,
+            ], profiler=profiler)
+            video_sink = sinks.add(VideoSink(video_writer)) if video_writer else None
+            if container and start:
+                # Повторы ищутся и среди кадров, записанных до остановки
+                sinks.duplicates.seed(frame_digests(container.path, start))
+
+            frame_idx = start
+            last_checkpoint = time.monotonic()
+            for result in pipeline:
+                try:
+                    sinks.write(result)
+                except FFmpegError as e:
+                    video_error = e
+                    sinks.remove(video_sink)
+                    video_writer.abort()
+                    # Прогресс больше не записывается: видео после этого кадра нет
+                    checkpoint = None
+
+                frame_idx += 1
+                self.root.after(0, lambda: self.progress.config(value=frame_idx / total * 100 if total else 0))
+
+                if checkpoint and time.monotonic() - last_checkpoint >= CHECKPOINT_INTERVAL:
+                    last_checkpoint = time.monotonic()
+                    checkpoint.commit_outputs(frame_idx, container, video_writer, stream)
+
+            try:
+                sinks.close()
+            except FFmpegError as e:
+                video_error = e
+
+            if checkpoint and not video_error:
+                checkpoint.commit_outputs(frame_idx, container, video_writer, stream)
+                checkpoint.finish()
+                if video_writer:
+                    video_writer.discard_segments()
+        except Exception as e:
+            # Поток конвертации фоновый: ошибка показывается в окне, а не теряется
+            error = e
+        finally:
+            # Конвейер останавливается первым (его декодер читает cap), а остальное
+            # освобождается, даже если остановка не удалась
+            try:
+                pipeline_error = pipeline.close() if pipeline is not None else None
+            finally:
+                cap.release()
+                if container:
+                    container.close()
+                if stream:
+                    stream.close()
+                # При ошибке останавливаем ffmpeg (после close() ничего не делает)
+                if video_writer:
+                    video_writer.abort()
+        if error is None:
+            error = pipeline_error
+
+        if error is not None:
+            self.root.after(0, lambda: (
+                self.status.configure(text=f"Ошибка конвертации: {error}"),
+                messagebox.showerror("Ошибка", f"{type(error).__name__}: {error}")
+            ))
+            return
 
-        chars_w = self.char_width.get()
-        chars_h = int(chars_w * self.height_ratio.get())
-        if chars_h < 20: chars_h = 20
+        # Отчет профиля: конвейер уже остановлен, его процессы входят в память
+        report = ""
+        if profiler is not None and profiler.frames:
+            profiler.finish()
+            summary = profiler.summary()
+            profiler.save(os.path.join(folder, "profile.json"), summary)
+            report = "\n\n" + "\n".join(profiler.report_lines(summary))
+
+        if video_error:
+            self.root.after(0, lambda: (
+                self.progress.config(value=100),
+                self.status.configure(text=f"Ошибка FFmpeg. Папка: {folder}"),
+                messagebox.showerror("Ошибка FFmpeg", str(video_error))
+            ))
+            return
 
-        font = pygame.font.SysFont("Courier New", max(12, w // chars_w * 2), bold=True)
-
-        frame_idx = 0
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            gray = self.apply_camera_settings(gray)
-            if self.invert.get(): gray = 255 - gray
-
-            resized = cv2.resize(gray, (chars_w, chars_h))
-
-            surf = pygame.Surface((w, h))
-            surf.fill(self.bg_color_hex)
-            color = self.text_color if not self.random_colors.get() else "#ffffff"
-
-            total_text_w = chars_w * font.get_height()
-            total_text_h = chars_h * font.get_height()
-            start_x = (w - total_text_w) // 2
-            start_y = (h - total_text_h) // 2
-
-            y = start_y
-            for row in resized:
-                x = start_x
-                for p in row:
-                    if self.transparent.get() and p > self.threshold.get():
-                        char = " "
-                    else:
-                        char = ASCII_CHARS[min(len(ASCII_CHARS)-1, p // 32)]
-                    txt = font.render(char, True, color)
-                    surf.blit(txt, (x, y))
-                    x += font.get_height()
-                y += font.get_height()
-
-            if self.save_txt.get():
-                text = "\n".join("".join(" " if self.transparent.get() and p > self.threshold.get() else ASCII_CHARS[p//32] for p in row) for row in resized)
-                open(os.path.join(frames_dir, f"frame_{frame_idx:06d}.txt"), "w", encoding="utf-8").write(text)
-
-            if self.save_png.get():
-                pygame.image.save(surf, os.path.join(frames_dir, f"frame_{frame_idx:06d}.png"))
-            if temp_dir:
-                pygame.image.save(surf, os.path.join(temp_dir, f"frame_{frame_idx:06d}.png"))
-
-            frame_idx += 1
-            self.root.after(0, lambda: self.progress.config(value=frame_idx / total * 100 if total else 0))
-
-        cap.release()
-
-        if temp_dir and os.listdir(temp_dir):
-            video_path = os.path.join(folder, "ascii_video.mp4")
-
-            quality = self.video_quality.get()
-            if quality == "Низкое":
-                extra = ["-crf", "28"]
-            elif quality == "Среднее":
-                extra = ["-crf", "23"]
-            elif quality == "Высокое":
-                extra = ["-crf", "18"]
-            else:
-                extra = ["-qp", "0", "-preset", "ultrafast"]
-
-            subprocess.run([
-                "ffmpeg", "-y", "-framerate", str(fps),
-                "-i", os.path.join(temp_dir, "frame_%06d.png"),
-                "-c:v", "libx264", "-pix_fmt", "yuv420p"
-            ] + extra + [
-                "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2",
-                video_path
-            ], check=False)
-            shutil.rmtree(temp_dir)
+        # Место под проекты ограничено: удаляются давно не использованные
+        removed = []
+        quota = self.cache_quota_bytes()
+        if quota:
+            removed = evict_projects(out_dir, quota, keep=[folder])
 
+        duplicates = f", повторов кадров: {sinks.frames_duplicate}" if sinks.frames_duplicate else ""
+        evicted = f", удалено старых проектов: {len(removed)}" if removed else ""
         self.root.after(0, lambda: (
             self.progress.config(value=100),
-            self.status.configure(text=f"ГОТОВО! Папка: {folder}"),
-            messagebox.showinfo("Успех!", f"Сохранено в:\n{folder}")
+            self.status.configure(text=f"ГОТОВО! Папка: {folder}{duplicates}{evicted}{decode_note}"),
+            messagebox.showinfo("Успех!", f"Сохранено в:\n{folder}{report}")
         ))
 
+    def build_frame_spec(self, w, h, chars_w, chars_h, keep_frame=False):
+        font_size = max(12, w // chars_w * 2)
+        cell = get_font("Courier New", font_size).get_height()
+        color = self.text_color if not self.random_colors.get() else "#ffffff"
+        render = None
+        if self.save_png.get() or keep_frame:
+            # Текст центрируется на кадре исходного размера
+            render = {
+                "font_name": "Courier New",
+                "font_size": font_size,
+                "text_color": color,
+                "bg_color": self.bg_color_hex,
+                "cell_size": (cell, cell),
+                "grid_size": (chars_w, chars_h),
+                "canvas_size": (w, h),
+            }
+        return {
+            "grid": (chars_w, chars_h),
+            "mapper": self.mapper_settings(),
+            "txt": self.save_txt.get(),
+            "render": render,
+            "png": self.save_png.get(),
+            "keep_frame": keep_frame,
+        }
+
+    def video_args(self):
+        quality = self.video_quality.get()
+        if quality == "Низкое":
+            extra = ["-crf", "28"]
+        elif quality == "Среднее":
+            extra = ["-crf", "23"]
+        elif quality == "Высокое":
+            extra = ["-crf", "18"]
+        else:
+            extra = ["-qp", "0", "-preset", "ultrafast"]
+        return ["-c:v", "libx264", "-pix_fmt", "yuv420p"] + extra
+
     def run(self):
         self.root.mainloop()
 